@@ -1,6 +1,8 @@
 import streamlit as st
 from helper import get_dataframe, get_filtered_universe, get_tickers, get_range, rich, poor
-from main import get_fig
+from main import get_fig, get_trail_fig, get_animation_fig, get_failures, get_snapshot
+from cache import indicator_cache, shared_bars
+from features import INDICATOR_OPTIONS, REQUIRES_BENCHMARK
 
 
 
@@ -22,6 +24,11 @@ def main():
                 step = 1,
                 value = "min"
             )
+            view = st.radio("View", ["Scatter", "Trail", "Animation"], horizontal=True,
+                            help="Trail and Animation show the last 6 days of each ticker's path through the quadrants")
+            top_n = 20
+            if view != "Scatter":
+                top_n = st.number_input("Strongest tickers shown", min_value=1, max_value=200, step=1, value=20)
         
         indics = []
         periods = []
@@ -40,12 +47,10 @@ def main():
             with sc2:
                 x_axis = st.selectbox(
                     "Select x axis",
-                    options = ["DMA", "Kalman Innovation", "First Order Kalman", "Second Order Kalman", "Percentage Retracement", "Second Order Percentage Retracement",
-                    "Second Order DMA", "Lag/Lead Days", "Rolling Alpha", "Lag/Lead Corr"]
+                    options = INDICATOR_OPTIONS
                 )
-                if x_axis == "Lag/Lead Days" or x_axis == "Rolling Alpha" or x_axis == "Lag/Lead Corr":
+                if x_axis in REQUIRES_BENCHMARK:
                     bench_x = st.multiselect("Select x Benchmark", df["ticker"].unique().tolist())
-                    st.write("Note: Using this may take a while")
         indics.append(x_axis)
         periods.append(x_period)
         with c3:
@@ -61,12 +66,10 @@ def main():
             with sc2:
                 y_axis = st.selectbox(
                     "Select y axis",
-                    options = ["DMA", "Kalman Innovation","First Order Kalman", "Second Order Kalman", "Percentage Retracement", "Second Order Percentage Retracement",
-                    "Second Order DMA", "Lag/Lead Days", "Rolling Alpha", "Lag/Lead Corr"]
+                    options = INDICATOR_OPTIONS
                 )
-                if y_axis == "Lag/Lead Days" or y_axis == "Rolling Alpha" or y_axis == "Lag/Lead Corr":
+                if y_axis in REQUIRES_BENCHMARK:
                     bench_y = st.multiselect("Select y Benchmark", df["ticker"].unique().tolist())
-                    st.write("Note: Using this may take a while")
         indics.append(y_axis)
         periods.append(y_period)
     _, b1, _, b3 = st.columns([0.2, 0.2, 0.2, 0.4])
@@ -77,15 +80,41 @@ def main():
         if st.button(":green[Expensive Assets]"):
             rich()
 
+    missing = [axis for axis, bench in ((x_axis, bench_x), (y_axis, bench_y)) if axis in REQUIRES_BENCHMARK and not bench]
+    if missing:
+        st.write(f"Please select a benchmark for {' and '.join(missing)}")
+        return
+
     try:
-        fig, scanner_df = get_fig(tickers, day_delay, indics, periods, [get_range(x_axis) if not (bench_x == "Lag/Lead Days") else periods[0], get_range(y_axis) if not (bench_y == "Lag/Lead Days") else periods[1]], bench_x, bench_y)
+        chart_range = [get_range(x_axis) if not (bench_x == "Lag/Lead Days") else periods[0], get_range(y_axis) if not (bench_y == "Lag/Lead Days") else periods[1]]
+        fig, scanner_df = get_fig(tickers, day_delay, indics, periods, chart_range, bench_x, bench_y)
+        # All views read the same cached history, so switching is a lookup
+        if view == "Trail":
+            fig = get_trail_fig(tickers, indics, periods, chart_range, bench_x, bench_y, top_n)
+        elif view == "Animation":
+            fig = get_animation_fig(tickers, indics, periods, chart_range, bench_x, bench_y, top_n)
         scanner_df["Signal Strength"] = scanner_df["Signal Strength"].map(lambda x: f"{x:.1f}")
         scanner_df["Volume (Z)"] = scanner_df["Volume (Z)"].map(lambda x: f"{x:.1f}")
-    except:
-        st.write("Please select a benchmark or change axes")
+    except Exception as e:
+        st.write(f"Couldn't compute this screen ({type(e).__name__}: {e}), please change axes or periods")
         return
 
     st.plotly_chart(fig)
+    stats = indicator_cache.stats()
+    bar_stats = shared_bars.stats()
+    snap = get_snapshot()
+    source = f"Served from the {snap.as_of} snapshot" if scanner_df.attrs.get("source") == "snapshot" else "Computed live"
+    st.caption(f"{source} · Indicator cache: {stats['hits']} hits / {stats['misses']} misses, {stats['entries']} entries"
+               f" · Bars: {bar_stats['tickers']} tickers shared, {bar_stats['coalesced']} loads coalesced")
+
+    failures = get_failures(tickers, indics, periods, bench_x[0] if bench_x else None, bench_y[0] if bench_y else None)
+    if failures:
+        with st.expander(f"{len(failures)} tickers could not be loaded"):
+            st.dataframe(
+                [{"Ticker": t, "Reason": r} for t, r in failures.items()],
+                hide_index=True,
+                width="stretch"
+            )
 
     if not scanner_df.empty:
         st.divider()  # Adds a visual line separator
@@ -0,0 +1,571 @@
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from features import get_indic
+
+INITIAL_CASH = 10000
+
+
+def check(values, op, threshold):
+    """ Vectorised rule: values > threshold (or <). NaN never triggers, like the scalar check. """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return values > threshold if op == ">" else values < threshold
+
+
+class BacktestResult:
+    """
+    Columnar output of simulate(): per-bar equity/position/price/cash arrays
+    and a trade ledger (one entry per closed trade) written as positions open and close.
+    """
+
+    def __init__(self, dates, equity, position, price, cash, trades, initial_cash):
+        self.dates = dates
+        self.equity = equity
+        self.position = position
+        self.price = price
+        self.cash = cash
+        self.trades = trades
+        self.initial_cash = initial_cash
+
+    def to_frame(self):
+        """ Same layout as pd.DataFrame(SignalPortfolio.history).set_index("Date"). """
+        return pd.DataFrame({
+            "Equity": self.equity,
+            "Position": self.position,
+            "Price": self.price,
+            "Cash": self.cash,
+        }, index=pd.Index(self.dates, name="Date"))
+
+    def trades_frame(self):
+        return pd.DataFrame(self.trades)
+
+    def metrics(self):
+        return get_metrics(self.equity, self.trades["pnl"], self.initial_cash)
+
+
+def get_metrics(equity, pnl, initial_cash=INITIAL_CASH):
+    """ Total return, max drawdown and win rate from an equity curve and closed-trade PnLs. """
+    equity = np.asarray(equity, dtype=float)
+    pnl = np.asarray(pnl, dtype=float)
+    if len(equity) == 0:
+        return {"final_equity": initial_cash, "total_return": 0.0, "max_drawdown": 0.0, "win_rate": 0.0, "trades": 0}
+
+    roll_max = np.maximum.accumulate(equity)
+    return {
+        "final_equity": float(equity[-1]),
+        "total_return": float(equity[-1] / initial_cash - 1),
+        "max_drawdown": float(np.min(equity / roll_max - 1)),
+        "win_rate": float(np.mean(pnl > 0)) if len(pnl) else 0.0,
+        "trades": int(len(pnl)),
+    }
+
+
+def simulate(price, buy, exit_buy, sell, exit_sell, dates=None, initial_cash=INITIAL_CASH):
+    """
+    Long/short/flat state machine over precomputed boolean rule arrays, in one pass.
+    Mirrors portfolio.SignalPortfolio fed by the backtest page's logic tree bar for bar:
+    - flat: buy -> go long with all cash, else sell -> short the same notional
+    - long/short: the position is closed unless the signal stays on that side,
+      so exit rules and "hold" both close it (SignalPortfolio treats None like 0)
+    Returns a BacktestResult.
+    """
+    price = np.asarray(price, dtype=float)
+    n = len(price)
+    dates = np.arange(n) if dates is None else np.asarray(dates)
+
+    equity = np.empty(n)
+    position = np.empty(n, dtype=np.int64)
+    cash_out = np.empty(n)
+
+    trades = {"entry_date": [], "exit_date": [], "side": [], "quantity": [], "entry_price": [], "exit_price": [], "pnl": []}
+    cash = float(initial_cash)
+    pos = 0
+    entry_price = 0.0
+    entry_date = None
+
+    px = price.tolist()
+    buy, exit_buy = np.asarray(buy, dtype=bool).tolist(), np.asarray(exit_buy, dtype=bool).tolist()
+    sell, exit_sell = np.asarray(sell, dtype=bool).tolist(), np.asarray(exit_sell, dtype=bool).tolist()
+
+    for i in range(n):
+        p = px[i]
+
+        # Logic tree (None = hold)
+        sig = None
+        if pos > 0:
+            if exit_buy[i]:
+                sig = 0
+        elif pos < 0:
+            if exit_sell[i]:
+                sig = 0
+        elif buy[i]:
+            sig = 1
+        elif sell[i]:
+            sig = -1
+
+        # Exits (SignalPortfolio.update closes on anything but the same side, hold included)
+        if (pos > 0 and sig != 1) or (pos < 0 and sig != -1):
+            if pos > 0:
+                cash += pos * p
+            else:
+                cash -= abs(pos) * p
+            trades["entry_date"].append(entry_date)
+            trades["exit_date"].append(dates[i])
+            trades["side"].append(1 if pos > 0 else -1)
+            trades["quantity"].append(abs(pos))
+            trades["entry_price"].append(entry_price)
+            trades["exit_price"].append(p)
+            trades["pnl"].append(pos * (p - entry_price))
+            pos = 0
+            entry_price = 0.0
+
+        # Entries
+        if pos == 0 and sig in (1, -1):
+            quantity = int(cash / p)
+            if quantity > 0:
+                if sig == 1:
+                    cash -= quantity * p
+                    pos = quantity
+                else:
+                    cash += quantity * p
+                    pos = -quantity
+                entry_price = p
+                entry_date = dates[i]
+
+        # Mark-to-market
+        equity[i] = cash + pos * p if pos >= 0 else cash - abs(pos) * p
+        position[i] = pos
+        cash_out[i] = cash
+
+    trades = {k: np.asarray(v) for k, v in trades.items()}
+    return BacktestResult(dates, equity, position, price, cash_out, trades, initial_cash)
+
+
+def rule_masks(df, rules):
+    """ (buy, exit_buy, sell, exit_sell) boolean arrays for a frame with the *_Ind columns. """
+    return (
+        check(df["Buy_Ind"], *rules["buy"]),
+        check(df["Exit_Buy_Ind"], *rules["exit_buy"]),
+        check(df["Sell_Ind"], *rules["sell"]),
+        check(df["Exit_Sell_Ind"], *rules["exit_sell"]),
+    )
+
+
+def run_rules(df, rules, initial_cash=INITIAL_CASH):
+    """
+    simulate() on a frame with Close, Buy_Ind, Exit_Buy_Ind, Sell_Ind, Exit_Sell_Ind columns.
+    rules: {"buy": (op, threshold), "exit_buy": ..., "sell": ..., "exit_sell": ...}
+    """
+    return simulate(
+        df["Close"].to_numpy(),
+        *rule_masks(df, rules),
+        dates=df.index.to_numpy(),
+        initial_cash=initial_cash,
+    )
+
+
+# --- Parameter sweeps ---
+
+LEGS = ("buy", "exit_buy", "sell", "exit_sell")
+LEG_COLUMNS = {"buy": "Buy_Ind", "exit_buy": "Exit_Buy_Ind", "sell": "Sell_Ind", "exit_sell": "Exit_Sell_Ind"}
+
+
+def expand_grid(grid):
+    """ {"period": [...], "buy_op": [...], "buy_threshold": [...], ...} -> list of parameter dicts. """
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def run_combos(price, legs_by_period, combos, initial_cash=INITIAL_CASH):
+    """
+    Runs every parameter combo against precomputed indicator arrays.
+    legs_by_period: {period: {leg: indicator array}}, each indicator computed once per period
+    and each rule mask once per (leg, period, op, threshold), shared by all combos using it.
+    """
+    masks = {}
+
+    def mask(leg, c):
+        key = (leg, c["period"], c[f"{leg}_op"], c[f"{leg}_threshold"])
+        if key not in masks:
+            masks[key] = check(legs_by_period[c["period"]][leg], c[f"{leg}_op"], c[f"{leg}_threshold"])
+        return masks[key]
+
+    rows = []
+    for c in combos:
+        result = simulate(price, *(mask(leg, c) for leg in LEGS), initial_cash=initial_cash)
+        rows.append({**c, **result.metrics()})
+    return rows
+
+
+def sweep(price, legs_by_period, grid, initial_cash=INITIAL_CASH, max_workers=None, chunk_size=500):
+    """
+    Backtests the full grid across a process pool. Combos are chunked per period so a worker
+    only receives that period's indicator arrays. Returns one row of params + metrics per combo.
+    """
+    combos = expand_grid(grid)
+    by_period = {}
+    for c in combos:
+        by_period.setdefault(c["period"], []).append(c)
+
+    tasks = []
+    for period, period_combos in by_period.items():
+        legs = {period: legs_by_period[period]}
+        for i in range(0, len(period_combos), chunk_size):
+            tasks.append((price, legs, period_combos[i:i + chunk_size], initial_cash))
+
+    if len(tasks) <= 1 or max_workers == 1:
+        rows = [row for task in tasks for row in run_combos(*task)]
+    else:
+        # spawn: forking a multi-threaded Streamlit server isn't safe
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            rows = [row for chunk in pool.map(run_combos, *zip(*tasks)) for row in chunk]
+
+    return pd.DataFrame(rows)
+
+
+def sweep_heatmap(results, x, y, metric="total_return"):
+    """ metric pivoted on two swept parameters, best value over the remaining ones. """
+    return results.pivot_table(index=y, columns=x, values=metric, aggfunc="max")
+
+
+# --- Walk-forward ---
+
+def walk_forward_folds(n, train, test, anchored=False):
+    """
+    (train_start, train_end, test_start, test_end) bar ranges covering n bars: train on
+    `train` bars (all bars so far if anchored), then test on the next `test`, rolled forward by `test`.
+    """
+    folds = []
+    start = 0
+    while start + train < n:
+        test_start = start + train
+        test_end = min(test_start + test, n)
+        folds.append((0 if anchored else start, test_start, test_start, test_end))
+        start += test
+    return folds
+
+
+def run_fold(price, legs_by_period, combos, fold, metric="total_return", initial_cash=INITIAL_CASH):
+    """
+    One walk-forward fold: every combo on the train bars, the best (highest `metric`) then run
+    out-of-sample on the test bars. Indicator arrays cover the full history and are only sliced,
+    so test bars still see indicators warmed up on earlier data.
+    """
+    train_start, train_end, test_start, test_end = fold
+
+    def window(start, end):
+        return {p: {leg: v[start:end] for leg, v in legs.items()} for p, legs in legs_by_period.items()}
+
+    train = pd.DataFrame(run_combos(price[train_start:train_end], window(train_start, train_end), combos, initial_cash))
+    best = train.iloc[int(np.argmax(train[metric].to_numpy()))]
+    params = {k: best[k] for k in combos[0]}
+
+    legs = legs_by_period[params["period"]]
+    result = simulate(
+        price[test_start:test_end],
+        *(check(legs[leg][test_start:test_end], params[f"{leg}_op"], params[f"{leg}_threshold"]) for leg in LEGS),
+        initial_cash=initial_cash,
+    )
+    return {
+        "params": params,
+        "train_metrics": {k: best[k] for k in ("total_return", "max_drawdown", "win_rate", "trades")},
+        "test_metrics": result.metrics(),
+        "equity": result.equity,
+    }
+
+
+def walk_forward(price, legs_by_period, grid, train, test, anchored=False, metric="total_return",
+                 dates=None, initial_cash=INITIAL_CASH, max_workers=None):
+    """
+    Rolling-origin backtest: per fold, pick the best grid combo in-sample and apply it to the
+    next window. Folds run concurrently on the same precomputed indicator arrays.
+    Returns (folds DataFrame, stitched out-of-sample equity Series): each fold's test equity
+    is compounded onto the previous fold's ending capital.
+    """
+    price = np.asarray(price, dtype=float)
+    dates = np.arange(len(price)) if dates is None else np.asarray(dates)
+    combos = expand_grid(grid)
+    folds = walk_forward_folds(len(price), train, test, anchored)
+    if not folds:
+        return pd.DataFrame(), pd.Series(dtype=float, name="Equity")
+
+    tasks = [(price, legs_by_period, combos, fold, metric, initial_cash) for fold in folds]
+    if len(tasks) <= 1 or max_workers == 1:
+        outs = [run_fold(*task) for task in tasks]
+    else:
+        # spawn: forking a multi-threaded Streamlit server isn't safe
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            outs = list(pool.map(run_fold, *zip(*tasks)))
+
+    rows = []
+    curves = []
+    capital = float(initial_cash)
+    for (train_start, train_end, test_start, test_end), out in zip(folds, outs):
+        curves.append(pd.Series(out["equity"] / initial_cash * capital, index=dates[test_start:test_end]))
+        capital = float(curves[-1].iloc[-1])
+        rows.append({
+            "train_start": dates[train_start], "train_end": dates[train_end - 1],
+            "test_start": dates[test_start], "test_end": dates[test_end - 1],
+            **out["params"],
+            **{f"train_{k}": v for k, v in out["train_metrics"].items()},
+            **{f"test_{k}": v for k, v in out["test_metrics"].items() if k != "final_equity"},
+        })
+
+    equity = pd.concat(curves).rename("Equity")
+    return pd.DataFrame(rows), equity
+
+
+# --- Universe backtests ---
+
+def _indicator_series(res):
+    if isinstance(res, pd.DataFrame):
+        return res.iloc[:, -1]
+    return res
+
+
+def backtest_ticker(ticker, close, legs, rules, period=20, length=None, benches=None, known=None,
+                    initial_cash=INITIAL_CASH):
+    """
+    One rule set on one ticker (runs in a worker process).
+    close: Close frame over the full history, legs: {leg: (indic, bench_ticker or None)},
+    benches: {bench_ticker: Close frame aligned to close}, known: {leg: indicator the caller had cached}.
+    Returns (metrics row, {leg: indicator computed here}) so the caller can cache what was computed.
+    """
+    known = known or {}
+    computed = {}
+    by_spec = {}
+    df = close.copy()
+    for leg, (indic, bench) in legs.items():
+        if leg in known:
+            res = known[leg]
+        elif (indic, bench) in by_spec:
+            res = computed[leg] = by_spec[(indic, bench)]
+        else:
+            if bench is None:
+                res = get_indic(indic)(close.copy(), period)
+            else:
+                res = get_indic(indic)(close.copy(), benches[bench], period)
+            res = computed[leg] = by_spec[(indic, bench)] = res
+        df[LEG_COLUMNS[leg]] = _indicator_series(res)
+
+    if length:
+        df = df.iloc[-length:]
+    result = run_rules(df, rules, initial_cash=initial_cash)
+    price = df["Close"].to_numpy()
+    row = {"ticker": ticker, **result.metrics(), "buy_hold": float(price[-1] / price[0] - 1) if len(price) else 0.0}
+    return row, computed
+
+
+def _backtest_task(args):
+    ticker, *rest = args
+    try:
+        return ticker, backtest_ticker(ticker, *rest), None
+    except Exception as e:
+        return ticker, None, f"{type(e).__name__}: {e}"
+
+
+def universe_backtest(bars, legs, rules, period=20, length=None, benchmarks=None, cache=None,
+                      max_workers=None, initial_cash=INITIAL_CASH):
+    """
+    Runs the same rules on every ticker in `bars` ({ticker: DataFrame}).
+    Indicators already in `cache` (cache.IndicatorCache) are reused, tickers with anything missing
+    are fanned out to a process pool and what they compute is written back to the cache.
+    benchmarks: cache.BenchmarkCache for legs with a benchmark.
+    Returns (leaderboard sorted by total return, failures: ticker -> reason).
+    """
+    # cache imports helper (and the API client), so it stays out of the worker processes
+    from cache import indicator_key
+
+    tasks = []
+    keys = {}
+    for ticker, data in bars.items():
+        close = data[["Close"]]
+        benches = {}
+        known = {}
+        keys[ticker] = {}
+        for leg, (indic, bench) in legs.items():
+            if bench is not None and bench not in benches:
+                benches[bench] = benchmarks.align(bench, close.index, ffill=True)[["Close"]]
+            key = indicator_key(ticker, indic, close, period, bench, benches.get(bench))
+            keys[ticker][leg] = key
+            if cache is not None:
+                value = cache.peek(key)
+                if value is not None:
+                    known[leg] = value
+        tasks.append((ticker, close, legs, rules, period, length, benches, known, initial_cash))
+
+    rows = []
+    failures = {}
+    if len(tasks) <= 1 or max_workers == 1:
+        results = [_backtest_task(task) for task in tasks]
+    else:
+        # spawn: forking a multi-threaded Streamlit server isn't safe
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_backtest_task, tasks, chunksize=max(1, len(tasks) // 32)))
+
+    for ticker, out, error in results:
+        if error:
+            failures[ticker] = error
+            continue
+        row, computed = out
+        rows.append(row)
+        if cache is not None:
+            for leg, value in computed.items():
+                cache.put(keys[ticker][leg], value)
+
+    leaderboard = pd.DataFrame(rows, columns=["ticker", "final_equity", "total_return", "max_drawdown", "win_rate", "trades", "buy_hold"])
+    return leaderboard.sort_values("total_return", ascending=False, ignore_index=True), failures
+
+
+# --- Quadrant rotation ---
+
+QUADRANTS = ("Neutral", "IMPROVING", "LEADING", "WEAKENING", "LAGGING")
+
+
+def quadrant_codes(x, y):
+    """
+    Screener quadrant of every (x, y) pair as an index into QUADRANTS, same rules as get_fig:
+    IMPROVING x<0,y>0 / LEADING x>0,y>0 / WEAKENING x>0,y<0 / LAGGING x<0,y<0, else Neutral.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    return np.select(
+        [(x < 0) & (y > 0), (x > 0) & (y > 0), (x > 0) & (y < 0), (x < 0) & (y < 0)],
+        [1, 2, 3, 4],
+        default=0,
+    )
+
+
+class RotationResult:
+    """ Output of rotation_backtest(): daily equity, weights, turnover and per-quadrant PnL. """
+
+    def __init__(self, dates, tickers, equity, weights, turnover, rebalanced, attribution, initial_cash):
+        self.dates = pd.Index(dates)
+        self.tickers = list(tickers)
+        self.equity = equity
+        self.weights = weights
+        self.turnover = turnover
+        self.rebalanced = rebalanced
+        self.attribution = attribution
+        self.initial_cash = initial_cash
+
+    def equity_curve(self):
+        return pd.Series(self.equity, index=self.dates, name="Equity")
+
+    def weights_frame(self):
+        return pd.DataFrame(self.weights, index=self.dates, columns=self.tickers)
+
+    def turnover_series(self):
+        return pd.Series(self.turnover, index=self.dates, name="Turnover")
+
+    def attribution_frame(self):
+        """ Cumulative (summed daily, not compounded) contribution of positions picked in each quadrant. """
+        return pd.DataFrame(np.cumsum(self.attribution, axis=0), index=self.dates, columns=list(QUADRANTS))
+
+    def holdings(self, i=-1):
+        w = self.weights[i]
+        held = np.flatnonzero(w)
+        return pd.Series(w[held], index=[self.tickers[j] for j in held], name="Weight").sort_values(ascending=False)
+
+    def metrics(self, periods_per_year=252):
+        equity = np.asarray(self.equity, dtype=float)
+        rets = equity[1:] / equity[:-1] - 1
+        vol = float(np.std(rets, ddof=1)) if len(rets) > 1 else 0.0
+        rebalances = self.turnover[self.rebalanced]
+        return {
+            "final_equity": float(equity[-1]),
+            "total_return": float(equity[-1] / self.initial_cash - 1),
+            "max_drawdown": float(np.min(equity / np.maximum.accumulate(equity) - 1)),
+            "sharpe": float(np.mean(rets) / vol * np.sqrt(periods_per_year)) if vol > 0 else 0.0,
+            "avg_turnover": float(rebalances.mean()) if len(rebalances) else 0.0,
+        }
+
+
+def _rotation_targets(quad, strength, valid, long, short, top_n, weighting):
+    """ Target weights for one rebalance: top_n by strength per side, each side's gross split equally. """
+    n = len(quad)
+    target = np.zeros(n)
+    sides = [(codes, sign) for codes, sign in ((long, 1.0), (short, -1.0)) if codes]
+    for codes, sign in sides:
+        eligible = np.flatnonzero(valid & np.isin(quad, codes))
+        if not len(eligible):
+            continue
+        # Stable sort keeps ties in ticker order
+        picked = eligible[np.argsort(-strength[eligible], kind="stable")[:top_n]]
+        w = strength[picked] if weighting == "strength" else np.ones(len(picked))
+        if w.sum() <= 0:
+            w = np.ones(len(picked))
+        target[picked] = sign * w / w.sum() / len(sides)
+    return target
+
+
+def rotation_backtest(close, x, y, dates=None, tickers=None, long=("IMPROVING",), short=(), top_n=5,
+                      rebalance=5, weighting="equal", cost_bps=0.0, initial_cash=INITIAL_CASH):
+    """
+    Cross-sectional rotation on the screener quadrants.
+    close, x, y: calendar-aligned (dates x tickers) arrays, NaN where there is no bar/value.
+    Quadrants and signal strength (distance from the origin, like the screener) are computed
+    for every date at once. Every `rebalance` bars the book is reset to the top_n strongest
+    tickers in the `long` quadrants (and short the top_n in `short`), decided on that bar's
+    close and held from the next bar on, drifting with prices in between.
+    cost_bps is charged on traded notional. Returns a RotationResult.
+    """
+    close = np.asarray(close, dtype=float)
+    T, N = close.shape
+    dates = np.arange(T) if dates is None else dates
+    tickers = range(N) if tickers is None else tickers
+
+    # 1. Signals for every date in one pass, carried over days a ticker didn't trade
+    x = pd.DataFrame(x).ffill().to_numpy()
+    y = pd.DataFrame(y).ffill().to_numpy()
+    quad = quadrant_codes(x, y)
+    strength = np.sqrt(x**2 + y**2)
+    valid = ~np.isnan(strength)
+
+    # 2. Bar returns, flat (0) on days without a bar
+    px = pd.DataFrame(close).ffill().to_numpy()
+    rets = np.zeros((T, N))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets[1:] = px[1:] / px[:-1] - 1
+    rets[~np.isfinite(rets)] = 0.0
+
+    long = [QUADRANTS.index(q) for q in long]
+    short = [QUADRANTS.index(q) for q in short]
+
+    equity = np.empty(T)
+    weights = np.zeros((T, N))
+    turnover = np.zeros(T)
+    rebalanced = np.zeros(T, dtype=bool)
+    attribution = np.zeros((T, len(QUADRANTS)))
+
+    w = np.zeros(N)
+    entry_quad = np.zeros(N, dtype=np.int64)
+    value = float(initial_cash)
+    start = int(np.argmax(valid.any(axis=1))) if valid.any() else T
+
+    for t in range(T):
+        # 3. Mark to market the book held over (t-1, t]
+        if t > 0 and w.any():
+            contrib = w * rets[t]
+            port = contrib.sum()
+            attribution[t] = np.bincount(entry_quad, weights=contrib, minlength=len(QUADRANTS))
+            value *= 1 + port
+            w = w * (1 + rets[t]) / (1 + port) if port != -1 else np.zeros(N)
+
+        # 4. Rebalance on this bar's signals
+        if t >= start and (t - start) % rebalance == 0:
+            target = _rotation_targets(quad[t], strength[t], valid[t], long, short, top_n, weighting)
+            traded = np.abs(target - w).sum()
+            turnover[t] = traded / 2
+            rebalanced[t] = True
+            value *= 1 - traded * cost_bps / 1e4
+            w = target
+            entry_quad = np.where(target != 0, quad[t], 0)
+
+        equity[t] = value
+        weights[t] = w
+
+    return RotationResult(dates, tickers, equity, weights, turnover, rebalanced, attribution, initial_cash)
@@ -0,0 +1,281 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from helper import load_bars
+from features import get_indic
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs fn, everyone arriving
+    while it is in flight waits and gets the same result (or exception). Nothing is kept
+    once the call returns, caching is the caller's job.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {"done": threading.Event()}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call["done"].wait()
+            if "error" in call:
+                raise call["error"]
+            return call["value"]
+
+        try:
+            call["value"] = fn()
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call["done"].set()
+        return call["value"]
+
+
+class SharedBars:
+    """
+    Process-wide bar store shared by every Streamlit session and page (screener, backtester,
+    snapshot). Loads of the same (ticker, days_back) in flight at once go to Polygon once,
+    loads of one ticker over different ranges take turns (they update the same stored file),
+    and a load reaching further back serves shorter requests by slicing. Entries live for
+    the day they were loaded on, like the pages' ttl="1d" caches; empty frames aren't kept.
+    """
+
+    def __init__(self, fetch=load_bars):
+        self.fetch = fetch
+        self.flight = SingleFlight()
+        self.lock = threading.Lock()
+        # ticker -> (day loaded, days_back, bars)
+        self.frames = {}
+        self.ticker_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, ticker, days_back, today):
+        """ Stored bars covering days_back, or None. Call with self.lock held. """
+        entry = self.frames.get(ticker)
+        if entry and entry[0] == today and entry[1] >= days_back:
+            bars = entry[2]
+            return bars.loc[bars.index >= pd.Timestamp(today - timedelta(days=days_back))]
+        return None
+
+    def get(self, ticker, days_back=730, client=None):
+        """
+        load_bars(ticker, days_back), shared. Raises on API errors like load_bars; the first caller's client fetches.
+        Every caller gets its own copy, so columns added to it don't leak into other sessions' bars.
+        """
+        today = date.today()
+        with self.lock:
+            bars = self._cached(ticker, days_back, today)
+            if bars is not None:
+                self.hits += 1
+                return bars.copy()
+            self.misses += 1
+            ticker_lock = self.ticker_locks.setdefault(ticker, threading.Lock())
+
+        def load():
+            with ticker_lock:
+                # A longer load of this ticker may have finished while we waited
+                with self.lock:
+                    bars = self._cached(ticker, days_back, today)
+                if bars is not None:
+                    return bars
+                bars = self.fetch(ticker, days_back, client=client)
+                with self.lock:
+                    entry = self.frames.get(ticker)
+                    if not bars.empty and (not entry or entry[0] != today or entry[1] < days_back):
+                        self.frames[ticker] = (today, days_back, bars)
+                return bars
+        return self.flight.do((ticker, days_back), load).copy()
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.flight.coalesced, "tickers": len(self.frames)}
+
+
+shared_bars = SharedBars()
+
+
+def get_shared_data(ticker, days_back=730):
+    """ get_polygon_data() through the shared bar store: same frame, empty on errors. """
+    try:
+        return shared_bars.get(ticker, days_back)
+    except Exception as e:
+        print(f"Error fetching {ticker}: {e}", file=sys.stderr)
+        return pd.DataFrame()
+
+
+class BenchmarkCache:
+    """
+    Fetches each benchmark once and shares it across every ticker in a screen/backtest.
+    Alignments to a calendar are also kept, so a benchmark is reindexed once per calendar.
+    """
+
+    def __init__(self, days_back=730, fetch=get_shared_data):
+        self.days_back = days_back
+        self.fetch = fetch
+        self.bars = {}
+        self.aligned = {}
+
+    def get(self, ticker):
+        if ticker not in self.bars:
+            self.bars[ticker] = self.fetch(ticker, days_back=self.days_back)
+        return self.bars[ticker]
+
+    def align(self, ticker, index, ffill=False):
+        """ Benchmark bars reindexed onto `index` (forward-filled over missing days if ffill). """
+        key = (ticker, ffill, len(index), index[0], index[-1]) if len(index) else (ticker, ffill, 0)
+        if key not in self.aligned:
+            bench = self.get(ticker)
+            if bench.empty:
+                aligned = bench
+            else:
+                aligned = bench.reindex(index)
+                if ffill:
+                    aligned = aligned.ffill()
+            self.aligned[key] = aligned
+        return self.aligned[key]
+
+
+def data_version(data):
+    """
+    Cheap content fingerprint of a price frame/series/array: length, last bar and a hash
+    of the values, so a new or revised bar invalidates cached indicators.
+    """
+    if data is None:
+        return None
+    if isinstance(data, np.ndarray):
+        return (data.shape, hashlib.blake2b(np.ascontiguousarray(data).tobytes(), digest_size=16).hexdigest())
+    if data.empty:
+        return (0,)
+    return (len(data), data.index[-1], int(pd.util.hash_pandas_object(data, index=True).sum()))
+
+
+def _nbytes(value):
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        return int(np.sum(value.memory_usage(index=True)))
+    if isinstance(value, np.ndarray) or hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 64
+
+
+class IndicatorCache:
+    """
+    Process-wide LRU memo of indicator results, shared across Streamlit reruns and sessions.
+    Keys carry the input's data_version, so entries never go stale, they just age out.
+    Bounded by entry count and approximate bytes.
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=256 * 2**20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        # Compute outside the lock, a duplicate computation is cheaper than serialising everything
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def peek(self, key, default=None):
+        """ Cached value or default, without computing (for work that is farmed out elsewhere). """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (value, size)
+                self.bytes += size
+            while self.entries and (len(self.entries) > self.maxsize or self.bytes > self.max_bytes):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
+
+
+indicator_cache = IndicatorCache()
+
+
+def indicator_key(ticker, indic, data, period, bench_ticker=None, bench=None):
+    return (ticker, indic, period, bench_ticker, data_version(data), data_version(bench))
+
+
+def _copy(value):
+    """ Copy of an indicator result (Series/DataFrame/array, or a tuple/list/dict of them). """
+    if isinstance(value, (pd.Series, pd.DataFrame, np.ndarray)):
+        return value.copy()
+    if isinstance(value, (tuple, list)):
+        return type(value)(_copy(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+
+def cached_indicator(ticker, indic, data, period, bench_ticker=None, bench=None):
+    """
+    get_indic(indic)(data[, bench], period) through the shared indicator cache.
+    Returns a copy, so callers can't modify what other sessions get from the cache.
+    """
+    key = indicator_key(ticker, indic, data, period, bench_ticker, bench)
+
+    def compute():
+        if bench is not None:
+            return get_indic(indic)(data, bench, period)
+        return get_indic(indic)(data, period)
+    return _copy(indicator_cache.get(key, compute))
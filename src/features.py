@@ -1,7 +1,5 @@
 import numpy as np
 import pandas as pd
-from numpy.lib.stride_tricks import sliding_window_view
-import streamlit as st
 
 '''
 For any features use format
@@ -14,11 +12,10 @@ max days is 2 * period
 def get_dma(data, period = 30):
     time = str(period) + "D"
     time_sd = str(2 * period) + "D"
-    data["100dma"] = data[["Close"]].rolling(time).mean()
-    data["100dms"] = data[["Close"]].rolling(time_sd).std()
+    dma = data["Close"].rolling(time).mean()
+    dms = data["Close"].rolling(time_sd).std()
 
-    data["z"] = (data["Close"] - data["100dma"])/data["100dms"]
-    return data["z"]
+    return ((data["Close"] - dma) / dms).rename("z")
 
 def get_dma_second(data, period=20):
 
@@ -36,176 +33,329 @@ def get_dma_second(data, period=20):
     return scaled_accel
 
 
-def get_rolling_retrac(data, period=14, raw=False):
-    # 1. Prepare Data
-    prices = data["Close"].to_numpy()
-    
-    # 2. Create Rolling Windows
-    windows = sliding_window_view(prices, window_shape=period)
-    
-    # 3. Find Indices of Max and Min
-    max_idx_rel = np.argmax(windows, axis=1)
-    min_idx_rel = np.argmin(windows, axis=1)
-    
-    # 4. Get Values
-    row_indices = np.arange(windows.shape[0])
-    roll_max = windows[row_indices, max_idx_rel]
-    roll_min = windows[row_indices, min_idx_rel]
-    curr_price = windows[:, -1]
-    
+def _rolling_argmax(a, period):
+    """
+    van Herk/Gil-Werman rolling max over trailing windows of `period` rows, column-wise.
+    Block prefix and suffix maxima make it O(n) whatever the period.
+    Returns (max, position of its first occurrence relative to the window start),
+    one row per full window.
+    """
+    n, k = a.shape
+    nb = -(-n // period)
+    padded = np.full((nb * period, k), -np.inf)
+    padded[:n] = a
+    blocks = padded.reshape(nb, period, k)
+    j = np.arange(period)[None, :, None]
+
+    # Prefix max of each block, remembering the first index that reached it
+    pre = np.maximum.accumulate(blocks, axis=1)
+    new = np.ones(blocks.shape, dtype=bool)
+    new[:, 1:] = blocks[:, 1:] > pre[:, :-1]
+    pre_idx = np.maximum.accumulate(np.where(new, j, 0), axis=1)
+
+    # Suffix max of each block (scan reversed, >= so ties move to the leftmost index)
+    rev = blocks[:, ::-1]
+    suf = np.maximum.accumulate(rev, axis=1)
+    new = np.ones(blocks.shape, dtype=bool)
+    new[:, 1:] = rev[:, 1:] >= suf[:, :-1]
+    suf_idx = period - 1 - np.maximum.accumulate(np.where(new, j, 0), axis=1)
+    suf, suf_idx = suf[:, ::-1], suf_idx[:, ::-1]
+
+    offset = (np.arange(nb) * period)[:, None, None]
+    pre, pre_idx = pre.reshape(-1, k), (pre_idx + offset).reshape(-1, k)
+    suf, suf_idx = suf.reshape(-1, k), (suf_idx + offset).reshape(-1, k)
+
+    # Window [i, i + period - 1] = suffix of i's block + prefix of the end's block
+    m = n - period + 1
+    left, right = slice(0, m), slice(period - 1, n)
+    take_left = suf[left] >= pre[right]
+    roll_max = np.where(take_left, suf[left], pre[right])
+    idx = np.where(take_left, suf_idx[left], pre_idx[right])
+    return roll_max, idx - np.arange(m)[:, None]
+
+def rolling_extrema(values, period):
+    """
+    O(n) rolling max/min over trailing `period` rows of a 1-D series or 2-D (bars x tickers) array.
+    Returns (roll_max, max_idx_rel, roll_min, min_idx_rel) with one row per full window,
+    positions relative to the window start with ties on the first occurrence (like np.argmax).
+    Windows touching NaN (stacked panel padding) come back as NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    values = values.reshape(len(values), -1)
+    n, k = values.shape
+    if period > n:
+        empty = np.empty((0, k))
+        out = (empty, empty.astype(int), empty, empty.astype(int))
+        return tuple(o[:, 0] for o in out) if squeeze else out
+
+    missing = np.isnan(values)
+    roll_max, max_idx = _rolling_argmax(np.where(missing, -np.inf, values), period)
+    neg_min, min_idx = _rolling_argmax(np.where(missing, -np.inf, -values), period)
+    roll_min = -neg_min
+
+    # Drop windows with missing values
+    counts = np.vstack([np.zeros((1, k)), np.cumsum(missing, axis=0)])
+    holes = (counts[period:] - counts[:n - period + 1]) > 0
+    roll_max[holes] = np.nan
+    roll_min[holes] = np.nan
+
+    if squeeze:
+        return roll_max[:, 0], max_idx[:, 0], roll_min[:, 0], min_idx[:, 0]
+    return roll_max, max_idx, roll_min, min_idx
+
+def _retrac_positions(prices, period):
+    """ (raw, signed) rolling_retrac from one rolling-extrema pass. """
+    prices = np.asarray(prices, dtype=float)
+    roll_max, max_idx_rel, roll_min, min_idx_rel = rolling_extrema(prices, period)
+    curr_price = prices[period - 1:]
 
     price_range = roll_max - roll_min
-    
+
     with np.errstate(divide='ignore', invalid='ignore'):
         raw_retracement = (curr_price - roll_min) / price_range
-        raw_retracement = np.nan_to_num(raw_retracement, nan=0.0)
+        raw_retracement = np.where(np.isnan(roll_max), np.nan, np.nan_to_num(raw_retracement, nan=0.0))
 
-    if raw:
-        pad = np.full(period - 1, np.nan)
-        full_result = np.concatenate([pad, raw_retracement])
-        return pd.Series(full_result, index=data.index)
-
-    final_values = np.where(
+    signed = np.where(
         max_idx_rel < min_idx_rel,
         raw_retracement,      
         -raw_retracement      
     )
-    
-    pad = np.full(period - 1, np.nan)
-    full_result = np.concatenate([pad, final_values])
-    
-    return pd.Series(full_result, index=data.index)
 
-def kalman_first(data, period = 10):
+    raw_full = np.full(prices.shape, np.nan)
+    signed_full = np.full(prices.shape, np.nan)
+    raw_full[period - 1:] = raw_retracement
+    signed_full[period - 1:] = signed
+    return raw_full, signed_full
+
+def rolling_retrac(prices, period=14, raw=False):
+    """
+    Position of the price inside its rolling [min, max] range, signed + when the max came
+    before the min in the window (pulling back from a high), - otherwise. Unsigned if raw.
+    1-D or stacked 2-D prices, returns an array of the same shape (NaN for the first period - 1 rows).
+    """
+    raw_position, signed = _retrac_positions(prices, period)
+    return raw_position if raw else signed
+
+def get_rolling_retrac(data, period=14, raw=False):
+    return pd.Series(rolling_retrac(data["Close"].to_numpy(), period, raw), index=data.index)
+
+# Kalman engine
+# 2-state (level, slope) filter on daily returns: F = [[1, 1], [0, 1]], H = [1, 0],
+# Q = q * I, R = r, P0 = I. The three Kalman indicators only differ in which output they z-score.
+KALMAN_Q = 0.05
+KALMAN_R = 1.0
+
+def kalman_gains(n, q=KALMAN_Q, r=KALMAN_R, steady_state=False, tol=1e-12):
+    """
+    Gain sequence K_t (n x 2) of the filter. The covariance recursion never looks at the data,
+    so it is computed once and shared by every series/ticker.
+    With steady_state=True the recursion stops once P has converged and the last gain is reused.
+    """
+    K = np.empty((n, 2))
+    p00, p01, p11 = 1.0, 0.0, 1.0
+    for t in range(n):
+        # Predict: F P F' + Q
+        a00 = p00 + 2 * p01 + p11 + q
+        a01 = p01 + p11
+        a11 = p11 + q
+
+        # Update: K = P H' / S, P = (I - K H) P
+        s = a00 + r
+        k0 = a00 / s
+        k1 = a01 / s
+        K[t] = k0, k1
+
+        n00, n01, n11 = (1 - k0) * a00, (1 - k0) * a01, a11 - k1 * a01
+        if steady_state and max(abs(n00 - p00), abs(n01 - p01), abs(n11 - p11)) < tol:
+            K[t:] = k0, k1
+            break
+        p00, p01, p11 = n00, n01, n11
+    return K
+
+def kalman_filter(z, q=KALMAN_Q, r=KALMAN_R, steady_state=False):
+    """
+    Runs the filter over a 1-D series or a 2-D (bars x tickers) array in one pass,
+    the 2x2 algebra batched over the ticker axis.
+    Leading NaNs (stacked panel padding) are skipped: each column starts at its first value.
+    Returns (level, innovation, slope), each shaped like z.
+    """
+    z = np.asarray(z, dtype=float)
+    squeeze = z.ndim == 1
+    z = z[:, None] if squeeze else z
+    n, k = z.shape
+
+    valid = ~np.isnan(z)
+    start = np.where(valid.any(axis=0), valid.argmax(axis=0), n) if n else np.zeros(k, dtype=int)
+    K = kalman_gains(n, q, r, steady_state)
+
+    level = np.full((n, k), np.nan)
+    innovation = np.full((n, k), np.nan)
+    slope = np.full((n, k), np.nan)
+
+    if k == 1:
+        # Single series: plain floats beat numpy's per-call overhead on 1-element arrays
+        s0 = start[0]
+        zs = z[s0:, 0].tolist()
+        out0, outy, out1 = [], [], []
+        x0, x1 = (zs[0] if zs else 0.0), 0.0
+        for zt, (g0, g1) in zip(zs, K.tolist()):
+            pred = x0 + x1
+            y = zt - pred
+            x0 = pred + g0 * y
+            x1 = x1 + g1 * y
+            out0.append(x0)
+            outy.append(y)
+            out1.append(x1)
+        level[s0:, 0] = out0
+        innovation[s0:, 0] = outy
+        slope[s0:, 0] = out1
+        if squeeze:
+            return level[:, 0], innovation[:, 0], slope[:, 0]
+        return level, innovation, slope
+
+    x0 = np.zeros(k)
+    x1 = np.zeros(k)
+    for t in range(n):
+        step = t - start
+        active = step >= 0
+        if not active.any():
+            continue
+        new = step == 0
+        x0[new] = z[t, new]
+        x1[new] = 0.0
+
+        gain = K[np.maximum(step, 0)]
+        pred = x0 + x1
+        y = z[t] - pred
+        x0 = np.where(active, pred + gain[:, 0] * y, x0)
+        x1 = np.where(active, x1 + gain[:, 1] * y, x1)
+
+        level[t] = np.where(active, x0, np.nan)
+        innovation[t] = np.where(active, y, np.nan)
+        slope[t] = np.where(active, x1, np.nan)
+
+    if squeeze:
+        return level[:, 0], innovation[:, 0], slope[:, 0]
+    return level, innovation, slope
+
+def rolling_moments(values, period, last=None):
+    """
+    Rolling mean, std, skew and kurt over `period` bars of a 1-D series or a (bars x tickers)
+    array, all columns at once from running power sums (one cumsum per power). Same
+    definitions as pandas rolling().mean/std/skew/kurt: sample std, adjusted skew and excess
+    kurtosis (0 and -3 for a flat window); NaN until a full window of non-NaN values.
+    last=K only computes the last K rows. Returns {"mean", "std", "skew", "kurt"}.
+    """
+    values = np.asarray(values, dtype=float)
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    if last is not None:
+        values = values[-(last + period - 1):]
+
+    # 1. Shift each column by its mean so the power sums stay well conditioned
+    valid = ~np.isnan(values)
+    shift = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    x = np.where(valid, values - shift, 0.0)
+
+    # 2. Window sums of count, x, x^2, x^3, x^4 from the cumsums
+    def window_sum(a, size=period):
+        c = np.cumsum(a, axis=0)
+        out = c.copy()
+        out[size:] -= c[:-size]
+        return out
+
+    n = window_sum(valid.astype(float))
+    x2 = x * x
+    s1, s2, s3, s4 = window_sum(x), window_sum(x2), window_sum(x2 * x), window_sum(x2 * x2)
+
+    # 3. Central moments
+    full = n == period
+    n = float(period)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu = s1 / n
+        m2 = np.maximum(s2 / n - mu**2, 0.0)
+        m3 = s3 / n - 3 * mu * s2 / n + 2 * mu**3
+        m4 = s4 / n - 4 * mu * s3 / n + 6 * mu**2 * s2 / n - 3 * mu**4
+        out = {
+            "mean": mu + shift,
+            "std": np.sqrt(m2 * n / (n - 1)) if period > 1 else np.full_like(mu, np.nan),
+            "skew": np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2**1.5 if period > 2 else np.full_like(mu, np.nan),
+            "kurt": (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * m4 / m2**2 - 3 * (n - 1)) if period > 3 else np.full_like(mu, np.nan),
+        }
+    for arr in out.values():
+        arr[~full] = np.nan
+
+    # 4. Flat windows (no value changes between consecutive bars) exactly, like pandas:
+    # std 0, skew 0, kurt -3 instead of rounding noise from the power sums
+    if period > 1:
+        steps = np.zeros(values.shape)
+        steps[1:] = values[1:] != values[:-1]
+        flat = full & (window_sum(steps, period - 1) == 0)
+        for key, value, min_period in (("std", 0.0, 2), ("skew", 0.0, 3), ("kurt", -3.0, 4)):
+            if period >= min_period:
+                out[key][flat] = value
+
+    rows = slice(-last, None) if last is not None else slice(None)
+    return {k: (v[rows, 0] if squeeze else v[rows]) for k, v in out.items()}
+
+def _rolling_z(values, period):
+    values = pd.DataFrame(values) if values.ndim == 2 else pd.Series(values)
+    return (values - values.rolling(period).mean()) / values.rolling(period).std()
+
+def kalman_features(data, period=10, steady_state=False):
+    """
+    All three Kalman indicators from a single filter run:
+    First Order Kalman (level), Kalman Innovation, Second Order Kalman (slope).
+    """
     original_index = data.index
-    
-    data["pct_change"] = data["Close"].pct_change()
-    data = data.dropna()
-    
-    q = 0.05
-    r = 1.0
+    rets = data["Close"].pct_change().dropna()
+    level, innovation, slope = kalman_filter(rets.to_numpy(), steady_state=steady_state)
+
+    out = pd.DataFrame({
+        "First Order Kalman": _rolling_z(level, period).to_numpy(),
+        "Kalman Innovation": _rolling_z(innovation, period).to_numpy(),
+        "Second Order Kalman": _rolling_z(slope, period).to_numpy(),
+    }, index=rets.index)
+    return out.reindex(original_index).fillna(0)
+
+def kalman_panel(close, period=10, steady_state=False):
+    """
+    Same as kalman_features for a stacked (bars x tickers) close array from UniversePanel.
+    Returns {indicator name: stacked z-score array}.
+    """
+    rets = np.full(close.shape, np.nan)
+    rets[1:] = close[1:] / close[:-1] - 1
+    level, innovation, slope = kalman_filter(rets, steady_state=steady_state)
+
+    valid = ~np.isnan(close)
+    return {
+        name: np.where(valid, np.nan_to_num(_rolling_z(out, period).to_numpy()), np.nan)
+        for name, out in (("First Order Kalman", level), ("Kalman Innovation", innovation), ("Second Order Kalman", slope))
+    }
 
-    if data.empty:
+def kalman_first(data, period = 10):
+    if data["Close"].pct_change().dropna().empty:
         return [0] * 10
-        
-    x = np.array([[data["pct_change"].iloc[0]], [0.0]])
-    P = np.eye(2)
-    F = np.array([[1, 1.0],
-                  [0, 1]])
-    H = np.array([[1, 0]])
-    Q = np.eye(2) * q
-    R = np.array([[r]])
-    
-    smoothed_innovations = []
-    
-    for z in data["pct_change"]:
-        x = F @ x
-        P = F @ P @ F.T + Q
-        
-        # Update
-        y = z - (H @ x) # Innovation
-        S = H @ P @ H.T + R
-        K = P @ H.T @ np.linalg.inv(S)
-        x = x + K @ y
-        P = (np.eye(2) - K @ H) @ P
-    
-        smoothed_innovations.append(x[0][0])
-    
-    innovations_series = pd.Series(smoothed_innovations, index=data.index)
-
-    z_scores = (innovations_series - innovations_series.rolling(period).mean()) / innovations_series.rolling(period).std()
-    return z_scores.reindex(original_index).fillna(0)
+    return kalman_features(data, period)["First Order Kalman"]
 
 # kalman innovation
 def get_smoothed(data, period = 10):
-    original_index = data.index
-    
-    data["pct_change"] = data["Close"].pct_change()
-    data = data.dropna()
-    
-    q = 0.05
-    r = 1.0
-
-    if data.empty:
+    if data["Close"].pct_change().dropna().empty:
         return [0] * 10
-        
-    x = np.array([[data["pct_change"].iloc[0]], [0.0]])
-    P = np.eye(2)
-    F = np.array([[1, 1.0],
-                  [0, 1]])
-    H = np.array([[1, 0]])
-    Q = np.eye(2) * q
-    R = np.array([[r]])
-    
-    smoothed_innovations = []
-    
-    for z in data["pct_change"]:
-        x = F @ x
-        P = F @ P @ F.T + Q
-        
-        # Update
-        y = z - (H @ x) # Innovation
-        S = H @ P @ H.T + R
-        K = P @ H.T @ np.linalg.inv(S)
-        x = x + K @ y
-        P = (np.eye(2) - K @ H) @ P
-    
-        smoothed_innovations.append(y[0][0])
-    
-    innovations_series = pd.Series(smoothed_innovations, index=data.index)
-
-    z_scores = (innovations_series - innovations_series.rolling(period).mean()) / innovations_series.rolling(period).std()
-    return z_scores.reindex(original_index).fillna(0)
+    return kalman_features(data, period)["Kalman Innovation"]
 
 
 # Second order 
 def kalman_second(data, period = 10):
-    original_index = data.index
-    
-    data["pct_change"] = data["Close"].pct_change()
-    data = data.dropna()
-    
-    q = 0.05
-    r = 1.0
-
-    if data.empty:
+    if data["Close"].pct_change().dropna().empty:
         return [0] * 10
-        
-    x = np.array([[data["pct_change"].iloc[0]], [0.0]])
-    P = np.eye(2)
-    F = np.array([[1, 1.0],
-                  [0, 1]])
-    H = np.array([[1, 0]])
-    Q = np.eye(2) * q
-    R = np.array([[r]])
-    
-    smoothed_innovations = []
-    
-    for z in data["pct_change"]:
-        x = F @ x
-        P = F @ P @ F.T + Q
-        
-        # Update
-        y = z - (H @ x) # Innovation
-        S = H @ P @ H.T + R
-        K = P @ H.T @ np.linalg.inv(S)
-        x = x + K @ y
-        P = (np.eye(2) - K @ H) @ P
-    
-        smoothed_innovations.append(x[1][0])
-    
-    innovations_series = pd.Series(smoothed_innovations, index=data.index)
+    return kalman_features(data, period)["Second Order Kalman"]
 
-    z_scores = (innovations_series - innovations_series.rolling(period).mean()) / innovations_series.rolling(period).std()
-    return z_scores.reindex(original_index).fillna(0)
 
 
-
-def perc_retrac_second(data, period):
-    # 1. Get the RAW (Unsigned) Position (0.0 to 1.0)
-    # We do NOT want the trend logic interfering with the derivative
-    raw_position = get_rolling_retrac(data, period, raw=True)
-    
+def _retrac_acceleration(raw_position):
     # 2. Calculate "Velocity" (Change in Position)
     velocity = raw_position.diff()
     
@@ -216,6 +366,122 @@ def perc_retrac_second(data, period):
     # This removes the day-to-day noise
     return acceleration.rolling(window=5).mean()
 
+def perc_retrac_second(data, period):
+    # 1. Get the RAW (Unsigned) Position (0.0 to 1.0)
+    # We do NOT want the trend logic interfering with the derivative
+    raw_position = get_rolling_retrac(data, period, raw=True)
+    return _retrac_acceleration(raw_position)
+
+def retrac_panel(close, period=14):
+    """
+    Percentage Retracement and its second order version for a stacked (bars x tickers)
+    close array, sharing one rolling-extrema pass per flavour.
+    """
+    raw_position, signed = _retrac_positions(close, period)
+    return {
+        "Percentage Retracement": signed,
+        "Second Order Percentage Retracement": _retrac_acceleration(pd.DataFrame(raw_position)).to_numpy(),
+    }
+
+
+def rolling_lag_corr(stock, bench, period=20, max_lag=5):
+    """
+    Lead/lag correlation kernel. For every row t, correlates the returns window
+    [t - period, t - 1] with the benchmark window shifted by each lag in
+    -max_lag..max_lag, and keeps the lag with the highest correlation.
+
+    stock/bench are 1-D or 2-D (bars x tickers) return arrays, leading NaN padding allowed.
+    All windows and lags come from prefix sums, so the cost is O(n * lags) instead of
+    one pandas correlation per window per lag.
+    Returns (lags, corrs) shaped like stock, NaN where the window isn't full.
+    """
+    stock = np.asarray(stock, dtype=float)
+    bench = np.asarray(bench, dtype=float)
+    squeeze = stock.ndim == 1
+    stock = stock[:, None] if squeeze else stock
+    bench = np.broadcast_to(bench[:, None] if bench.ndim == 1 else bench, stock.shape)
+    n, k = stock.shape
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    valid = ~np.isnan(stock) & ~np.isnan(bench)
+    start = np.where(valid.any(axis=0), valid.argmax(axis=0), n) if n else np.zeros(k, dtype=int)
+
+    # Centre each column (correlation is shift invariant) to keep the prefix sums well conditioned
+    count = np.maximum(valid.sum(axis=0), 1)
+    s = np.where(valid, stock, 0.0)
+    b = np.where(valid, bench, 0.0)
+    s = np.where(valid, s - s.sum(axis=0) / count, 0.0)
+    b = np.where(valid, b - b.sum(axis=0) / count, 0.0)
+
+    def prefix(x):
+        return np.vstack([np.zeros((1, k)), np.cumsum(x, axis=0)])
+
+    def changes(x):
+        # Number of value changes, to detect flat (zero variance) windows exactly
+        chg = np.zeros(x.shape)
+        chg[1:] = x[1:] != x[:-1]
+        return prefix(chg)
+
+    ps, pss, cs = prefix(s), prefix(s * s), changes(s)
+    pb, pbb, cb = prefix(b), prefix(b * b), changes(b)
+
+    def window(p, a, c):
+        # Sum over rows a..c inclusive, for arrays of row bounds
+        return p[c + 1] - p[a]
+
+    t = np.arange(period, n)
+    lag_out = np.full((n, k), np.nan)
+    corr_out = np.full((n, k), np.nan)
+    if len(t) == 0:
+        return (lag_out[:, 0], corr_out[:, 0]) if squeeze else (lag_out, corr_out)
+
+    corrs = np.zeros((len(lags), len(t), k))
+    for li, lag in enumerate(lags):
+        m = period - abs(lag)
+        if m < 2:
+            continue
+        a = t - period + max(lag, 0)
+        c = t - 1 - max(-lag, 0)
+
+        # s[i] * b[i - lag], zero where i - lag is out of range
+        shifted = np.zeros((n, k))
+        if lag >= 0:
+            shifted[lag:] = b[:n - lag]
+        else:
+            shifted[:n + lag] = b[-lag:]
+        psb = prefix(s * shifted)
+
+        sx, sy = window(ps, a, c), window(pb, a - lag, c - lag)
+        sxx, syy = window(pss, a, c), window(pbb, a - lag, c - lag)
+        sxy = window(psb, a, c)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = (m * sxy - sx * sy) / np.sqrt((m * sxx - sx * sx) * (m * syy - sy * sy))
+        if m == 2:
+            # Two points are always perfectly (anti-)correlated, avoid rounding breaking argmax ties
+            r = np.sign(r)
+        flat = (window(cs, a + 1, c) == 0) | (window(cb, a - lag + 1, c - lag) == 0)
+        r = np.where(flat | ~np.isfinite(r), 0.0, np.clip(r, -1.0, 1.0))
+        corrs[li] = r
+
+    # Ties go to the first (most negative) lag, like np.argmax over the list
+    best = np.argmax(corrs, axis=0)
+    best_lag = lags[best].astype(float)
+    best_corr = np.take_along_axis(corrs, best[None], axis=0)[0]
+
+    # Flat full window -> lag 0, correlation 0
+    a, c = t - period, t - 1
+    flat = (window(cs, a + 1, c) == 0) | (window(cb, a + 1, c) == 0)
+    best_lag[flat] = 0
+    best_corr[flat] = 0.0
+
+    full = t[:, None] - period >= start[None, :]
+    lag_out[t] = np.where(full, best_lag, np.nan)
+    corr_out[t] = np.where(full, best_corr, np.nan)
+
+    if squeeze:
+        return lag_out[:, 0], corr_out[:, 0]
+    return lag_out, corr_out
 
 def get_lag_and_corr(data, benchmark, period=20, max_lag=5):
     s_vals = data["Close"] if isinstance(data, pd.DataFrame) else data
@@ -226,45 +492,122 @@ def get_lag_and_corr(data, benchmark, period=20, max_lag=5):
         "bench": b_vals.pct_change()
     }).dropna()
 
-    list_lags = []
-    list_corrs = []
-    dates = []
-    lags = list(range(-max_lag, max_lag + 1))
-
-    # 2. Loop with Error Silencing
-    for t in range(period, len(df)):
-        window = df.iloc[t-period : t]
-        
-        # Check if window is valid (has variance)
-        if window['stock'].std() == 0 or window['bench'].std() == 0:
-            # If flat line, correlation is 0 (or undefined)
-            list_lags.append(0)
-            list_corrs.append(0.0)
-            dates.append(df.index[t])
-            continue
+    lags, corrs = rolling_lag_corr(df["stock"].to_numpy(), df["bench"].to_numpy(), period, max_lag)
+    dates = df.index[period:]
+    return pd.Series(lags[period:].astype(int), index=dates), pd.Series(corrs[period:], index=dates)
+
+def _paired_panel_returns(panel, benchmark):
+    """
+    Stacked returns of every panel ticker and of the benchmark, each ticker paired with the
+    benchmark on the dates both traded (same as the per-ticker dropna after joining).
+    Returns (stock, bench, joint): both stacked on `joint`, the calendar mask of those dates,
+    so results come back to the panel's own bars through _on_panel_bars.
+    """
+    close = panel.stacked("Close")
+    rets = np.full(close.shape, np.nan)
+    rets[1:] = close[1:] / close[:-1] - 1
+    stock = panel.unstack(rets)
 
-        window_corrs = []
-        for lag in lags:
-            series_stock = window['stock']
-            series_bench = window['bench'].shift(lag)
-            
-            # SILENCE THE WARNINGS
-            with np.errstate(all='ignore'):
-                val = series_stock.corr(series_bench)
-            
-            window_corrs.append(val if not np.isnan(val) else 0.0)
-
-        # 3. Extract Best
-        best_idx = np.argmax(window_corrs)
-        
-        best_lag_day = lags[best_idx]          # Integer (e.g. -2)
-        best_corr_score = window_corrs[best_idx] # Float (e.g. 0.85)
-
-        list_lags.append(best_lag_day)
-        list_corrs.append(best_corr_score)
-        dates.append(df.index[t])
-
-    return pd.Series(list_lags, index=dates), pd.Series(list_corrs, index=dates)
+    b_vals = benchmark["Close"] if isinstance(benchmark, pd.DataFrame) else benchmark
+    bench = b_vals.pct_change().reindex(panel.dates).to_numpy()
+    bench = np.broadcast_to(bench[:, None], stock.shape)
+
+    joint = ~np.isnan(stock) & ~np.isnan(bench)
+    return panel.stack(stock, joint), panel.stack(bench, joint), joint
+
+def _on_panel_bars(panel, stacked, joint):
+    """
+    Values stacked on the paired dates re-stacked onto each ticker's own bars (panel.mask),
+    NaN on the days the benchmark didn't trade, so they line up with every other indicator.
+    """
+    return panel.stack(panel.unstack(stacked, joint))
+
+def lag_and_corr_panel(panel, benchmark, period=20, max_lag=5):
+    """
+    get_lag_and_corr for every ticker of a UniversePanel against one benchmark.
+    Returns stacked (lags, corrs) arrays on the panel's bars.
+    """
+    stock, bench, joint = _paired_panel_returns(panel, benchmark)
+    lags, corrs = rolling_lag_corr(stock, bench, period, max_lag)
+    return _on_panel_bars(panel, lags, joint), _on_panel_bars(panel, corrs, joint)
+
+def rolling_ols(y, x, period=20):
+    """
+    Rolling regression y = alpha + beta * x over trailing windows of `period` rows,
+    from running sums so each window costs O(1) instead of a refit.
+    y/x are 1-D or 2-D (bars x tickers) return arrays, leading NaN padding allowed.
+    Returns {"alpha", "beta", "r2", "resid_vol"} arrays shaped like y,
+    alpha and residual vol annualised (252 days).
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.asarray(x, dtype=float)
+    squeeze = y.ndim == 1
+    y = y[:, None] if squeeze else y
+    x = np.broadcast_to(x[:, None] if x.ndim == 1 else x, y.shape)
+    n, k = y.shape
+
+    valid = ~np.isnan(y) & ~np.isnan(x)
+    start = np.where(valid.any(axis=0), valid.argmax(axis=0), n) if n else np.zeros(k, dtype=int)
+
+    # Centre each column, the intercept is shifted back at the end
+    count = np.maximum(valid.sum(axis=0), 1)
+    my = np.where(valid, y, 0.0).sum(axis=0) / count
+    mx = np.where(valid, x, 0.0).sum(axis=0) / count
+    yc = np.where(valid, y - my, 0.0)
+    xc = np.where(valid, x - mx, 0.0)
+
+    def rolling_sum(v):
+        c = np.vstack([np.zeros((1, k)), np.cumsum(v, axis=0)])
+        out = np.full((n, k), np.nan)
+        if n >= period:
+            out[period - 1:] = c[period:] - c[:n - period + 1]
+        return out
+
+    m = period
+    sx, sy = rolling_sum(xc), rolling_sum(yc)
+    sxx_c = rolling_sum(xc * xc) - sx * sx / m
+    syy_c = rolling_sum(yc * yc) - sy * sy / m
+    sxy_c = rolling_sum(xc * yc) - sx * sy / m
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = sxy_c / sxx_c
+        alpha = (sy + m * my - beta * (sx + m * mx)) / m
+        r2 = np.clip(sxy_c * sxy_c / (sxx_c * syy_c), 0.0, 1.0)
+        ssr = np.maximum(syy_c - beta * sxy_c, 0.0)
+        resid_vol = np.sqrt(ssr / (m - 2)) if m > 2 else np.full((n, k), np.nan)
+
+    rows = np.arange(n)[:, None]
+    full = rows - (period - 1) >= start[None, :]
+    flat = ~(sxx_c > 1e-16 * m)
+    out = {
+        "alpha": np.where(full & ~flat, alpha * 252, np.nan),
+        "beta": np.where(full & ~flat, beta, np.nan),
+        "r2": np.where(full & ~flat, r2, np.nan),
+        "resid_vol": np.where(full & ~flat, resid_vol * np.sqrt(252), np.nan),
+    }
+    if squeeze:
+        return {name: v[:, 0] for name, v in out.items()}
+    return out
+
+def get_rolling_regression(data, benchmark, period=20):
+    """ Rolling alpha/beta/R^2/residual vol of the asset's returns against the benchmark's. """
+    s_vals = data["Close"] if isinstance(data, pd.DataFrame) else data
+    b_vals = benchmark["Close"] if isinstance(benchmark, pd.DataFrame) else benchmark
+
+    df = pd.DataFrame({
+        "stock": s_vals.pct_change(),
+        "bench": b_vals.pct_change()
+    }).dropna()
+
+    return pd.DataFrame(rolling_ols(df["stock"].to_numpy(), df["bench"].to_numpy(), period), index=df.index)
+
+def get_rolling_alpha(data, benchmark, period=20):
+    return get_rolling_regression(data, benchmark, period)["alpha"]
+
+def rolling_ols_panel(panel, benchmark, period=20):
+    """ rolling_ols for every ticker of a UniversePanel against one benchmark, stacked arrays on the panel's bars. """
+    stock, bench, joint = _paired_panel_returns(panel, benchmark)
+    return {name: _on_panel_bars(panel, v, joint) for name, v in rolling_ols(stock, bench, period).items()}
 
 # --- WRAPPERS (Debug Mode) ---
 
@@ -278,27 +621,194 @@ def get_lag_corr(data, benchmark, period=20):
     # Debug: Print one value to prove it's a Float
     return corrs
 
-def get_indic(indic):
-    # First order
-    if indic == "DMA":
-        return get_dma
-    if indic == "First Order Kalman":
-        return kalman_first
-    if indic == "Kalman Innovation":
-        return get_smoothed
-    if indic == "Percentage Retracement":
-        return get_rolling_retrac
-    if indic == "Lag/Lead Days":
-        return get_lag_days
+# --- REGISTRY ---
+# Bars the Kalman filter needs to forget its initial state (z-scores settle to ~1e-9)
+KALMAN_SETTLE = 80
+
+class IndicatorSpec:
+    """
+    One indicator as the screener/backtester sees it:
+    - func(data, period) or func(data, benchmark, period): the per-ticker function
+    - warmup(period): bars of history before the first fully warmed-up value
+    - benchmark: needs a benchmark series
+    - outputs: the columns its kernel computes in one pass (its own first)
+    - panel(panel, period, bench): stacked values for a whole UniversePanel, or None
+    - incremental: has a bar-by-bar version in incremental.INCREMENTAL
+    - chart_range: half-width of the scatter's axis lines
+    """
+    __slots__ = ("name", "func", "warmup", "benchmark", "outputs", "panel", "incremental", "chart_range")
+
+    def __init__(self, name, func, warmup, benchmark=False, outputs=None, panel=None, incremental=False, chart_range=3):
+        self.name = name
+        self.func = func
+        self.warmup = warmup
+        self.benchmark = benchmark
+        self.outputs = outputs or (name,)
+        self.panel = panel
+        self.incremental = incremental
+        self.chart_range = chart_range
+
+    def warmup_bars(self, period):
+        return int(self.warmup(period))
+
+KALMAN_OUTPUTS = ("First Order Kalman", "Kalman Innovation", "Second Order Kalman")
+RETRAC_OUTPUTS = ("Percentage Retracement", "Second Order Percentage Retracement")
+LAG_OUTPUTS = ("Lag/Lead Days", "Lag/Lead Corr")
+
+def _kalman(name):
+    return IndicatorSpec(
+        name, {"First Order Kalman": kalman_first, "Kalman Innovation": get_smoothed, "Second Order Kalman": kalman_second}[name],
+        warmup=lambda period: period + 1 + KALMAN_SETTLE,
+        outputs=(name,) + tuple(o for o in KALMAN_OUTPUTS if o != name),
+        panel=lambda panel, period, bench: kalman_panel(panel.stacked(), period)[name],
+        incremental=True,
+    )
 
+# In the order the pickers show them
+REGISTRY = {spec.name: spec for spec in [
+    # First order
+    # Calendar windows: the std looks back 2 * period days
+    IndicatorSpec("DMA", get_dma, warmup=lambda period: 2 * period + 1, incremental=True),
+    _kalman("Kalman Innovation"),
+    _kalman("First Order Kalman"),
     # Second order
-    if indic == "Second Order Kalman":
-        return kalman_second
-    if indic == "Second Order Percentage Retracement":
-        return perc_retrac_second
-    if indic == "Second Order DMA":
-        return get_dma_second
-    if indic == "Rolling Alpha":
-        return get_rolling_alpha
-    if indic == "Lag/Lead Corr":
-        return get_lag_corr
+    _kalman("Second Order Kalman"),
+    IndicatorSpec("Percentage Retracement", get_rolling_retrac, warmup=lambda period: period,
+                  outputs=RETRAC_OUTPUTS, incremental=True, chart_range=1,
+                  panel=lambda panel, period, bench: retrac_panel(panel.stacked(), period)["Percentage Retracement"]),
+    # Two diffs and a 5 bar mean on top of the raw position
+    IndicatorSpec("Second Order Percentage Retracement", perc_retrac_second, warmup=lambda period: period + 6,
+                  outputs=RETRAC_OUTPUTS[::-1], chart_range=0.5,
+                  panel=lambda panel, period, bench: retrac_panel(panel.stacked(), period)["Second Order Percentage Retracement"]),
+    # Two diffs of the period MA, then a 2 * period std
+    IndicatorSpec("Second Order DMA", get_dma_second, warmup=lambda period: 3 * period + 1),
+    # Returns, then a period window (lags shift inside the benchmark's history)
+    IndicatorSpec("Lag/Lead Days", get_lag_days, warmup=lambda period: period + 2, benchmark=True,
+                  outputs=LAG_OUTPUTS, chart_range=20,
+                  panel=lambda panel, period, bench: lag_and_corr_panel(panel, bench, period)[0]),
+    IndicatorSpec("Rolling Alpha", get_rolling_alpha, warmup=lambda period: period + 1, benchmark=True,
+                  outputs=("Rolling Alpha", "beta", "r2", "resid_vol"), chart_range=1,
+                  panel=lambda panel, period, bench: rolling_ols_panel(panel, bench, period)["alpha"]),
+    IndicatorSpec("Lag/Lead Corr", get_lag_corr, warmup=lambda period: period + 2, benchmark=True,
+                  outputs=LAG_OUTPUTS[::-1], chart_range=1,
+                  panel=lambda panel, period, bench: lag_and_corr_panel(panel, bench, period)[1]),
+]}
+
+INDICATOR_OPTIONS = list(REGISTRY)
+REQUIRES_BENCHMARK = [name for name, spec in REGISTRY.items() if spec.benchmark]
+
+def get_indic(indic):
+    """ The per-ticker function of a registered indicator. """
+    return REGISTRY[indic].func
+
+def lookback_bars(indics, periods):
+    """ Bars of history the slowest of these (indicator, period) pairs needs to warm up. """
+    return max(REGISTRY[indic].warmup_bars(period) for indic, period in zip(indics, periods))
+
+# --- FEATURE MATRIX ---
+# Every registered indicator for a whole panel in one pipeline, sharing the intermediates
+# the per-indicator functions each recompute: returns, the Kalman state, rolling moments,
+# rolling extrema and the benchmark-paired returns.
+FEATURES = INDICATOR_OPTIONS
+
+def panel_intermediates(panel):
+    """
+    Period-independent pieces of a panel's features, shared by the matrices of every period:
+    stacked close and returns, and the Kalman filter outputs (the filter doesn't see the period).
+    """
+    close = panel.stacked()
+    rets = np.full(close.shape, np.nan)
+    rets[1:] = close[1:] / close[:-1] - 1
+    level, innovation, slope = kalman_filter(rets)
+    return {"close": close, "rets": rets, "kalman": {"First Order Kalman": level, "Kalman Innovation": innovation, "Second Order Kalman": slope}}
+
+class FeatureMatrix:
+    """
+    All FEATURES at one period for a panel: `values` is a stacked (bars x tickers x features)
+    array (see UniversePanel.stacked), NaN where a ticker has no value. Every feature is on
+    the ticker's own bars, benchmark features are NaN on days the benchmark didn't trade and
+    everywhere without a benchmark. Picking an indicator is a slice, not a recompute.
+    """
+
+    def __init__(self, panel, period, values, features=FEATURES, bench_ticker=None):
+        self.panel = panel
+        self.period = period
+        self.values = values
+        self.features = list(features)
+        self.bench_ticker = bench_ticker
+        self._loc = {f: i for i, f in enumerate(self.features)}
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def stacked(self, feature):
+        """ Bar-aligned (bars x tickers) values of one feature. """
+        return self.values[:, :, self._loc[feature]]
+
+    def matrix(self, feature):
+        """ Calendar-aligned (dates x tickers) values of one feature. """
+        return self.panel.unstack(self.stacked(feature))
+
+    def tidy(self, last=None):
+        """ Long (date, ticker, feature, value) frame of the non-NaN values, the last `last` bars of each ticker. """
+        values = self.values
+        if last is not None:
+            values = values.copy()
+            values[:-last] = np.nan
+        calendar = np.stack([self.panel.unstack(values[:, :, i]) for i in range(len(self.features))], axis=-1)
+        d, t, f = np.nonzero(~np.isnan(calendar))
+        return pd.DataFrame({
+            "date": self.panel.dates[d],
+            "ticker": pd.Categorical.from_codes(t, self.panel.tickers),
+            "feature": pd.Categorical.from_codes(f, self.features),
+            "value": calendar[d, t, f],
+        })
+
+def feature_matrix(panel, period, bench=None, bench_ticker=None, base=None):
+    """
+    FeatureMatrix of every registered indicator at `period` for a UniversePanel, matching
+    the per-ticker functions. `base` is panel_intermediates(panel) to share across periods,
+    `bench` the benchmark bars for the benchmark indicators.
+    """
+    base = base or panel_intermediates(panel)
+    close, rets = base["close"], base["rets"]
+    valid = ~np.isnan(close)
+    out = {}
+
+    # 1. Kalman: one filter run, z-scored over the period
+    for name, state in base["kalman"].items():
+        moments = rolling_moments(state, period)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (state - moments["mean"]) / moments["std"]
+        out[name] = np.where(valid, np.nan_to_num(z), np.nan)
+
+    # 2. Retracements: one rolling-extrema pass for the signed and raw positions
+    out.update(retrac_panel(close, period))
+
+    # 3. DMA on calendar windows (NaN days don't count), second order on bar windows
+    frame = pd.DataFrame(panel.close, index=panel.dates)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (frame - frame.rolling(f"{period}D").mean()) / frame.rolling(f"{2 * period}D").std()
+    out["DMA"] = panel.stack(z.to_numpy())
+
+    ma = rolling_moments(close, period)["mean"]
+    pct = (close - ma) / ma
+    accel = np.full(close.shape, np.nan)
+    accel[2:] = pct[2:] - 2 * pct[1:-1] + pct[:-2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["Second Order DMA"] = accel / rolling_moments(accel, 2 * period)["std"]
+
+    # 4. Benchmark features from one set of paired returns, back on the panel's bars
+    if bench is not None and not bench.empty:
+        stock, paired, joint = _paired_panel_returns(panel, bench)
+        lags, corrs = rolling_lag_corr(stock, paired, period)
+        out["Lag/Lead Days"] = _on_panel_bars(panel, lags, joint)
+        out["Lag/Lead Corr"] = _on_panel_bars(panel, corrs, joint)
+        out["Rolling Alpha"] = _on_panel_bars(panel, rolling_ols(stock, paired, period)["alpha"], joint)
+
+    values = np.full(close.shape + (len(FEATURES),), np.nan)
+    for i, name in enumerate(FEATURES):
+        if name in out:
+            values[:, :, i] = out[name]
+    return FeatureMatrix(panel, period, values, FEATURES, bench_ticker)
@@ -5,6 +5,9 @@ from datetime import date, timedelta
 from polygon import RESTClient
 from dotenv import load_dotenv
 import os
+import sys
+from store import BarStore
+from features import REGISTRY, rolling_moments
 
 UNIVERSE = {
     # =========================
@@ -199,22 +202,6 @@ UNIVERSE = {
     "ETH":  {"asset_class": "crypto_etf", "group": "spot_eth_etf", "region": "US", "sector": None, "name": "Grayscale Ethereum Mini Trust"},
 }
 
-RANGES = {
-    # First order
-    "DMA": 3,
-    "First Order Kalman": 3,
-    "Kalman Innovation": 3,
-    "Percentage Retracement": 1,
-
-    # Second order
-    "Second Order Kalman": 3,
-    "Second Order Percentage Retracement": 0.5,
-    "Second Order DMA": 3,
-    "Lag/Lead Days": 20,
-    "Rolling Alpha": 1,
-    "Lag/Lead Corr": 1
-}
-
 def get_dataframe():
     """
     Convert UNIVERSE dict -> pandas DataFrame for easy filtering/grouping.
@@ -274,12 +261,13 @@ def get_data():
     print(df_universe.head())
     print(len(tickers), tickers[:20])
 
-def get_volume(data):
-    data['vol_ma'] = data['Volume'].rolling(20).mean()
-    data['vol_std'] = data['Volume'].rolling(20).std()
-    data['vol_z'] = (data['Volume'] - data['vol_ma']) / data['vol_std']
-
-    return pd.Series(data["vol_z"])
+def get_volume(data, window=20):
+    """ Volume z-score against its rolling `window`-bar mean and std. Leaves data untouched. """
+    volume = data["Volume"].to_numpy(dtype=float)
+    moments = rolling_moments(volume, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vol_z = (volume - moments["mean"]) / moments["std"]
+    return pd.Series(vol_z, index=data.index, name="vol_z")
 
 def get_extreme(data):
     count = 0
@@ -319,55 +307,105 @@ def get_extreme(data):
     return min_price, days
 
 load_dotenv()
-client = RESTClient(st.secrets["POLYGON_API_KEY"])
-def get_polygon_data(ticker, days_back=730):
+client = None
+store = BarStore()
+
+def get_client():
     """
-    Fetches historical data from Polygon and returns a DataFrame 
-    structured EXACTLY like yfinance (Date Index, Close, Volume).
+    Polygon client, created on first use so importing this module needs no API key or Streamlit runtime.
+    Key from POLYGON_API_KEY (environment / .env), else Streamlit secrets.
+    POLYGON_BASE_URL points it at another server (e.g. a local stub replaying recorded responses).
+    """
+    global client
+    if client is None:
+        key = os.getenv("POLYGON_API_KEY")
+        if not key:
+            try:
+                key = st.secrets["POLYGON_API_KEY"]
+            except Exception as e:
+                raise RuntimeError("Set POLYGON_API_KEY in the environment or .streamlit/secrets.toml") from e
+        client = RESTClient(key, base=os.getenv("POLYGON_BASE_URL", "https://api.polygon.io"))
+    return client
+
+def fetch_aggs(ticker, from_date, to_date, client=None):
+    """
+    Raw Polygon daily aggregates for [from_date, to_date] as a (Date index, Close, Volume)
+    DataFrame. Unlike get_polygon_data this raises on API errors.
+    """
+    client = client or get_client()
+    # 1 = multiplier, "day" = timespan
+    aggs = client.get_aggs(
+        ticker=ticker, 
+        multiplier=1, 
+        timespan="day", 
+        from_=from_date, 
+        to=to_date
+    )
+
+    if not aggs:
+        return pd.DataFrame()
+
+    data = [
+        {
+            "Date": pd.to_datetime(a.timestamp, unit="ms"),
+            "Close": a.close,
+            "Volume": a.volume
+        } 
+        for a in aggs
+    ]
+    
+    df = pd.DataFrame(data)
+    df.set_index("Date", inplace=True)
+    df["Close"] = df["Close"].astype(float)
+    df["Volume"] = df["Volume"].astype(float)
+    return df[["Close", "Volume"]]
+
+def load_bars(ticker, days_back=730, client=None):
+    """
+    Reads the ticker from the local bar store and only asks Polygon for what is missing:
+    older history if days_back reaches further than what we have, and everything since
+    the last stored bar (which is re-fetched in case it was a partial day), unless
+    ingest.py already refreshed the whole universe today.
+    Raises on API errors.
     """
     # 1. Define Date Range
     to_date = date.today()
     from_date = to_date - timedelta(days=days_back)
 
+    # 2. Top up the store
+    bars = store.read(ticker)
+    if bars.empty:
+        bars = store.append(ticker, fetch_aggs(ticker, from_date, to_date, client), covered_from=str(from_date))
+    else:
+        first = store.covered_from(bars)
+        last = bars.index[-1].date()
+        if from_date < first:
+            older = fetch_aggs(ticker, from_date, first - timedelta(days=1), client)
+            bars = store.append(ticker, older, covered_from=str(from_date))
+        if last <= to_date and bars.attrs.get("refreshed") != str(to_date):
+            bars = store.append(ticker, fetch_aggs(ticker, last, to_date, client))
+
+    # 3. Handle Empty Responses
+    if bars.empty:
+        return pd.DataFrame()
+
+    return bars.loc[bars.index >= pd.Timestamp(from_date), ["Close", "Volume"]]
+
+def get_polygon_data(ticker, days_back=730):
+    """
+    Fetches historical data from Polygon and returns a DataFrame 
+    structured EXACTLY like yfinance (Date Index, Close, Volume).
+    Served from the local bar store, only the missing dates hit the API.
+    """
     try:
-        # 2. Fetch Aggregates (Bars)
-        # 1 = multiplier, "day" = timespan
-        aggs = client.get_aggs(
-            ticker=ticker, 
-            multiplier=1, 
-            timespan="day", 
-            from_=from_date, 
-            to=to_date
-        )
-        
-        # 3. Handle Empty Responses
-        if not aggs:
-            return pd.DataFrame() # Return empty if no data
-
-        data = [
-            {
-                "Date": pd.to_datetime(a.timestamp, unit="ms"),
-                "Close": a.close,
-                "Volume": a.volume
-            } 
-            for a in aggs
-        ]
-        
-        df = pd.DataFrame(data)
-        
-        df.set_index("Date", inplace=True)
-        
-        df["Close"] = df["Close"].astype(float)
-        df["Volume"] = df["Volume"].astype(float)
-        
-        return df[["Close", "Volume"]]
+        return load_bars(ticker, days_back)
 
     except Exception as e:
-        print(f"Error fetching {ticker}: {e}")
+        print(f"Error fetching {ticker}: {e}", file=sys.stderr)
         return pd.DataFrame()
 
 def get_range(indic):
-    return RANGES[indic]
+    return REGISTRY[indic].chart_range
 
 @st.dialog("Meaning of an Expensive Asset")
 def rich():
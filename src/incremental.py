@@ -0,0 +1,229 @@
+from abc import ABC, abstractmethod
+from collections import deque
+import numpy as np
+import pandas as pd
+from features import KALMAN_Q, KALMAN_R
+
+'''
+Stateful versions of the screener indicators. Build one from history with
+Indicator.from_history(data) (an O(n) warm-up), then feed each new daily bar to
+.update(bar) for an O(1) step instead of recomputing the full history.
+A bar is anything with "Close" (and "Volume" / "Date") keys, e.g. df.iloc[i].
+'''
+
+
+def _bar_fields(bar):
+    date = bar["Date"] if "Date" in bar else getattr(bar, "name", None)
+    volume = bar["Volume"] if "Volume" in bar else np.nan
+    return pd.Timestamp(date) if date is not None else None, float(bar["Close"]), float(volume)
+
+
+class RollingStats:
+    """ Mean/std (ddof=1) of the last `window` values, Welford add/remove so it doesn't drift. """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.values.append(x)
+        n = len(self.values)
+        d = x - self.mean
+        self.mean += d / n
+        self.m2 += d * (x - self.mean)
+        if n > self.window:
+            self.remove()
+
+    def remove(self):
+        y = self.values.popleft()
+        n = len(self.values)
+        if n == 0:
+            self.mean, self.m2 = 0.0, 0.0
+            return
+        d = y - self.mean
+        self.mean -= d / n
+        self.m2 = max(self.m2 - d * (y - self.mean), 0.0)
+
+    @property
+    def full(self):
+        return len(self.values) >= self.window
+
+    def std(self):
+        n = len(self.values)
+        return np.sqrt(self.m2 / (n - 1)) if n > 1 else np.nan
+
+
+class TimeRollingStats(RollingStats):
+    """ Same over a calendar window like pandas' rolling("30D"): dates in (t - days, t]. """
+
+    def __init__(self, days):
+        super().__init__(window=np.inf)
+        self.days = pd.Timedelta(days=days)
+        self.dates = deque()
+
+    def add_at(self, date, x):
+        self.dates.append(date)
+        self.add(x)
+        while self.dates and self.dates[0] <= date - self.days:
+            self.dates.popleft()
+            self.remove()
+
+
+def _zscore(x, stats):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (x - stats.mean) / stats.std()
+
+
+class Indicator(ABC):
+    """ Base class: update(bar) -> latest value, from_history(data) -> warmed-up instance. """
+
+    @abstractmethod
+    def update(self, bar):
+        """ Folds one bar into the state and returns the indicator's value at that bar. """
+
+    @classmethod
+    def from_history(cls, data, *args, **kwargs):
+        ind = cls(*args, **kwargs)
+        ind.run(data)
+        return ind
+
+    def run(self, data):
+        """ Feeds every bar of `data` and returns the values as a Series (used for warm-up and checks). """
+        df = data.reset_index()
+        df = df.rename(columns={df.columns[0]: "Date"})
+        values = [self.update(bar) for bar in df.to_dict("records")]
+        return pd.Series(values, index=data.index, dtype=float)
+
+
+class DMAIndicator(Indicator):
+    """ get_dma: distance from the `period`-day mean in units of the 2 * period-day std. """
+
+    def __init__(self, period=30):
+        self.mean = TimeRollingStats(period)
+        self.std = TimeRollingStats(2 * period)
+
+    def update(self, bar):
+        date, close, _ = _bar_fields(bar)
+        self.mean.add_at(date, close)
+        self.std.add_at(date, close)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (close - self.mean.mean) / self.std.std()
+
+
+class VolumeZ(Indicator):
+    """ helper.get_volume: z-score of volume against its last `window` bars. """
+
+    def __init__(self, window=20):
+        self.stats = RollingStats(window)
+
+    def update(self, bar):
+        _, _, volume = _bar_fields(bar)
+        self.stats.add(volume)
+        if not self.stats.full:
+            return np.nan
+        return _zscore(volume, self.stats)
+
+
+class KalmanIndicator(Indicator):
+    """
+    kalman_first / get_smoothed / kalman_second: carries the filter state (x, P) forward
+    and z-scores the chosen output ("level", "innovation" or "slope") over `period` bars.
+    """
+
+    def __init__(self, period=10, output="level", q=KALMAN_Q, r=KALMAN_R):
+        self.output = output
+        self.q, self.r = q, r
+        self.stats = RollingStats(period)
+        self.prev_close = None
+        self.x = None
+        self.P = (1.0, 0.0, 1.0)
+
+    def step(self, z):
+        if self.x is None:
+            self.x = (z, 0.0)
+        p00, p01, p11 = self.P
+        a00 = p00 + 2 * p01 + p11 + self.q
+        a01 = p01 + p11
+        a11 = p11 + self.q
+        s = a00 + self.r
+        k0, k1 = a00 / s, a01 / s
+        self.P = ((1 - k0) * a00, (1 - k0) * a01, a11 - k1 * a01)
+
+        x0, x1 = self.x
+        pred = x0 + x1
+        y = z - pred
+        self.x = (pred + k0 * y, x1 + k1 * y)
+        return {"level": self.x[0], "innovation": y, "slope": self.x[1]}
+
+    def update(self, bar):
+        _, close, _ = _bar_fields(bar)
+        prev, self.prev_close = self.prev_close, close
+        if prev is None:
+            return 0.0
+
+        out = self.step(close / prev - 1)[self.output]
+        self.stats.add(out)
+        if not self.stats.full:
+            return 0.0
+        value = _zscore(out, self.stats)
+        return 0.0 if np.isnan(value) else value
+
+
+class RetracementIndicator(Indicator):
+    """
+    get_rolling_retrac with monotonic deques: the rolling max/min and where they happened
+    are maintained in amortised O(1) per bar.
+    """
+
+    def __init__(self, period=14, raw=False):
+        self.period = period
+        self.raw = raw
+        self.t = -1
+        # (position, price), front is the window's extreme; earlier equal prices stay in front
+        self.maxq = deque()
+        self.minq = deque()
+
+    def update(self, bar):
+        _, close, _ = _bar_fields(bar)
+        self.t += 1
+        while self.maxq and self.maxq[-1][1] < close:
+            self.maxq.pop()
+        self.maxq.append((self.t, close))
+        while self.minq and self.minq[-1][1] > close:
+            self.minq.pop()
+        self.minq.append((self.t, close))
+
+        start = self.t - self.period + 1
+        while self.maxq[0][0] < start:
+            self.maxq.popleft()
+        while self.minq[0][0] < start:
+            self.minq.popleft()
+        if start < 0:
+            return np.nan
+
+        (max_pos, roll_max), (min_pos, roll_min) = self.maxq[0], self.minq[0]
+        price_range = roll_max - roll_min
+        retrac = (close - roll_min) / price_range if price_range != 0 else 0.0
+        if self.raw or max_pos < min_pos:
+            return retrac
+        return -retrac
+
+
+INCREMENTAL = {
+    "DMA": DMAIndicator,
+    "First Order Kalman": lambda period: KalmanIndicator(period, "level"),
+    "Kalman Innovation": lambda period: KalmanIndicator(period, "innovation"),
+    "Second Order Kalman": lambda period: KalmanIndicator(period, "slope"),
+    "Percentage Retracement": RetracementIndicator,
+}
+
+
+def make_incremental(indic, period, data=None):
+    """ Incremental indicator for a screener name, warmed up on `data` if given. """
+    ind = INCREMENTAL[indic](period)
+    if data is not None:
+        ind.run(data)
+    return ind
+
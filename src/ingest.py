@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import pandas as pd
+from helper import UNIVERSE, get_client, store as default_store
+from loader import rate_limited, is_rate_limited, REQUESTS_PER_MINUTE, MAX_IN_FLIGHT
+
+'''
+Whole-universe refresh from Polygon's grouped-daily endpoint: one request per trading day
+(per market) returns every ticker's bar, instead of one get_aggs call per ticker. The bars
+are filtered to the universe and merged into the same BarStore get_polygon_data reads, in
+the same (Date index, Close, Volume) format. Finished dates are recorded next to the store,
+so an interrupted backfill resumes where it stopped. From src/:
+
+    python -m ingest --days-back 730
+
+POLYGON_BASE_URL (or --base-url) points the client at another server, e.g. a local stub
+replaying recorded grouped-daily JSON.
+'''
+
+STATE_FILE = ".ingest.json"
+
+
+def market_of(ticker):
+    """ Grouped-daily market of a ticker: "crypto" for X: pairs, None for what Polygon doesn't list (=F futures). """
+    if ticker.startswith("X:"):
+        return "crypto"
+    if ticker.endswith("=F"):
+        return None
+    return "stocks"
+
+
+def bar_date(day, market):
+    """ The Date get_aggs stamps a daily bar with: midnight New York for stocks, midnight UTC for crypto. """
+    ts = pd.Timestamp(day)
+    if market == "crypto":
+        return ts
+    return ts.tz_localize("America/New_York").tz_convert("UTC").tz_localize(None)
+
+
+def trading_days(start, end, market):
+    """ Dates in [start, end] with a session: weekdays for stocks (holidays just come back empty), every day for crypto. """
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    return days if market == "crypto" else [d for d in days if d.weekday() < 5]
+
+
+class IngestState:
+    """ Dates already ingested per market, kept as JSON in the store directory. """
+
+    def __init__(self, root):
+        self.path = os.path.join(root, STATE_FILE)
+        try:
+            with open(self.path) as f:
+                self.done = {m: set(days) for m, days in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            self.done = {}
+
+    def is_done(self, market, day):
+        return day.isoformat() in self.done.get(market, ())
+
+    def mark(self, market, days):
+        self.done.setdefault(market, set()).update(d.isoformat() for d in days)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({m: sorted(days) for m, days in self.done.items()}, f)
+        os.replace(tmp, self.path)
+
+
+def fetch_grouped(client, day, market):
+    """ {ticker: (close, volume)} for every ticker Polygon has on `day` in this market. Raises on API errors. """
+    aggs = client.get_grouped_daily_aggs(day.isoformat(), adjusted=True, market_type=market)
+    return {a.ticker: (a.close, a.volume) for a in aggs or [] if a.close is not None}
+
+
+def ingest(tickers=None, days_back=730, client=None, store=None, today=None, chunk=20,
+           max_in_flight=MAX_IN_FLIGHT, requests_per_minute=REQUESTS_PER_MINUTE, retries=3, backoff=2.0):
+    """
+    Backfills and tops up `tickers` (default UNIVERSE) over the last days_back days from
+    grouped-daily aggregates, `chunk` dates at a time: the dates are fetched concurrently
+    (throttled like load_universe), each ticker's new bars are merged into the store once
+    per chunk, then the finished dates are recorded. Today is always re-fetched, and once it
+    has bars the tickers are marked refreshed so load_bars serves them from the store.
+    Returns a summary dict (requests, dates, bars, errors, unsupported tickers).
+    """
+    store = store or default_store
+    tickers = sorted(tickers or UNIVERSE)
+    today = today or date.today()
+    start = today - timedelta(days=days_back)
+    state = IngestState(store.root)
+    limited = rate_limited(client or get_client(), requests_per_minute)
+
+    markets = {}
+    for t in tickers:
+        markets.setdefault(market_of(t), []).append(t)
+    summary = {"requests": 0, "dates": 0, "bars": 0, "errors": {}, "unsupported": markets.pop(None, [])}
+
+    def load(day, market):
+        for attempt in range(retries + 1):
+            try:
+                return fetch_grouped(limited, day, market), None
+            except Exception as e:
+                if is_rate_limited(e) and attempt < retries:
+                    time.sleep(backoff * 2 ** attempt)
+                    continue
+                return None, f"{type(e).__name__}: {e}"
+
+    for market, names in markets.items():
+        wanted = set(names)
+        days = [d for d in trading_days(start, today, market) if d == today or not state.is_done(market, d)]
+        for i in range(0, len(days), chunk):
+            batch = days[i:i + chunk]
+            with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+                results = list(pool.map(lambda d: load(d, market), batch))
+            summary["requests"] += len(batch)
+
+            # 1. Pivot the days' results into one frame per ticker
+            rows = {t: [] for t in wanted}
+            finished = []
+            failed = []
+            refreshed = None
+            for day, (bars, error) in zip(batch, results):
+                if error:
+                    failed.append(day)
+                    summary["errors"][f"{market} {day}"] = error
+                    print(f"Error ingesting {market} {day}: {error}", file=sys.stderr)
+                    continue
+                finished.append(day)
+                if day == today and bars:
+                    refreshed = str(today)
+                for t in wanted.intersection(bars):
+                    rows[t].append((bar_date(day, market), *bars[t]))
+
+            # 2. Merge into the store, then record the dates (today stays open, it may be partial).
+            # Once today's batch is in without gaps, load_bars stops topping these tickers up one by one;
+            # failed dates elsewhere (other batches, the other market) are retried by the next run
+            refreshed = refreshed if not failed else None
+            for t, r in rows.items():
+                if not r and not refreshed:
+                    continue
+                new = pd.DataFrame(r, columns=["Date", "Close", "Volume"]).set_index("Date").astype(float)
+                store.append(t, new, covered_from=str(start), refreshed=refreshed)
+                summary["bars"] += len(r)
+            state.mark(market, [d for d in finished if d < today])
+            state.save()
+            summary["dates"] += len(finished)
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ingest", description="Backfill/top up the bar store from grouped-daily aggregates.")
+    parser.add_argument("--days-back", type=int, default=730)
+    parser.add_argument("--tickers", nargs="+", help="Explicit tickers (default: UNIVERSE)")
+    parser.add_argument("--chunk", type=int, default=20, help="Dates merged into the store at a time")
+    parser.add_argument("--base-url", help="Polygon API base URL (default: POLYGON_BASE_URL or api.polygon.io)")
+    args = parser.parse_args(argv)
+
+    if args.base_url:
+        os.environ["POLYGON_BASE_URL"] = args.base_url
+    summary = ingest(tickers=args.tickers, days_back=args.days_back, chunk=args.chunk)
+    print(f"{summary['dates']} dates, {summary['bars']:,} bars from {summary['requests']} requests")
+    if summary["unsupported"]:
+        print(f"Not in grouped daily: {', '.join(summary['unsupported'])}", file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from helper import get_client
+from cache import shared_bars
+
+# Unthrottled by default (paid plans are effectively unlimited, 429s are still retried);
+# set POLYGON_REQUESTS_PER_MINUTE=5 on the free plan
+REQUESTS_PER_MINUTE = float(os.getenv("POLYGON_REQUESTS_PER_MINUTE", 0))
+MAX_IN_FLIGHT = int(os.getenv("POLYGON_MAX_IN_FLIGHT", 8))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: refills at rate_per_minute, holds at most `burst` tokens.
+    acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can refill/check
+            time.sleep(wait)
+
+
+class RateLimitedClient:
+    """ Wraps a RESTClient (or a fake one) so every API call takes a token first. """
+
+    def __init__(self, client, bucket):
+        self.client = client
+        self.bucket = bucket
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self.bucket.acquire()
+            return attr(*args, **kwargs)
+        return call
+
+
+# The quota is per API key, so every client throttled to the same rate draws from one bucket
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def shared_bucket(requests_per_minute):
+    """ The process-wide TokenBucket for this rate, shared by concurrent loads and ingests. """
+    with _buckets_lock:
+        bucket = _buckets.get(float(requests_per_minute))
+        if bucket is None:
+            bucket = _buckets[float(requests_per_minute)] = TokenBucket(requests_per_minute)
+        return bucket
+
+
+def rate_limited(client, requests_per_minute=REQUESTS_PER_MINUTE):
+    """ client throttled to requests_per_minute, or unchanged when that is 0/None. """
+    if not requests_per_minute:
+        return client
+    return RateLimitedClient(client, shared_bucket(requests_per_minute))
+
+
+def days_for_bars(bars, slack=10, step=30):
+    """
+    Calendar days to request for `bars` trading days: weekends plus `slack` days of holidays,
+    rounded up to a multiple of `step` so nearby requests share cached loads.
+    """
+    days = -(-bars * 7 // 5) + slack
+    return -(-days // step) * step
+
+
+def is_rate_limited(e):
+    if getattr(e, "status", None) == 429:
+        return True
+    msg = str(e)
+    return "429" in msg or "maximum requests" in msg
+
+
+def load_universe(tickers, days_back=730, min_bars=0, client=None,
+                  max_in_flight=MAX_IN_FLIGHT, requests_per_minute=REQUESTS_PER_MINUTE,
+                  retries=3, backoff=2.0):
+    """
+    Loads bars for every ticker concurrently, through the process-wide shared_bars store
+    so sessions loading the same tickers at once share one fetch.
+    At most max_in_flight tickers are being fetched at once and API calls are
+    throttled to requests_per_minute (0 = unthrottled); 429s are retried with exponential backoff.
+    Returns (bars, failures): ticker -> DataFrame and ticker -> reason.
+    """
+    limited = rate_limited(client or get_client(), requests_per_minute)
+
+    def load(ticker):
+        for attempt in range(retries + 1):
+            try:
+                return shared_bars.get(ticker, days_back, client=limited), None
+            except Exception as e:
+                if is_rate_limited(e) and attempt < retries:
+                    time.sleep(backoff * 2 ** attempt)
+                    continue
+                return None, f"{type(e).__name__}: {e}"
+
+    bars = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for ticker, (df, error) in zip(tickers, pool.map(load, tickers)):
+            if error:
+                failures[ticker] = error
+            elif df.empty:
+                failures[ticker] = "No data returned"
+            elif len(df) < min_bars:
+                failures[ticker] = f"Only {len(df)} bars of history"
+            else:
+                bars[ticker] = df
+
+    return bars, failures
@@ -1,5 +1,7 @@
-from helper import get_volume, get_polygon_data
-from features import get_indic
+from loader import load_universe
+from panel import UniversePanel
+from screener import screen_history, history_plan, HISTORY_DAYS, MIN_BARS
+from snapshot import load_snapshot
 import plotly.graph_objects as go
 import pandas as pd
 import streamlit as st
@@ -7,159 +9,112 @@ import numpy as np
 # Ok just make this into a giant function. Inputs: (day, universe, )
 
 @st.cache_data(ttl="1d")
-def get_master_data(tickers):
-    master_dict = {}
-
-    
-    for i, ticker in enumerate(tickers):
-        try:
-            df = get_polygon_data(ticker, days_back=730)
-            
-            if not df.empty and len(df) > 100:
-                master_dict[ticker] = df
-                
-        except Exception as e:
-            print(f"Skipping {ticker}: {e}")
-            
-    return master_dict
+def get_master_data(tickers, days_back=730, min_bars=MIN_BARS):
+    """
+    Returns (master_dict, failures): bars for every ticker with enough history,
+    and the reason each remaining ticker couldn't be loaded.
+    """
+    return load_universe(tickers, days_back=days_back, min_bars=min_bars)
+
+@st.cache_data(ttl="1d")
+def get_panel(tickers, days_back=730, min_bars=MIN_BARS):
+    master_dict, _ = get_master_data(tickers, days_back, min_bars)
+    return UniversePanel.from_bars(master_dict)
+
+@st.cache_data(ttl="1d")
+def get_screen_load(tickers, days_back, min_bars):
+    """
+    (panel, failures) for a live screen. The panel keeps every ticker that loaded (the screen
+    drops the ones under its own min_bars), failures also lists those as too short.
+    Shorter plans are sliced from longer loads already made by the shared bar store.
+    """
+    bars, failures = get_master_data(tickers, days_back, 0)
+    short = {t: f"Only {len(df)} bars of history" for t, df in bars.items() if len(df) < min_bars}
+    return UniversePanel.from_bars(bars), {**failures, **short}
+
+@st.cache_resource(ttl="1h")
+def get_snapshot():
+    """ The nightly snapshot (snapshot.py) if there is a fresh one, re-read at most hourly. """
+    return load_snapshot()
+
+@st.cache_data(ttl="1d")
+def get_live_history(tickers, indics, periods, bench_x=None, bench_y=None):
+    """
+    screener.screen_history() on the cached panel: every "Days ago" table from one indicator pass,
+    loading only the history these indicators and periods need.
+    """
+    panel, _ = get_screen_load(tickers, *history_plan(indics, periods, HISTORY_DAYS))
+    return screen_history(panel, indics, periods, bench_x=bench_x, bench_y=bench_y)
+
+def get_scan_history(tickers, indics, periods, bench_x=None, bench_y=None):
+    """
+    Scanner tables for the last HISTORY_DAYS days stacked with a "Days Ago" column, from the
+    snapshot when it has this combination, otherwise computed live.
+    df.attrs["source"] says which ("snapshot" or "live").
+    """
+    snap = get_snapshot()
+    df = snap.scan_history(tickers, indics, periods, bench_x=bench_x, bench_y=bench_y) if snap is not None else None
+    source = "snapshot"
+    if df is None:
+        df = get_live_history(tickers, indics, periods, bench_x, bench_y)
+        source = "live"
+    df.attrs["source"] = source
+    return df
+
+def get_scan(tickers, day_delay, indics, periods, bench_x=None, bench_y=None):
+    """ The scanner table for one day, looked up from get_scan_history(). """
+    history = get_scan_history(tickers, indics, periods, bench_x, bench_y)
+    df = history[history["Days Ago"] == day_delay].drop(columns="Days Ago").reset_index(drop=True)
+    df.attrs["source"] = history.attrs["source"]
+    return df
+
+def get_failures(tickers, indics, periods, bench_x=None, bench_y=None):
+    """ Tickers missing from this screen and why, from whichever source produced it (see get_scan_history). """
+    if get_scan_history(tickers, indics, periods, bench_x, bench_y).attrs["source"] == "snapshot":
+        return get_snapshot().failures_for(tickers, indics, periods)
+    _, failures = get_screen_load(tickers, *history_plan(indics, periods, HISTORY_DAYS))
+    return failures
+
+def _quadrant_layout(indics, chart_range):
+    """ Dark square quadrant chart with dashed axes through the origin, shared by every view. """
+    return dict(
+        template="plotly_dark",
+        width = 800,
+        height = 800,
+        xaxis=dict(
+            title=f"{indics[0]}",
+            gridcolor='rgba(255,255,255,0.1)', # Subtle grid lines
+        ),
+        yaxis=dict(
+            title=f"{indics[1]}",
+            gridcolor='rgba(255,255,255,0.1)',
+        ),
+        showlegend = False,
+        shapes=[
+            dict(type="line", x0=0, x1=0, y0=-chart_range[1], y1=chart_range[1], line=dict(color="Gray", dash="dash")),
+            dict(type="line", x0=-chart_range[0], x1=chart_range[0], y0=0, y1=0, line=dict(color="Gray", dash="dash"))
+        ],
+    )
 
 def get_fig(tickers, day_delay, indics, periods, chart_range, bench_x, bench_y):
+    """ Renders the scanner table for the UI: the quadrant scatter and the table itself. """
     fig = go.Figure()
-    all_x = []
-    all_y = []
-    all_volumes = []
-    all_labels = []
-    all_skews = []
-    all_kurts = []
-    scanner_data = []
-    master_dict = get_master_data(tickers)
-    for ticker in tickers:
-        try:
-            data = master_dict[ticker]
-        except:
-            print(f"Skipping {ticker}")
-            continue
-        if data.empty or data.shape[0] < 100:
-            continue
-
-        # Definitely a better way to do this but eh
-
-        if bench_x:
-            bx = get_polygon_data(bench_x[0], days_back = 730)
-            try:
-                indic_result = get_indic(indics[0])(data[["Close"]], bx, periods[0])
-
-                # 2. Check if data exists
-                if indic_result.empty:
-                    print(f"Skipping {ticker}: Indicator returned no data (dates didn't align?).")
-                    continue
-
-                # 3. Handle DataFrame vs Series (Crucial for Lag/Lead)
-                if isinstance(indic_result, pd.DataFrame):
-                    # Default to the first column (Peak_Lag_Days) if it's the Lag indicator
-                    # Or you can add logic: if 'Max_Correlation' in indic_result.columns ...
-                    result_series = indic_result.iloc[:, 0] 
-                else:
-                    result_series = indic_result
-
-                # 4. Check if we have enough history for the day_delay
-                target_idx = -1 * (day_delay + 1)
-                if len(result_series) < abs(target_idx):
-                    print(f"Skipping {ticker}: Not enough history for delay {day_delay}.")
-                    continue
-
-                # 5. Get the value safely
-                x_val = result_series.iloc[target_idx]
-                all_x.append(x_val)
-
-            except Exception as e:
-                print(f"Error calculating X-axis for {ticker}: {e}")
-                continue
-        else:
-            all_x.append(x_val := get_indic(indics[0])(data[["Close"]], periods[0]).iloc[-1 * (day_delay + 1)])
-        if bench_y:
-            by = get_polygon_data(bench_y[0], days_back = 730)
-            try:
-                indic_result = get_indic(indics[1])(data[["Close"]], by, periods[0])
-
-                # 2. Check if data exists
-                if indic_result.empty:
-                    print(f"Skipping {ticker}: Indicator returned no data (dates didn't align?).")
-                    continue
-
-                # 3. Handle DataFrame vs Series (Crucial for Lag/Lead)
-                if isinstance(indic_result, pd.DataFrame):
-                    # Default to the first column (Peak_Lag_Days) if it's the Lag indicator
-                    # Or you can add logic: if 'Max_Correlation' in indic_result.columns ...
-                    result_series = indic_result.iloc[:, 0] 
-                else:
-                    result_series = indic_result
-
-                # 4. Check if we have enough history for the day_delay
-                target_idx = -1 * (day_delay + 1)
-                if len(result_series) < abs(target_idx):
-                    print(f"Skipping {ticker}: Not enough history for delay {day_delay}.")
-                    continue
-
-                # 5. Get the value safely
-                y_val = result_series.iloc[target_idx]
-                all_y.append(y_val)
-
-            except Exception as e:
-                print(f"Error calculating X-axis for {ticker}: {e}")
-                continue
-        else:
-                    all_y.append(y_val := get_indic(indics[1])(data[["Close"]], periods[1]).iloc[-1 * (day_delay + 1)])
-
-
-        all_volumes.append(vol_val := get_volume(data).iloc[-1 * (day_delay + 1)]) 
-        all_labels.append(ticker)
-
-        quadrant = "Neutral"
-        if x_val < 0 and y_val > 0:
-            quadrant = "IMPROVING (Buy Beta)"
-        elif x_val > 0 and y_val > 0:
-            quadrant = "LEADING (Hold)"
-        elif x_val > 0 and y_val < 0:
-            quadrant = "WEAKENING (Sell Vol)"
-        elif x_val < 0 and y_val < 0:
-            quadrant = "LAGGING (Avoid)"
-
-        rets = data["Close"].pct_change()
-        
-        # Calculate Rolling Skew & Kurtosis
-        # We access .iloc[idx] to ensure we respect the 'day_delay' (No lookahead)
-        all_skews.append(skew_val := rets.rolling(periods[0]).skew().fillna(0).iloc[-1 * (day_delay + 1)])
-        all_kurts.append(kurt_val := rets.rolling(periods[0]).kurt().fillna(0).iloc[-1 * (day_delay + 1)])
-
-
-        # Geometric distance
-        strength = (x_val**2 + y_val**2)**0.5
-        # add different heuristic for cross-over opportunities
-        scanner_data.append({
-            "Ticker": ticker,
-            "Quadrant": quadrant,
-            "Signal Strength": float(strength), # ensure float for sorting
-            "Valuation (X)": float(x_val),
-            "Momentum (Y)": float(y_val),
-            "Volume (Z)": float(vol_val),
-            "Skew": float(skew_val),
-            "Kurt": float(kurt_val)
-        })
-    kurts_skews = np.stack((all_skews, all_kurts), axis = -1)
+    df = get_scan(tickers, day_delay, indics, periods, bench_x[0] if bench_x else None, bench_y[0] if bench_y else None)
+
+    kurts_skews = np.stack((df["Skew"], df["Kurt"]), axis = -1)
     # Create ONE trace for all dots
     fig.add_trace(go.Scatter(
-        x=all_x, 
-        y=all_y,
+        x=df["Valuation (X)"], 
+        y=df["Momentum (Y)"],
         mode='markers+text',
-        text=all_labels,
+        text=df["Ticker"],
         customdata = kurts_skews,
         textposition="top center",
         marker=dict(
             size=15,
             cmin=-3,
             cmax = 3,
-            color=all_volumes,       
+            color=df["Volume (Z)"],       
             colorscale='Viridis', 
             showscale=True,
             colorbar=dict(title="Volume Surge (Z-Score)", tickvals=[-3, 0, 3],
@@ -179,22 +134,7 @@ def get_fig(tickers, day_delay, indics, periods, chart_range, bench_x, bench_y):
     ))
 
     fig.update_layout(
-        template="plotly_dark",
-        width = 800,
-        height = 800,
-        xaxis=dict(
-            title=f"{indics[0]}",
-            gridcolor='rgba(255,255,255,0.1)', # Subtle grid lines
-        ),
-        yaxis=dict(
-            title=f"{indics[1]}",
-            gridcolor='rgba(255,255,255,0.1)',
-        ),
-        showlegend = False,
-        shapes=[
-            dict(type="line", x0=0, x1=0, y0=-chart_range[1], y1=chart_range[1], line=dict(color="Gray", dash="dash")),
-            dict(type="line", x0=-chart_range[0], x1=chart_range[0], y0=0, y1=0, line=dict(color="Gray", dash="dash"))
-        ],
+        **_quadrant_layout(indics, chart_range),
         updatemenus=[
             dict(
                 type="buttons",
@@ -218,8 +158,84 @@ def get_fig(tickers, day_delay, indics, periods, chart_range, bench_x, bench_y):
             ),
         ]    
     )
-    df = pd.DataFrame(scanner_data)
-    if not df.empty:
-        df = df.sort_values(by="Signal Strength", ascending=False)
-
     return fig, df
+
+def _strongest(history, top_n):
+    """ history rows of the top_n tickers by today's signal strength, oldest day first. """
+    today = history[history["Days Ago"] == 0]
+    keep = today.nlargest(top_n, "Signal Strength")["Ticker"]
+    return history[history["Ticker"].isin(keep)].sort_values(["Ticker", "Days Ago"], ascending=[True, False])
+
+def get_trail_fig(tickers, indics, periods, chart_range, bench_x, bench_y, top_n=20):
+    """ Each of the strongest tickers' path through the quadrants over the last HISTORY_DAYS days, labelled at today. """
+    fig = go.Figure()
+    history = _strongest(get_scan_history(tickers, indics, periods, bench_x[0] if bench_x else None, bench_y[0] if bench_y else None), top_n)
+
+    for ticker, path in history.groupby("Ticker", sort=False):
+        n = len(path)
+        fig.add_trace(go.Scatter(
+            x=path["Valuation (X)"],
+            y=path["Momentum (Y)"],
+            mode="lines+markers+text",
+            name=ticker,
+            # Label only today's point, and grow the markers towards it
+            text=[""] * (n - 1) + [ticker],
+            textposition="top center",
+            customdata=path["Days Ago"],
+            marker=dict(size=np.linspace(5, 15, n), opacity=1.0),
+            line=dict(width=1),
+            hovertemplate="<b>" + ticker + "</b> %{customdata}d ago<br>%{x:.2f} | %{y:.2f}<extra></extra>",
+        ))
+
+    fig.update_layout(**_quadrant_layout(indics, chart_range))
+    return fig
+
+def get_animation_fig(tickers, indics, periods, chart_range, bench_x, bench_y, top_n=20):
+    """ The quadrant scatter of the strongest tickers played day by day over the last HISTORY_DAYS days. """
+    history = _strongest(get_scan_history(tickers, indics, periods, bench_x[0] if bench_x else None, bench_y[0] if bench_y else None), top_n)
+    days = sorted(history["Days Ago"].unique(), reverse=True)
+
+    def scatter(day):
+        df = history[history["Days Ago"] == day]
+        return go.Scatter(
+            x=df["Valuation (X)"],
+            y=df["Momentum (Y)"],
+            # ids keep each dot on its own ticker between frames
+            ids=df["Ticker"],
+            mode="markers+text",
+            text=df["Ticker"],
+            textposition="top center",
+            marker=dict(size=15, cmin=-3, cmax=3, color=df["Volume (Z)"], colorscale="Viridis", showscale=True,
+                        colorbar=dict(title="Volume Surge (Z-Score)"), line=dict(width=1, color="white")),
+            hovertemplate="<b>%{text}</b><br>%{x:.2f} | %{y:.2f}<extra></extra>",
+        )
+
+    frames = [go.Frame(data=[scatter(d)], name=f"{d}d ago") for d in days]
+    fig = go.Figure(data=frames[0].data if frames else [], frames=frames)
+
+    # Fix the axes to the whole history so the motion is visible
+    pad = lambda v: [v.min() - 0.1 * np.ptp(v), v.max() + 0.1 * np.ptp(v)] if len(v) else None
+    layout = _quadrant_layout(indics, chart_range)
+    layout["xaxis"]["range"] = pad(history["Valuation (X)"].to_numpy())
+    layout["yaxis"]["range"] = pad(history["Momentum (Y)"].to_numpy())
+    play = dict(frame=dict(duration=700, redraw=True), transition=dict(duration=400), fromcurrent=True)
+    fig.update_layout(
+        **layout,
+        updatemenus=[dict(
+            type="buttons",
+            direction="left",
+            buttons=[
+                dict(label="Play", method="animate", args=[None, play]),
+                dict(label="Pause", method="animate", args=[[None], dict(frame=dict(duration=0), mode="immediate")]),
+            ],
+            pad={"r": 10, "t": 10},
+            showactive=True,
+            xanchor="left",
+            yanchor="top",
+        )],
+        sliders=[dict(
+            currentvalue=dict(prefix="Day: "),
+            steps=[dict(label=f.name, method="animate", args=[[f.name], dict(mode="immediate", frame=dict(duration=0, redraw=True))]) for f in frames],
+        )],
+    )
+    return fig
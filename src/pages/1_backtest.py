@@ -6,29 +6,34 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from helper import get_polygon_data, get_tickers, get_dataframe, UNIVERSE
-from features import get_indic
-from portfolio import SignalPortfolio
+from helper import get_tickers, get_dataframe, get_filtered_universe, UNIVERSE
+from features import INDICATOR_OPTIONS, REQUIRES_BENCHMARK, lookback_bars
+from loader import days_for_bars
+from backtest import run_rules, rule_masks, sweep, sweep_heatmap, walk_forward, universe_backtest, LEG_COLUMNS
+from cache import BenchmarkCache, cached_indicator, indicator_cache, get_shared_data
+from significance import significance
+from main import get_master_data
 
-INDICATOR_OPTIONS = [
-    "DMA", "Kalman Innovation", "First Order Kalman", "Second Order Kalman", 
-    "Percentage Retracement", "Second Order Percentage Retracement", "Second Order DMA", 
-    "Lag/Lead Days", "Rolling Alpha", "Lag/Lead Corr"
-]
-
-REQUIRES_BENCHMARK = ["Lag/Lead Days", "Rolling Alpha", "Lag/Lead Corr"]
+LEG_LABELS = {"buy": "Buy", "exit_buy": "Close Long", "sell": "Short", "exit_sell": "Close Short"}
 
 def main():
     st.title("Backtester")
     df = get_dataframe()
+    mode = st.radio("Mode", ["Single Run", "Parameter Sweep", "Walk Forward", "Universe"], horizontal=True)
     
     # --- MOVED TICKER SELECTION HERE (OUTSIDE COLUMNS) ---
     # This ensures it spans the top and doesn't push one side down
-    c1, c2 = st.columns(2)
-    with c1:
-        ticker = st.selectbox("Select Asset to Backtest", options=df["ticker"].unique().tolist(), key="Important")
-    with c2:
+    if mode == "Universe":
+        universe = get_filtered_universe(df)
+        tickers = get_tickers(universe)
         length = st.number_input("Length (days)", min_value = 5, max_value = 365)
+        st.caption(f"{len(tickers)} tickers")
+    else:
+        c1, c2 = st.columns(2)
+        with c1:
+            ticker = st.selectbox("Select Asset to Backtest", options=df["ticker"].unique().tolist(), key="Important")
+        with c2:
+            length = st.number_input("Length (days)", min_value = 5, max_value = 365)
     st.divider() # Optional: Adds a nice line to separate settings from logic
     
     # Define the main columns 
@@ -88,137 +93,315 @@ def main():
             close_sell_op = st.selectbox("Operator", [">", "<"], key="cs_op")
             close_sell_threshold = st.number_input("Threshold", value=0.0, key="cs_val")
         
+    legs = {
+        "buy": (buy_indic, buy_bench if 'buy_bench' in locals() else None),
+        "exit_buy": (close_buy_indic, close_buy_bench if 'close_buy_bench' in locals() else None),
+        "sell": (sell_indic, sell_bench if 'sell_bench' in locals() else None),
+        "exit_sell": (close_sell_indic, close_sell_bench if 'close_sell_bench' in locals() else None),
+    }
+    rules = {
+        "buy": (buy_op, buy_threshold),
+        "exit_buy": (close_buy_op, close_buy_threshold),
+        "sell": (sell_op, sell_threshold),
+        "exit_sell": (close_sell_op, close_sell_threshold),
+    }
+
+    if mode in ("Parameter Sweep", "Walk Forward"):
+        st.divider()
+        grid = get_sweep_grid(rules)
+    if mode == "Walk Forward":
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            train = st.number_input("Train window (bars)", min_value=20, max_value=500, value=120)
+        with c2:
+            test = st.number_input("Test window (bars)", min_value=5, max_value=250, value=20)
+        with c3:
+            wf_metric = st.selectbox("Optimise", ["total_return", "max_drawdown", "win_rate"])
+        with c4:
+            anchored = st.checkbox("Anchored (expanding train window)")
+
 # --- EXECUTION LOGIC ---
-    st.divider()
     if st.button("🚀 Run Backtest", type="primary", use_container_width=True):
-        
-        # 1. FETCH DATA
-        with st.status("Fetching Data...", expanded=True) as status:
-            df = get_polygon_data(ticker, days_back=730)
-            if df.empty:
-                status.error("No data found.")
-                st.stop()
-            
-            # 2. CALCULATE INDICATORS
-            status.write("Calculating indicators...")
-            
-            # Helper to safely get indicator data
-            def get_signal_data(indic, bench):
-                if indic in REQUIRES_BENCHMARK:
-                    if not bench: return None
-                    bench_df = get_polygon_data(bench, days_back=1000)
-                    # Align dates
-                    aligned_bench = bench_df.reindex(df.index).ffill()
-                    return get_indic(indic)(df[["Close"]], aligned_bench[["Close"]], 20)
-                return get_indic(indic)(df[["Close"]], 20)
-
-        # Calculate the 4 columns needed
-
-            # Handle Series vs DataFrame return types
-            def extract_series(res):
-                if isinstance(res, pd.DataFrame): return res.iloc[:, -1]
-                return res
-
-            df['Buy_Ind'] = extract_series(get_signal_data(buy_indic, buy_bench if 'buy_bench' in locals() else None))
-            df['Exit_Buy_Ind'] = extract_series(get_signal_data(close_buy_indic, close_buy_bench if 'close_buy_bench' in locals() else None))
-            
-            df['Sell_Ind'] = extract_series(get_signal_data(sell_indic, sell_bench if 'sell_bench' in locals() else None))
-            df['Exit_Sell_Ind'] = extract_series(get_signal_data(close_sell_indic, close_sell_bench if 'close_sell_bench' in locals() else None))
+        if mode == "Universe":
+            run_universe(tickers, length, legs, rules)
+        elif mode == "Parameter Sweep":
+            run_sweep(ticker, length, legs, grid)
+        elif mode == "Walk Forward":
+            run_walk_forward(ticker, legs, grid, train, test, anchored, wf_metric)
+        else:
+            run_single(ticker, length, legs, rules)
+
+def get_warmup(legs, periods):
+    """ Bars the slowest leg needs to warm up at the longest of these periods. """
+    indics = [indic for indic, _ in legs.values()]
+    return lookback_bars(indics, [max(periods)] * len(indics))
+
+def get_signal_frame(ticker, legs, period=20, benchmarks=None, days_back=730):
+    """
+    Close plus the four indicator columns (Buy_Ind, Exit_Buy_Ind, Sell_Ind, Exit_Sell_Ind)
+    for one ticker over the last days_back calendar days. Empty if there is no data.
+    """
+    # Own copy: the leg columns are written into it
+    df = get_shared_data(ticker, days_back=days_back).copy()
+    if df.empty:
+        return df
+
+    # Benchmarks are fetched and aligned once, shared by all four legs
+    benchmarks = benchmarks or BenchmarkCache(days_back=days_back + 30)
+
+    # Helper to safely get indicator data
+    def get_signal_data(indic, bench):
+        if indic in REQUIRES_BENCHMARK:
+            if not bench: return None
+            # Align dates
+            aligned_bench = benchmarks.align(bench, df.index, ffill=True)
+            return cached_indicator(ticker, indic, df[["Close"]], period, bench, aligned_bench[["Close"]])
+        return cached_indicator(ticker, indic, df[["Close"]], period)
+
+    # Handle Series vs DataFrame return types
+    def extract_series(res):
+        if isinstance(res, pd.DataFrame): return res.iloc[:, -1]
+        return res
+
+    for leg, (indic, bench) in legs.items():
+        df[LEG_COLUMNS[leg]] = extract_series(get_signal_data(indic, bench))
+    return df
+
+def run_single(ticker, length, legs, rules):
+    # 1. FETCH DATA
+    with st.status("Fetching Data...", expanded=True) as status:
+        # 2. CALCULATE INDICATORS
+        status.write("Calculating indicators...")
+        # Only the history the legs need to be warmed up over the last `length` bars
+        df = get_signal_frame(ticker, legs, 20, days_back=days_for_bars(get_warmup(legs, [20]) + length))
+        if df.empty:
+            status.error("No data found.")
+            st.stop()
+
+        df = df.iloc[-length:]
+        status.write(f"Simulation running on {length} days.")
+        status.update(label="Complete", state="complete", expanded=False)
+
+    # 3. RUN SIMULATION (vectorised rules, one pass state machine)
+    result = run_rules(df, rules, initial_cash=10000)
+
+    # 4. RESULTS PROCESSING
+    res_df = result.to_frame()
+    
+    if res_df.empty:
+        st.error("No trades or history generated.")
+        st.stop()
+
+    # Calculate Metrics (trades come from the ledger written during the simulation)
+    metrics = result.metrics()
+    final_equity = metrics["final_equity"]
+    total_ret = metrics["total_return"]
+    max_dd = metrics["max_drawdown"]
+    win_rate = metrics["win_rate"]
+    trades = result.trades["pnl"]
+
+    # --- DISPLAY ---
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Total Return", f"{total_ret:.2%}")
+    m2.metric("Final Equity", f"${final_equity:,.2f}")
+    m3.metric("Max Drawdown", f"{max_dd:.2%}")
+    m4.metric("Win Rate", f"{win_rate:.0%} ({len(trades)} trades)")
+
+    # Resampled paths: does this beat chance? (2,000 paths per method, vectorised)
+    stats, band = significance(df["Close"].to_numpy(), *rule_masks(df, rules), n_paths=2000, seed=0)
+    
+    # Plot
+    st.subheader("Equity Curve")
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=res_df.index, y=band["upper"] * 10000, line=dict(width=0), showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=res_df.index, y=band["lower"] * 10000, name="95% Bootstrap Band", line=dict(width=0), fill="tonexty", fillcolor="rgba(0,255,0,0.1)"))
+    fig.add_trace(go.Scatter(x=res_df.index, y=res_df['Equity'], name="Strategy", line=dict(color="#00ff00")))
+    fig.add_trace(go.Scatter(x=res_df.index, y=res_df['Price'], name="Asset Price", line=dict(color="gray", dash="dot"), yaxis="y2"))
+    
+    fig.update_layout(
+        template="plotly_dark",
+        yaxis2=dict(overlaying="y", side="right", showgrid=False),
+        hovermode="x unified"
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Significance")
+    st.caption(
+        "p-value: share of resampled paths doing at least as well. Bootstrap resamples the strategy's own returns in 10-bar blocks "
+        "(band = 95% confidence interval, p-value vs zero mean); Random Timing places the same trades at random times; "
+        "Shuffled runs the rules on time-shuffled signals (bands = what chance gives)."
+    )
+    stats["method"] = stats["method"].map({"bootstrap": "Bootstrap", "random_timing": "Random Timing", "shuffled": "Shuffled"})
+    pct = stats["metric"] != "sharpe"
+    for col in ("observed", "lower", "upper"):
+        stats[col] = [f"{v:.2%}" if is_pct else f"{v:.2f}" for v, is_pct in zip(stats[col], pct)]
+    stats["p_value"] = stats["p_value"].map(lambda p: f"{p:.3f}")
+    st.dataframe(stats, hide_index=True, width="stretch")
+
+def get_sweep_grid(rules):
+    """ Range inputs for the sweep, defaulting to the single-run rules. """
+    grid = {}
+    with st.expander("Sweep Ranges", expanded=True):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            p_min = st.number_input("Period from", min_value=2, max_value=252, value=10, key="sw_p_min")
+        with c2:
+            p_max = st.number_input("Period to", min_value=2, max_value=252, value=40, key="sw_p_max")
+        with c3:
+            p_step = st.number_input("Period step", min_value=1, max_value=100, value=10, key="sw_p_step")
+        grid["period"] = list(range(int(p_min), int(max(p_min, p_max)) + 1, int(p_step)))
+
+        for leg, label in LEG_LABELS.items():
+            op, thresh = rules[leg]
+            c1, c2, c3, c4 = st.columns(4)
+            with c1:
+                grid[f"{leg}_op"] = st.multiselect(f"{label} operators", [">", "<"], default=[op], key=f"sw_{leg}_op") or [op]
+            with c2:
+                t_min = st.number_input(f"{label} threshold from", value=float(thresh) - 1.0, key=f"sw_{leg}_min")
+            with c3:
+                t_max = st.number_input(f"{label} threshold to", value=float(thresh) + 1.0, key=f"sw_{leg}_max")
+            with c4:
+                steps = st.number_input(f"{label} steps", min_value=1, max_value=50, value=5, key=f"sw_{leg}_n")
+            grid[f"{leg}_threshold"] = np.round(np.linspace(t_min, t_max, int(steps)), 4).tolist() if steps > 1 else [float(t_min)]
+
+    n = int(np.prod([len(v) for v in grid.values()]))
+    st.caption(f"{n:,} combinations")
+    return grid
+
+def get_legs_by_period(ticker, legs, periods, length=None, status=None):
+    """
+    Close and {period: {leg: indicator array}} for a sweep, each indicator computed once per period.
+    The last `length` bars (loading just enough history to warm up the longest period),
+    or the full two years if None. Dates are returned too.
+    """
+    days_back = days_for_bars(get_warmup(legs, periods) + length) if length else 730
+    benchmarks = BenchmarkCache(days_back=days_back + 30)
+    legs_by_period = {}
+    df = None
+    for period in periods:
+        if status is not None:
+            status.write(f"Calculating indicators (period {period})...")
+        df = get_signal_frame(ticker, legs, period, benchmarks, days_back)
+        if df.empty:
+            return None, None, None
+        if length:
             df = df.iloc[-length:]
-            print(df)
-            status.write(f"Simulation running on {length} days.")
-            status.update(label="Complete", state="complete", expanded=False)
+        legs_by_period[period] = {leg: df[LEG_COLUMNS[leg]].to_numpy(dtype=float) for leg in LEG_COLUMNS}
+    return df.index, df["Close"].to_numpy(), legs_by_period
+
+def run_sweep(ticker, length, legs, grid):
+    with st.status("Preparing sweep...", expanded=True) as status:
+        # Each indicator is computed once per period, shared by every threshold/operator combo
+        _, price, legs_by_period = get_legs_by_period(ticker, legs, grid["period"], length, status)
+        if price is None:
+            status.error("No data found.")
+            st.stop()
 
+        status.write("Running grid...")
+        results = sweep(price, legs_by_period, grid)
+        status.update(label=f"Complete: {len(results):,} backtests", state="complete", expanded=False)
 
-        # 3. RUN SIMULATION LOOP
-        port = SignalPortfolio(initial_cash=10000)
-        equity = []
-        
-        # Helper: Logic Check
-        check = lambda val, op, thresh: (val > thresh) if op == ">" else (val < thresh)
-
-        for i in range(len(df)):
-            row = df.iloc[i]
-            price = row['Close']
-            sig = None # Default to Hold
-            date = df.index[i]
-            # CURRENT STATE
-            pos = port.position
-            
-            # LOGIC TREE
-            if pos > 0: # Long
-                if check(row['Exit_Buy_Ind'], close_buy_op, close_buy_threshold):
-                    sig = 0 # Close
-            
-            elif pos < 0: # Short
-                if check(row['Exit_Sell_Ind'], close_sell_op, close_sell_threshold):
-                    sig = 0 # Close
-                    
-            else: # Flat
-                if check(row['Buy_Ind'], buy_op, buy_threshold):
-                    sig = 1 # Long
-                elif check(row['Sell_Ind'], sell_op, sell_threshold):
-                    sig = -1 # Short
-            
-            equity.append(port.equity)
-            port.update(sig, price, date)
-        # 4. RESULTS PROCESSING
-        # Extract history from the class
-        res_df = pd.DataFrame(port.history)
-        
-        if res_df.empty:
-            st.error("No trades or history generated.")
+    results = results.sort_values("total_return", ascending=False)
+    best = results.iloc[0]
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Best Total Return", f"{best['total_return']:.2%}")
+    m2.metric("Its Max Drawdown", f"{best['max_drawdown']:.2%}")
+    m3.metric("Its Win Rate", f"{best['win_rate']:.0%} ({int(best['trades'])} trades)")
+
+    # Heatmap over two of the swept parameters (best value over the others)
+    swept = [k for k, v in grid.items() if len(v) > 1] or ["period"]
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        x = st.selectbox("Heatmap x", swept, key="hm_x")
+    with c2:
+        y = st.selectbox("Heatmap y", swept, index=min(1, len(swept) - 1), key="hm_y")
+    with c3:
+        metric = st.selectbox("Metric", ["total_return", "max_drawdown", "win_rate"], key="hm_metric")
+
+    if x != y:
+        heat = sweep_heatmap(results, x, y, metric)
+        fig = go.Figure(go.Heatmap(z=heat.values, x=[str(c) for c in heat.columns], y=[str(i) for i in heat.index], colorscale="RdYlGn"))
+        fig.update_layout(template="plotly_dark", xaxis_title=x, yaxis_title=y)
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(results, hide_index=True, width="stretch")
+
+def run_walk_forward(ticker, legs, grid, train, test, anchored, metric):
+    with st.status("Preparing walk-forward...", expanded=True) as status:
+        # Indicators over the full history, shared by every fold (they are only sliced per window)
+        dates, price, legs_by_period = get_legs_by_period(ticker, legs, grid["period"], status=status)
+        if price is None:
+            status.error("No data found.")
             st.stop()
-            
-        res_df.set_index("Date", inplace=True)
-        
-        # Calculate Metrics
-        final_equity = res_df['Equity'].iloc[-1]
-        total_ret = (final_equity / 10000) - 1
-        
-        # Max Drawdown
-        roll_max = res_df['Equity'].cummax()
-        dd = (res_df['Equity'] / roll_max) - 1
-        max_dd = dd.min()
-        
-        # Hit Rate (Reconstruct trades)
-        trades = []
-        entry_eq = 0
-        pos_arr = res_df['Position'].values
-        eq_arr = res_df['Equity'].values
-        
-        for i in range(1, len(pos_arr)):
-            prev = pos_arr[i-1]
-            curr = pos_arr[i]
-            
-            if prev == 0 and curr != 0: # Entry
-                entry_eq = eq_arr[i-1]
-            elif prev != 0 and curr == 0: # Exit
-                trades.append(eq_arr[i] - entry_eq)
-            elif prev != 0 and curr != 0 and np.sign(prev) != np.sign(curr): # Flip
-                trades.append(eq_arr[i] - entry_eq)
-                entry_eq = eq_arr[i]
-
-        win_rate = len([t for t in trades if t > 0]) / len(trades) if trades else 0.0
-
-        # --- DISPLAY ---
-        m1, m2, m3, m4 = st.columns(4)
-        m1.metric("Total Return", f"{total_ret:.2%}")
-        m2.metric("Final Equity", f"${final_equity:,.2f}")
-        m3.metric("Max Drawdown", f"{max_dd:.2%}")
-        m4.metric("Win Rate", f"{win_rate:.0%} ({len(trades)} trades)")
-        
-        # Plot
-        st.subheader("Equity Curve")
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(x=res_df.index, y=res_df['Equity'], name="Strategy", line=dict(color="#00ff00")))
-        fig.add_trace(go.Scatter(x=res_df.index, y=res_df['Price'], name="Asset Price", line=dict(color="gray", dash="dot"), yaxis="y2"))
-        
-        fig.update_layout(
-            template="plotly_dark",
-            yaxis2=dict(overlaying="y", side="right", showgrid=False),
-            hovermode="x unified"
+
+        status.write("Running folds...")
+        folds, equity = walk_forward(price, legs_by_period, grid, train, test, anchored, metric, dates=dates)
+        if folds.empty:
+            status.error(f"Only {len(price)} bars, not enough for a {train}-bar train window.")
+            st.stop()
+        status.update(label=f"Complete: {len(folds)} folds", state="complete", expanded=False)
+
+    # Out-of-sample vs in-sample: the gap is how much the in-sample pick overfits
+    oos_return = equity.iloc[-1] / 10000 - 1
+    roll_max = equity.cummax()
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Out-of-Sample Return", f"{oos_return:.2%}")
+    m2.metric("Out-of-Sample Max Drawdown", f"{(equity / roll_max - 1).min():.2%}")
+    m3.metric("Mean Train Return / Fold", f"{folds['train_total_return'].mean():.2%}")
+    m4.metric("Mean Test Return / Fold", f"{folds['test_total_return'].mean():.2%}")
+
+    st.subheader("Stitched Out-of-Sample Equity")
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=equity.index, y=equity, name="Walk Forward", line=dict(color="#00ff00")))
+    for start in folds["test_start"]:
+        fig.add_vline(x=start, line=dict(color="gray", dash="dot", width=1))
+    fig.update_layout(template="plotly_dark", hovermode="x unified")
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.subheader("Folds")
+    st.dataframe(folds, hide_index=True, width="stretch")
+
+def run_universe(tickers, length, legs, rules):
+    if not tickers:
+        st.error("No tickers selected.")
+        st.stop()
+
+    with st.status("Loading universe...", expanded=True) as status:
+        # Bars come from the same cached loader as the screener
+        warmup = get_warmup(legs, [20])
+        days_back = days_for_bars(warmup + length)
+        bars, failures = get_master_data(tuple(tickers), days_back, warmup)
+        status.write(f"Backtesting {len(bars)} tickers...")
+        leaderboard, errors = universe_backtest(
+            bars, legs, rules, period=20, length=length,
+            benchmarks=BenchmarkCache(days_back=days_back + 30), cache=indicator_cache,
         )
-        st.plotly_chart(fig, use_container_width=True)
+        failures = {**failures, **errors}
+        status.update(label=f"Complete: {len(leaderboard)} tickers", state="complete", expanded=False)
+
+    if leaderboard.empty:
+        st.error("No tickers could be backtested.")
+        st.stop()
+
+    meta = pd.DataFrame.from_dict(UNIVERSE, orient="index")[["name", "asset_class", "sector"]]
+    leaderboard = leaderboard.join(meta, on="ticker")
+
+    # --- DISPLAY ---
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Median Return", f"{leaderboard['total_return'].median():.2%}")
+    m2.metric("Profitable", f"{(leaderboard['total_return'] > 0).mean():.0%}")
+    m3.metric("Beat Buy & Hold", f"{(leaderboard['total_return'] > leaderboard['buy_hold']).mean():.0%}")
+    m4.metric("Median Max Drawdown", f"{leaderboard['max_drawdown'].median():.2%}")
+
+    st.subheader("Leaderboard")
+    st.dataframe(
+        leaderboard[["ticker", "name", "asset_class", "sector", "total_return", "buy_hold", "max_drawdown", "win_rate", "trades", "final_equity"]],
+        hide_index=True, width="stretch",
+    )
+
+    if failures:
+        with st.expander(f"{len(failures)} tickers skipped"):
+            st.dataframe(pd.DataFrame(failures.items(), columns=["Ticker", "Reason"]), hide_index=True)
+
 if __name__ == "__main__":
     main()
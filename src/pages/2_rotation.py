@@ -0,0 +1,138 @@
+import streamlit as st
+# Must be the very first Streamlit command
+st.set_page_config(page_title="Quadrant Rotation", layout="wide")
+
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+from helper import get_dataframe, get_filtered_universe, get_tickers
+from main import get_panel
+from screener import get_indicator_matrix, benchmark_days
+from backtest import rotation_backtest, QUADRANTS
+from cache import BenchmarkCache
+from features import INDICATOR_OPTIONS, REQUIRES_BENCHMARK, lookback_bars
+from loader import days_for_bars
+
+def main():
+    st.title("Quadrant Rotation")
+    df = get_dataframe()
+
+    with st.expander("Universe", expanded=False):
+        tickers = get_tickers(get_filtered_universe(df))
+    st.caption(f"{len(tickers)} tickers")
+
+    # --- SIGNAL AXES (same as the screener) ---
+    c1, c2 = st.columns(2)
+    bench_x = None
+    bench_y = None
+    with c1:
+        sc1, sc2 = st.columns(2)
+        with sc1:
+            x_period = st.number_input("x Time Period", min_value=1, max_value=252, step=1, value=5)
+        with sc2:
+            x_axis = st.selectbox("Select x axis", options=INDICATOR_OPTIONS)
+            if x_axis in REQUIRES_BENCHMARK:
+                bench_x = st.selectbox("Select x Benchmark", df["ticker"].unique().tolist(), key="x_bench")
+    with c2:
+        sc1, sc2 = st.columns(2)
+        with sc1:
+            y_period = st.number_input("y Time Period", min_value=1, max_value=252, step=1, value=20)
+        with sc2:
+            y_axis = st.selectbox("Select y axis", options=INDICATOR_OPTIONS, index=1)
+            if y_axis in REQUIRES_BENCHMARK:
+                bench_y = st.selectbox("Select y Benchmark", df["ticker"].unique().tolist(), key="y_bench")
+
+    st.divider()
+
+    # --- PORTFOLIO RULES ---
+    c1, c2, c3, c4 = st.columns(4)
+    with c1:
+        long = st.multiselect("Long quadrants", QUADRANTS[1:], default=["IMPROVING"])
+        short = st.multiselect("Short quadrants", QUADRANTS[1:], default=[])
+    with c2:
+        top_n = st.number_input("Top N per side", min_value=1, max_value=100, value=5)
+        weighting = st.selectbox("Weighting", ["equal", "strength"])
+    with c3:
+        rebalance = st.number_input("Rebalance every (bars)", min_value=1, max_value=63, value=5)
+        cost_bps = st.number_input("Cost (bps per side)", min_value=0.0, max_value=100.0, value=5.0)
+    with c4:
+        length = st.number_input("Length (days)", min_value=20, max_value=730, value=365)
+
+    if st.button("🚀 Run Rotation", type="primary", width="stretch"):
+        if not tickers or not (long or short):
+            st.error("Select some tickers and at least one quadrant.")
+            st.stop()
+        run_rotation(tickers, [x_axis, y_axis], [x_period, y_period], bench_x, bench_y,
+                     long, short, top_n, rebalance, weighting, cost_bps, length)
+
+def run_rotation(tickers, indics, periods, bench_x, bench_y, long, short, top_n, rebalance, weighting, cost_bps, length):
+    with st.status("Running rotation...", expanded=True) as status:
+        # Enough history to warm the indicators up before the first simulated day
+        warmup = lookback_bars(indics, periods)
+        panel = get_panel(tuple(tickers), days_for_bars(warmup) + length, warmup)
+        if not len(panel):
+            status.error("No data found.")
+            st.stop()
+
+        # 1. Indicators for every date in one pass (cached), not once per rebalance date
+        status.write("Calculating indicators...")
+        benchmarks = BenchmarkCache(days_back=benchmark_days(panel))
+        bx = benchmarks.get(bench_x) if bench_x else None
+        by = benchmarks.get(bench_y) if bench_y else None
+        x = get_indicator_matrix(panel, indics[0], periods[0], bx, bench_x)
+        y = get_indicator_matrix(panel, indics[1], periods[1], by, bench_y)
+
+        # 2. Simulate over the last `length` calendar days
+        keep = panel.dates >= panel.dates[-1] - pd.Timedelta(days=length)
+        status.write(f"Simulating {keep.sum()} bars x {len(panel)} tickers...")
+        result = rotation_backtest(
+            panel.close[keep], x[keep], y[keep], dates=panel.dates[keep], tickers=panel.tickers,
+            long=long, short=short, top_n=top_n, rebalance=rebalance, weighting=weighting, cost_bps=cost_bps,
+        )
+        status.update(label="Complete", state="complete", expanded=False)
+
+    metrics = result.metrics()
+    equity = result.equity_curve()
+
+    # Equal-weight buy & hold of the same universe as the yardstick
+    px = pd.DataFrame(panel.close[keep], index=panel.dates[keep]).ffill()
+    bench = (px / px.bfill().iloc[0]).mean(axis=1) * result.initial_cash
+
+    # --- DISPLAY ---
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("Total Return", f"{metrics['total_return']:.2%}", f"{metrics['total_return'] - (bench.iloc[-1] / result.initial_cash - 1):.2%} vs EW")
+    m2.metric("Sharpe", f"{metrics['sharpe']:.2f}")
+    m3.metric("Max Drawdown", f"{metrics['max_drawdown']:.2%}")
+    m4.metric("Avg Turnover", f"{metrics['avg_turnover']:.0%} per rebalance")
+    m5.metric("Final Equity", f"${metrics['final_equity']:,.2f}")
+
+    st.subheader("Equity Curve")
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=equity.index, y=equity, name="Rotation", line=dict(color="#00ff00")))
+    fig.add_trace(go.Scatter(x=bench.index, y=bench, name="Equal Weight Universe", line=dict(color="gray", dash="dot")))
+    fig.update_layout(template="plotly_dark", hovermode="x unified")
+    st.plotly_chart(fig, width="stretch")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.subheader("Attribution by Quadrant")
+        attribution = result.attribution_frame()
+        fig = go.Figure()
+        for q in attribution.columns:
+            if attribution[q].abs().sum() > 0:
+                fig.add_trace(go.Scatter(x=attribution.index, y=attribution[q], name=q))
+        fig.update_layout(template="plotly_dark", hovermode="x unified", yaxis_tickformat=".1%")
+        st.plotly_chart(fig, width="stretch")
+    with c2:
+        st.subheader("Turnover")
+        turnover = result.turnover_series()
+        turnover = turnover[result.rebalanced]
+        fig = go.Figure(go.Bar(x=turnover.index, y=turnover, marker_color="#636efa"))
+        fig.update_layout(template="plotly_dark", yaxis_tickformat=".0%")
+        st.plotly_chart(fig, width="stretch")
+
+    st.subheader("Current Holdings")
+    st.dataframe(result.holdings().map(lambda w: f"{w:.1%}"), width="stretch")
+
+if __name__ == "__main__":
+    main()
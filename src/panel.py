@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from helper import UNIVERSE
+
+
+class UniversePanel:
+    """
+    Close and Volume for a set of tickers as contiguous (dates x tickers) float arrays
+    on one shared trading calendar. Days a ticker didn't trade (weekends for equities,
+    pre-listing history...) are NaN and False in `mask`.
+
+    Rolling indicators count bars, not calendar days, so most kernels work on the
+    "stacked" layout instead: each column's own bars pushed to the bottom, so row -1 is
+    every ticker's latest bar and a window of `period` rows is `period` of its own bars.
+    """
+
+    def __init__(self, dates, tickers, close, volume):
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.close = np.ascontiguousarray(close, dtype=float)
+        self.volume = np.ascontiguousarray(volume, dtype=float)
+        self.mask = ~np.isnan(self.close)
+        self._loc = {t: i for i, t in enumerate(self.tickers)}
+
+    @classmethod
+    def from_bars(cls, bars):
+        """ Build from a {ticker: DataFrame(Date index, Close, Volume)} dict like get_master_data's. """
+        tickers = [t for t, df in bars.items() if not df.empty]
+        if not tickers:
+            return cls(pd.DatetimeIndex([]), [], np.empty((0, 0)), np.empty((0, 0)))
+
+        dates = bars[tickers[0]].index
+        for t in tickers[1:]:
+            dates = dates.union(bars[t].index)
+
+        close = pd.concat({t: bars[t]["Close"] for t in tickers}, axis=1).reindex(dates)
+        volume = pd.concat({t: bars[t]["Volume"] for t in tickers}, axis=1).reindex(dates)
+        return cls(dates, tickers, close.to_numpy(), volume.to_numpy())
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._loc
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def loc(self, ticker):
+        return self._loc[ticker]
+
+    def frame(self, field="Close"):
+        """ Calendar-aligned dates x tickers DataFrame of Close or Volume. """
+        values = self.close if field == "Close" else self.volume
+        return pd.DataFrame(values, index=self.dates, columns=self.tickers)
+
+    def column(self, ticker):
+        """ One ticker's own bars, shaped exactly like get_polygon_data's output. """
+        j = self._loc[ticker]
+        m = self.mask[:, j]
+        return pd.DataFrame({"Close": self.close[m, j], "Volume": self.volume[m, j]}, index=self.dates[m].rename("Date"))
+
+    # --- Universe metadata slicing ---
+
+    def select(self, tickers=None, **filters):
+        """
+        Sub-panel by ticker list and/or UNIVERSE metadata, e.g.
+        panel.select(asset_class="equity", region=["US", "Global"]).
+        """
+        keep = []
+        for t in self.tickers:
+            if tickers is not None and t not in tickers:
+                continue
+            meta = UNIVERSE.get(t, {})
+            if all(meta.get(k) in (v if isinstance(v, (list, tuple, set)) else [v]) for k, v in filters.items()):
+                keep.append(t)
+
+        cols = [self._loc[t] for t in keep]
+        rows = self.mask[:, cols].any(axis=1)
+        return UniversePanel(self.dates[rows], keep, self.close[rows][:, cols], self.volume[rows][:, cols])
+
+    def groupby(self, field):
+        """ {metadata value: sub-panel} for field in asset_class/group/region/sector. """
+        values = [UNIVERSE.get(t, {}).get(field) for t in self.tickers]
+        return {v: self.select(**{field: v}) for v in dict.fromkeys(values)}
+
+    # --- Bar-aligned ("stacked") layout ---
+
+    def _positions(self, mask):
+        counts = mask.sum(axis=0)
+        rank = np.cumsum(mask, axis=0) - 1
+        rows = mask.shape[0] - counts + rank
+        cols = np.broadcast_to(np.arange(mask.shape[1]), mask.shape)
+        return rows[mask], cols[mask]
+
+    def stack(self, values, mask=None):
+        """
+        Push each column's valid entries to the bottom of the array, NaN padding above.
+        `values` is a calendar-aligned (dates x tickers) array, mask defaults to self.mask.
+        """
+        mask = self.mask if mask is None else mask
+        out = np.full(values.shape, np.nan)
+        rows, cols = self._positions(mask)
+        out[rows, cols] = values[mask]
+        return out
+
+    def unstack(self, stacked, mask=None):
+        """ Inverse of stack: scatter bar-aligned rows back onto the calendar. """
+        mask = self.mask if mask is None else mask
+        out = np.full(mask.shape, np.nan)
+        rows, cols = self._positions(mask)
+        out[mask] = stacked[rows, cols]
+        return out
+
+    def stacked(self, field="Close"):
+        return self.stack(self.close if field == "Close" else self.volume)
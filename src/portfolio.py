@@ -1,16 +1,63 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+HISTORY_DTYPES = {
+    "Date": "datetime64[ns]",
+    "Equity": np.float64,
+    "Position": np.int64,
+    "Price": np.float64,
+    "Cash": np.float64,
+}
+
+NAT = np.datetime64("NaT", "ns").view(np.int64)
+
+TRADE_DTYPE = np.dtype([
+    ("entry_date", "datetime64[ns]"),
+    ("exit_date", "datetime64[ns]"),
+    ("side", np.int8),
+    ("quantity", np.int64),
+    ("entry_price", np.float64),
+    ("exit_price", np.float64),
+    ("pnl", np.float64),
+])
+
+
 class SignalPortfolio:
-    def __init__(self, initial_cash=10000):
+    """
+    Long/short/flat single-asset portfolio driven one signal per bar.
+    compact=True keeps the daily history in preallocated typed arrays (grown by doubling)
+    instead of a list of dicts; either way trades go to a ledger as they open and close.
+    Export with to_numpy() / to_frame() / to_arrow() and trades().
+    """
+
+    __slots__ = ("cash", "position", "entry_price", "equity", "history", "compact",
+                 "columns", "n", "ledger", "n_trades", "date")
+
+    def __init__(self, initial_cash=10000, compact=False, capacity=256):
         self.cash = initial_cash
         self.position = 0       # Positive = Long, Negative = Short
         self.entry_price = 0    # Track entry for PnL calculation
         self.equity = initial_cash
-        self.history = []       # Stores daily state
+        self.compact = compact
+        self.date = None        # Date of the bar being processed, for the ledger
+
+        # Stores daily state: typed columns in compact mode, else a list of dicts
+        self.history = None if compact else []
+        # Dates are kept as int64 nanoseconds (cheaper to write) and viewed as datetime64 on export
+        self.columns = {k: np.empty(capacity, dtype=np.int64 if k == "Date" else d) for k, d in HISTORY_DTYPES.items()} if compact else None
+        self.n = 0
+
+        # Trade ledger, row n_trades is the open trade (if any)
+        self.ledger = np.zeros(max(capacity // 8, 4), dtype=TRADE_DTYPE)
+        self.n_trades = 0
 
     def update(self, signal, price, date=None):
         """
         The Master Switch: Feeds a signal and price to update the portfolio state.
         signal: 1 (Long), -1 (Short), 0 (Exit/Flat)
         """
+        self.date = date
         
         # 1. CHECK EXIT CONDITIONS
         # If we are Long and signal is NOT Long -> Sell
@@ -34,16 +81,46 @@ class SignalPortfolio:
         self.equity = self.get_value(price)
         
         # 4. === CRITICAL FIX: SAVE THE HISTORY ===
-        self.history.append({
-            "Date": date,
-            "Equity": self.equity,
-            "Position": self.position,
-            "Price": price,
-            "Cash": self.cash
-        })
+        if self.compact:
+            self._record(date, price)
+        else:
+            self.history.append({
+                "Date": date,
+                "Equity": self.equity,
+                "Position": self.position,
+                "Price": price,
+                "Cash": self.cash
+            })
         
         return self.equity
 
+    def _record(self, date, price):
+        if self.n == len(self.columns["Equity"]):
+            self.columns = {k: _grow(v) for k, v in self.columns.items()}
+        i = self.n
+        self.columns["Date"][i] = _as_ns(date)
+        self.columns["Equity"][i] = self.equity
+        self.columns["Position"][i] = self.position
+        self.columns["Price"][i] = price
+        self.columns["Cash"][i] = self.cash
+        self.n += 1
+
+    def _log_entry(self, price, side, quantity):
+        if self.n_trades == len(self.ledger):
+            self.ledger = _grow(self.ledger)
+        trade = self.ledger[self.n_trades]
+        trade["entry_date"] = self.date
+        trade["side"] = side
+        trade["quantity"] = quantity
+        trade["entry_price"] = price
+
+    def _log_exit(self, price):
+        trade = self.ledger[self.n_trades]
+        trade["exit_date"] = self.date
+        trade["exit_price"] = price
+        trade["pnl"] = self.position * (price - self.entry_price)
+        self.n_trades += 1
+
     def _open_long(self, price):
         # Calculate max shares we can afford
         quantity = int(self.cash / price)
@@ -52,6 +129,7 @@ class SignalPortfolio:
             self.cash -= cost
             self.position = quantity
             self.entry_price = price
+            self._log_entry(price, 1, quantity)
 
     def _open_short(self, price):
         # Assume we use 100% of cash as collateral to short
@@ -61,9 +139,11 @@ class SignalPortfolio:
             self.cash += (quantity * price) 
             self.position = -quantity
             self.entry_price = price
+            self._log_entry(price, -1, quantity)
 
     def _close_position(self, price):
         if self.position == 0: return
+        self._log_exit(price)
         
         # Closing Long (Sell)
         if self.position > 0:
@@ -85,3 +165,42 @@ class SignalPortfolio:
         else:
             # For shorts: Value = Cash - Cost to Buy Back
             return self.cash - (abs(self.position) * price)
+
+    # --- Export ---
+
+    def to_numpy(self):
+        """ {column: array} of the daily history. Views onto the compact buffers, no copy. """
+        if self.compact:
+            return {k: v[:self.n].view(HISTORY_DTYPES[k]) for k, v in self.columns.items()}
+        return {k: np.array([row[k] for row in self.history], dtype=d) for k, d in HISTORY_DTYPES.items()}
+
+    def to_frame(self):
+        """ Daily history as a DataFrame indexed by Date (pd.DataFrame(history).set_index("Date")). """
+        if not self.compact:
+            return pd.DataFrame(self.history).set_index("Date")
+        cols = self.to_numpy()
+        return pd.DataFrame({k: v for k, v in cols.items() if k != "Date"}, index=pd.Index(cols["Date"], name="Date"), copy=False)
+
+    def to_arrow(self):
+        """ Daily history as a pyarrow Table (numeric columns are wrapped without copying). """
+        cols = self.to_numpy()
+        return pa.table({k: pa.array(v) for k, v in cols.items()})
+
+    def trades(self):
+        """ Closed trades from the ledger: entry/exit date and price, side, quantity and PnL. """
+        return pd.DataFrame(self.ledger[:self.n_trades])
+
+
+def _as_ns(date):
+    if date is None:
+        return NAT
+    if isinstance(date, pd.Timestamp):
+        return date.value
+    return pd.Timestamp(date).value
+
+
+def _grow(a):
+    """ Same array with twice the capacity (amortised O(1) appends). """
+    out = np.empty(2 * len(a), dtype=a.dtype)
+    out[:len(a)] = a
+    return out
@@ -0,0 +1,287 @@
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from helper import get_dataframe
+from loader import load_universe, days_for_bars
+from cache import BenchmarkCache, indicator_cache, cached_indicator, data_version
+from panel import UniversePanel
+from features import REGISTRY, INDICATOR_OPTIONS, REQUIRES_BENCHMARK, rolling_moments, lookback_bars, feature_matrix, panel_intermediates
+from backtest import QUADRANTS, quadrant_codes
+
+'''
+Headless screener: load a universe, compute both axes and classify every ticker into its
+quadrant, without Streamlit or Plotly. main.get_fig renders this, and it runs from cron as
+
+    python -m screener --asset-class equity --x DMA --y "Kalman Innovation" -o scan.parquet
+
+from src/ (POLYGON_API_KEY from the environment or .env).
+'''
+
+QUADRANT_LABELS = {
+    "Neutral": "Neutral",
+    "IMPROVING": "IMPROVING (Buy Beta)",
+    "LEADING": "LEADING (Hold)",
+    "WEAKENING": "WEAKENING (Sell Vol)",
+    "LAGGING": "LAGGING (Avoid)",
+}
+
+INDICATORS = INDICATOR_OPTIONS
+
+SCAN_COLUMNS = ["Ticker", "Quadrant", "Signal Strength", "Valuation (X)", "Momentum (Y)", "Volume (Z)", "Skew", "Kurt"]
+
+MIN_BARS = 101
+
+# Volume z-score window of the scanner table
+VOL_WINDOW = 20
+
+# Days of scanner history kept per screen (the "Days ago" range)
+HISTORY_DAYS = 6
+
+
+def select_tickers(filters=None):
+    """ Sorted tickers of UNIVERSE matching {field: value or list} over asset_class/group/region/sector/name/ticker. """
+    df = get_dataframe()
+    for field, values in (filters or {}).items():
+        if values:
+            df = df[df[field].isin(values if isinstance(values, (list, tuple, set)) else [values])]
+    return sorted(df["ticker"])
+
+
+def history_plan(indics, periods, days=1, vol_window=VOL_WINDOW):
+    """
+    (days_back, min_bars) for screening the last `days` bars: the bars a ticker needs for every
+    value to be warmed up (both axes, volume z, skew/kurt) and the calendar days to load for them.
+    """
+    min_bars = max(lookback_bars(indics, periods), vol_window, periods[0] + 1) + days - 1
+    return days_for_bars(min_bars), min_bars
+
+
+def benchmark_days(panel, slack=10):
+    """ Calendar days of benchmark history covering the panel (and the bar before it). """
+    if not len(panel.dates):
+        return slack
+    return (pd.Timestamp.now(tz=panel.dates.tz).normalize() - panel.dates[0].normalize()).days + slack
+
+
+def load_panel(tickers, days_back=730, min_bars=MIN_BARS, client=None):
+    """ (UniversePanel, failures) for the tickers with at least min_bars of history. """
+    bars, failures = load_universe(tickers, days_back=days_back, min_bars=min_bars, client=client)
+    return UniversePanel.from_bars(bars), failures
+
+
+def get_panel_stats(panel, period, vol_window=VOL_WINDOW, last=None):
+    """
+    Volume z-score and rolling skew/kurt of returns for every ticker at once,
+    on the bar-aligned layout so each window covers the ticker's own last bars.
+    One power-sum pass per input (features.rolling_moments); last=K only computes
+    the last K bars, which is all the scanner reads.
+    """
+    close = panel.stacked("Close")
+    volume = panel.stacked("Volume")
+    rets = close[1:] / close[:-1] - 1
+
+    vol = rolling_moments(volume, vol_window, last)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        vol_z = (volume[-len(vol["mean"]):] - vol["mean"]) / vol["std"]
+    moments = rolling_moments(rets, period, last)
+    return vol_z, np.nan_to_num(moments["skew"], nan=0.0), np.nan_to_num(moments["kurt"], nan=0.0)
+
+
+def get_feature_matrix(panel, period, bench=None, bench_ticker=None):
+    """
+    features.FeatureMatrix of every indicator at this period, memoized in the shared indicator
+    cache. The period-independent intermediates (returns, Kalman state) are cached once per
+    panel, so another period only redoes the windows.
+    """
+    version = (tuple(panel.tickers), data_version(panel.close))
+    base = indicator_cache.get(version + ("intermediates",), lambda: panel_intermediates(panel))
+    key = version + ("features", period, bench_ticker, data_version(bench))
+    return indicator_cache.get(key, lambda: feature_matrix(panel, period, bench, bench_ticker, base))
+
+
+def get_panel_indicator(panel, indic, period, bench=None, bench_ticker=None):
+    """
+    Stacked (bars x tickers) indicator values for the whole panel, a slice of the cached
+    feature matrix, or None for a benchmark indicator without benchmark data (it then
+    runs per ticker and reports why).
+    """
+    if REGISTRY[indic].benchmark and (bench is None or bench.empty):
+        return None
+    return get_feature_matrix(panel, period, bench, bench_ticker).stacked(indic)
+
+
+def _ticker_indicators(panel, indic, period, bench=None, bench_ticker=None):
+    """ (column, bars, Series) per ticker from the per-ticker functions through the indicator cache. """
+    for j, ticker in enumerate(panel.tickers):
+        data = panel.column(ticker)
+        try:
+            if bench_ticker:
+                res = cached_indicator(ticker, indic, data[["Close"]], period, bench_ticker, bench)
+            else:
+                res = cached_indicator(ticker, indic, data[["Close"]], period)
+        except Exception as e:
+            print(f"Error calculating {indic} for {ticker}: {e}", file=sys.stderr)
+            continue
+        # Frame-valued indicators (Lag/Lead) plot their first column
+        if isinstance(res, pd.DataFrame):
+            res = res.iloc[:, 0]
+        if isinstance(res, pd.Series) and not res.empty:
+            yield j, data, res
+
+
+def get_indicator_stacked(panel, indic, period, bench=None, bench_ticker=None):
+    """ Stacked indicator values for every ticker: the feature matrix, else per ticker on its own bars. """
+    stacked = get_panel_indicator(panel, indic, period, bench, bench_ticker)
+    if stacked is not None:
+        return stacked
+
+    out = np.full(panel.shape, np.nan)
+    for j, data, res in _ticker_indicators(panel, indic, period, bench, bench_ticker):
+        # Benchmark indicators skip days the benchmark didn't trade, keep them as NaN bars
+        values = res.reindex(data.index).to_numpy(dtype=float)[-len(out):]
+        out[len(out) - len(values):, j] = values
+    return out
+
+
+def get_indicator_matrix(panel, indic, period, bench=None, bench_ticker=None):
+    """
+    Calendar-aligned (dates x tickers) indicator values for every date, NaN where a ticker
+    has no bar or not enough history. Panel kernels when there is one, otherwise the
+    per-ticker functions through the indicator cache.
+    """
+    stacked = get_panel_indicator(panel, indic, period, bench, bench_ticker)
+    if stacked is not None:
+        return panel.unstack(stacked)
+
+    out = np.full(panel.shape, np.nan)
+    for j, data, res in _ticker_indicators(panel, indic, period, bench, bench_ticker):
+        out[panel.mask[:, j], j] = res.reindex(data.index).to_numpy(dtype=float)
+    return out
+
+
+def screen(panel, indics, periods, day_delay=0, bench_x=None, bench_y=None, benchmarks=None):
+    """
+    The scanner table for one day: both axes, quadrant, signal strength (distance from the
+    origin), volume z-score and rolling skew/kurt for every ticker with enough history,
+    strongest first. Values are taken day_delay bars back from each ticker's latest bar.
+    bench_x / bench_y are benchmark tickers for the axes that need one.
+    """
+    if not len(panel):
+        return pd.DataFrame(columns=SCAN_COLUMNS)
+
+    axes = _screen_axes(panel, indics, periods, bench_x, bench_y, benchmarks, last=day_delay + 1)
+    _, min_bars = history_plan(indics, periods, day_delay + 1)
+    return _scan_row(panel, *axes, day_delay, min_bars, verbose=True)
+
+
+def screen_history(panel, indics, periods, days=HISTORY_DAYS, bench_x=None, bench_y=None, benchmarks=None):
+    """
+    screen() for each of the last `days` bars from a single computation of both axes:
+    the tables stacked with a "Days Ago" column, so any day_delay (or a ticker's path
+    through the quadrants) is a lookup.
+    """
+    if not len(panel):
+        return pd.DataFrame(columns=["Days Ago"] + SCAN_COLUMNS)
+
+    axes = _screen_axes(panel, indics, periods, bench_x, bench_y, benchmarks, last=days)
+    _, min_bars = history_plan(indics, periods, days)
+    tables = [_scan_row(panel, *axes, d, min_bars).assign(**{"Days Ago": d}) for d in range(days)]
+    return pd.concat(tables, ignore_index=True)[["Days Ago"] + SCAN_COLUMNS]
+
+
+def _screen_axes(panel, indics, periods, bench_x=None, bench_y=None, benchmarks=None, last=None):
+    """ Stacked x, y, volume z, skew and kurt for the whole panel (the stats for the last `last` bars). """
+    # Each benchmark is fetched once per screen, not once per ticker
+    benchmarks = benchmarks or BenchmarkCache(days_back=benchmark_days(panel))
+    bx = benchmarks.get(bench_x) if bench_x else None
+    by = benchmarks.get(bench_y) if bench_y else None
+    x = get_indicator_stacked(panel, indics[0], periods[0], bx, bench_x)
+    y = get_indicator_stacked(panel, indics[1], periods[1], by, bench_y)
+    return (x, y) + get_panel_stats(panel, periods[0], last=last)
+
+
+def _scan_row(panel, x, y, vol_z, skews, kurts, day_delay=0, min_bars=MIN_BARS, verbose=False):
+    # Row -(day_delay + 1) of the stacked layout is each ticker's own bar, no lookahead
+    row = -1 * (day_delay + 1)
+    x, y = x[row], y[row]
+    vol, skew, kurt = vol_z[row], skews[row], kurts[row]
+    keep = (panel.mask.sum(axis=0) >= min_bars) & ~np.isnan(x) & ~np.isnan(y)
+    if verbose:
+        for t in np.array(panel.tickers)[~keep]:
+            print(f"Skipping {t}: Not enough history for delay {day_delay}.", file=sys.stderr)
+
+    return scan_table(np.array(panel.tickers)[keep], x[keep], y[keep], vol[keep], skew[keep], kurt[keep])
+
+
+def scan_table(tickers, x, y, vol_z, skew, kurt):
+    """ Scanner rows from per-ticker axis values and stats, strongest signal first. """
+    quadrant = np.array([QUADRANT_LABELS[q] for q in QUADRANTS])[quadrant_codes(x, y)]
+    df = pd.DataFrame({
+        "Ticker": tickers,
+        "Quadrant": quadrant,
+        "Signal Strength": np.sqrt(x**2 + y**2),
+        "Valuation (X)": x,
+        "Momentum (Y)": y,
+        "Volume (Z)": vol_z,
+        "Skew": skew,
+        "Kurt": kurt,
+    }, columns=SCAN_COLUMNS)
+    return df.sort_values(by="Signal Strength", ascending=False, ignore_index=True)
+
+
+def run_screen(tickers=None, filters=None, indics=("DMA", "Kalman Innovation"), periods=(5, 20), day_delay=0,
+               bench_x=None, bench_y=None, days_back=None, client=None):
+    """
+    Loads the universe (tickers or UNIVERSE filters) and screens it. Returns (scan, failures).
+    Only the history the indicators, periods and day_delay need is loaded unless days_back is given.
+    """
+    tickers = tickers or select_tickers(filters)
+    planned, min_bars = history_plan(indics, periods, day_delay + 1)
+    panel, failures = load_panel(tickers, days_back=days_back or planned, min_bars=min_bars, client=client)
+    return screen(panel, indics, periods, day_delay, bench_x, bench_y), failures
+
+
+def write_scan(df, path):
+    """ Parquet for .parquet/.pq paths, CSV otherwise ("-" for stdout). """
+    if path == "-":
+        df.to_csv(sys.stdout, index=False)
+    elif str(path).endswith((".parquet", ".pq")):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m screener", description="Run the cross-sector screen headlessly.")
+    parser.add_argument("--tickers", nargs="+", help="Explicit tickers (overrides the filters)")
+    for field in ("region", "asset-class", "group", "sector"):
+        parser.add_argument(f"--{field}", nargs="+", help=f"Keep these {field.replace('-', ' ')} values")
+    parser.add_argument("--x", default="DMA", choices=INDICATOR_OPTIONS, metavar="INDICATOR", help="x axis indicator: %(choices)s")
+    parser.add_argument("--y", default="Kalman Innovation", choices=INDICATOR_OPTIONS, metavar="INDICATOR", help="y axis indicator (same choices as --x)")
+    parser.add_argument("--x-period", type=int, default=5)
+    parser.add_argument("--y-period", type=int, default=20)
+    parser.add_argument("--bench-x", help="Benchmark ticker for the x axis")
+    parser.add_argument("--bench-y", help="Benchmark ticker for the y axis")
+    parser.add_argument("--delay", type=int, default=0, help="Days ago")
+    parser.add_argument("--days-back", type=int, help="Calendar days to load (default: what the indicators need)")
+    parser.add_argument("-o", "--output", default="-", help="Output .parquet or .csv path (default: CSV to stdout)")
+    args = parser.parse_args(argv)
+    # Without its benchmark every ticker fails and the scan would just come back empty
+    for flag, indic, bench in (("--bench-x", args.x, args.bench_x), ("--bench-y", args.y, args.bench_y)):
+        if indic in REQUIRES_BENCHMARK and not bench:
+            parser.error(f"{indic} needs a benchmark ({flag})")
+
+    filters = {"region": args.region, "asset_class": args.asset_class, "group": args.group, "sector": args.sector}
+    scan, failures = run_screen(
+        tickers=args.tickers, filters=filters, indics=(args.x, args.y), periods=(args.x_period, args.y_period),
+        day_delay=args.delay, bench_x=args.bench_x, bench_y=args.bench_y, days_back=args.days_back,
+    )
+    write_scan(scan, args.output)
+    for ticker, reason in failures.items():
+        print(f"Skipped {ticker}: {reason}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
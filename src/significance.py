@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+'''
+Is a backtest better than chance? Resamples thousands of paths at once as (paths x bars)
+arrays and compares the strategy's metrics against them:
+- bootstrap: circular block bootstrap of the strategy's own bar returns (confidence bands,
+  p-value against a zero-mean version of the same returns)
+- random_timing: the same trades (side and holding time) placed at random non-overlapping times
+- shuffled: the rule signals shuffled in time and run through the same state machine
+Paths are on percentage returns with full exposure (fractional shares), so the observed
+metrics here can differ slightly from the integer-share simulation.
+'''
+
+def run_exposure(buy, exit_buy, sell, exit_sell):
+    """
+    backtest.simulate's logic tree over (paths x bars) rule masks, all paths at once.
+    Returns the exposure per bar return: e[:, t] is the side (-1/0/1) held from bar t-1 to t.
+    """
+    buy, exit_buy = np.atleast_2d(buy), np.atleast_2d(exit_buy)
+    sell, exit_sell = np.atleast_2d(sell), np.atleast_2d(exit_sell)
+    P, n = buy.shape
+    pos = np.zeros(P)
+    exposure = np.zeros((P, n))
+
+    for t in range(n):
+        # Logic tree (NaN = hold)
+        sig = np.full(P, np.nan)
+        is_long, is_short, is_flat = pos > 0, pos < 0, pos == 0
+        sig[is_long & exit_buy[:, t]] = 0
+        sig[is_short & exit_sell[:, t]] = 0
+        sig[is_flat & buy[:, t]] = 1
+        sig[is_flat & ~buy[:, t] & sell[:, t]] = -1
+
+        # Exits on anything but the same side (hold included), then entries
+        pos[(is_long & (sig != 1)) | (is_short & (sig != -1))] = 0
+        enter = (pos == 0) & ((sig == 1) | (sig == -1))
+        pos[enter] = sig[enter]
+        if t + 1 < n:
+            exposure[:, t + 1] = pos
+    return exposure
+
+
+def _trade_win_rate(exposure, rets):
+    """ Share of winning trades per path, a trade being a run of constant non-zero exposure. """
+    P, n = exposure.shape
+    prev = np.concatenate([np.zeros((P, 1)), exposure[:, :-1]], axis=1)
+    starts = (exposure != 0) & (exposure != prev)
+    trade_id = np.cumsum(starts, axis=1) * (exposure != 0)
+    n_trades = trade_id.max(axis=1)
+
+    # Sum of log returns per (path, trade) in one bincount over flattened ids
+    width = int(n_trades.max()) + 1
+    ids = (np.arange(P)[:, None] * width + trade_id).ravel()
+    logret = np.log1p(exposure * rets).ravel()
+    pnl = np.bincount(ids, weights=logret, minlength=P * width).reshape(P, width)[:, 1:]
+    wins = (pnl > 0) & (np.arange(1, width)[None, :] <= n_trades[:, None])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n_trades > 0, wins.sum(axis=1) / n_trades, 0.0)
+
+
+def path_metrics(strat_rets, exposure=None, rets=None, periods_per_year=252):
+    """ {metric: array over paths} from (paths x bars) strategy returns. """
+    strat_rets = np.atleast_2d(strat_rets)
+    equity = np.cumprod(1 + strat_rets, axis=1)
+    std = strat_rets.std(axis=1, ddof=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.where(std > 0, strat_rets.mean(axis=1) / std * np.sqrt(periods_per_year), 0.0)
+    out = {
+        "total_return": equity[:, -1] - 1,
+        "max_drawdown": (equity / np.maximum.accumulate(equity, axis=1) - 1).min(axis=1),
+        "sharpe": sharpe,
+    }
+    if exposure is not None:
+        out["win_rate"] = _trade_win_rate(exposure, np.broadcast_to(rets, exposure.shape))
+    return out
+
+
+def block_bootstrap(values, n_paths, block=10, rng=None):
+    """ Circular block bootstrap: (n_paths x len(values)) resampled in blocks of `block` bars. """
+    rng = np.random.default_rng(rng)
+    n = len(values)
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n, (n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)) % n
+    return values[idx.reshape(n_paths, -1)[:, :n]]
+
+
+def random_timing(exposure, n_paths, rng=None):
+    """
+    Exposure paths with the observed trades (side, bars held) in random order at random,
+    non-overlapping times: flat bars and trades are shuffled together as one sequence.
+    """
+    rng = np.random.default_rng(rng)
+    e = exposure[1:]
+    n = len(e)
+    # A trade is a run of constant non-zero exposure
+    runs = np.flatnonzero(np.concatenate([[True], e[1:] != e[:-1]])) if n else np.zeros(0, dtype=np.int64)
+    run_len = np.diff(np.append(runs, n))
+    traded = e[runs] != 0
+    starts, lengths = runs[traded], run_len[traded]
+    sides = e[starts]
+    K = len(starts)
+    flat = n - lengths.sum()
+
+    # Random permutation of K trade items and `flat` one-bar flat items per path
+    order = np.argsort(rng.random((n_paths, K + flat)), axis=1)
+    is_trade = order < K
+    trade = np.minimum(order, max(K - 1, 0))
+    item_len = np.where(is_trade, lengths[trade] if K else 1, 1)
+    item_start = np.cumsum(item_len, axis=1) - item_len
+
+    # Paint each trade with +side at its start and -side at its end, then cumsum
+    out = np.zeros((n_paths, n + 1))
+    rows = np.broadcast_to(np.arange(n_paths)[:, None], order.shape)[is_trade]
+    side = sides[trade[is_trade]] if K else np.zeros(0)
+    np.add.at(out, (rows, item_start[is_trade]), side)
+    np.add.at(out, (rows, item_start[is_trade] + item_len[is_trade]), -side)
+    paths = np.zeros((n_paths, n + 1))
+    paths[:, 1:] = np.cumsum(out, axis=1)[:, :n]
+    return paths
+
+
+def shuffled_signals(buy, exit_buy, sell, exit_sell, n_paths, rng=None):
+    """ Exposure paths from the four rule masks permuted together in time (one permutation per path). """
+    rng = np.random.default_rng(rng)
+    perm = np.argsort(rng.random((n_paths, len(buy))), axis=1)
+    masks = [np.asarray(m, dtype=bool)[perm] for m in (buy, exit_buy, sell, exit_sell)]
+    return run_exposure(*masks)
+
+
+def _p_value(dist, observed):
+    """ One-sided: share of paths at least as good (with the +1 so it's never exactly 0). """
+    return float((1 + np.sum(dist >= observed)) / (1 + len(dist)))
+
+
+def _summary(method, observed, null, alpha=0.05):
+    rows = []
+    for metric, obs in observed.items():
+        if metric not in null:
+            continue
+        dist = null[metric]
+        rows.append({
+            "method": method,
+            "metric": metric,
+            "observed": float(obs),
+            "p_value": _p_value(dist, obs),
+            "lower": float(np.quantile(dist, alpha / 2)),
+            "upper": float(np.quantile(dist, 1 - alpha / 2)),
+        })
+    return rows
+
+
+def significance(price, buy, exit_buy, sell, exit_sell, n_paths=2000, block=10, alpha=0.05, seed=None):
+    """
+    Tests a rule-based backtest against the three resampling schemes.
+    Returns (stats, band):
+    - stats: one row per (method, metric) with the observed value, one-sided p-value (share of
+      paths at least as good) and the [alpha/2, 1 - alpha/2] band of the resampled values.
+      For "bootstrap" the band is a confidence interval of the strategy's own metric and the
+      p-value is against the same returns demeaned; for the others the band is what chance gives.
+    - band: lower/median/upper bootstrapped equity (growth of 1) per bar.
+    """
+    rng = np.random.default_rng(seed)
+    price = np.asarray(price, dtype=float)
+    rets = np.zeros(len(price))
+    rets[1:] = price[1:] / price[:-1] - 1
+
+    masks = [np.asarray(m, dtype=bool) for m in (buy, exit_buy, sell, exit_sell)]
+    exposure = run_exposure(*masks)
+    strat = exposure * rets
+    observed = {k: v[0] for k, v in path_metrics(strat, exposure, rets).items()}
+
+    rows = []
+
+    # 1. Block bootstrap of the strategy's bar returns
+    boot = block_bootstrap(strat[0], n_paths, block, rng)
+    boot_metrics = path_metrics(boot)
+    demeaned = path_metrics(block_bootstrap(strat[0] - strat[0].mean(), n_paths, block, rng))
+    for row in _summary("bootstrap", observed, boot_metrics, alpha=alpha):
+        row["p_value"] = _p_value(demeaned[row["metric"]], row["observed"])
+        rows.append(row)
+
+    # 2. Same trades at random times
+    timed = random_timing(exposure[0], n_paths, rng)
+    rows += _summary("random_timing", observed, path_metrics(timed * rets, timed, rets), alpha=alpha)
+
+    # 3. Shuffled signals through the same state machine
+    shuffled = shuffled_signals(*masks, n_paths, rng)
+    rows += _summary("shuffled", observed, path_metrics(shuffled * rets, shuffled, rets), alpha=alpha)
+
+    equity = np.cumprod(1 + boot, axis=1)
+    band = pd.DataFrame({
+        "lower": np.quantile(equity, alpha / 2, axis=0),
+        "median": np.median(equity, axis=0),
+        "upper": np.quantile(equity, 1 - alpha / 2, axis=0),
+    })
+    return pd.DataFrame(rows), band
@@ -0,0 +1,209 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from helper import UNIVERSE
+from screener import (INDICATORS, REQUIRES_BENCHMARK, HISTORY_DAYS, SCAN_COLUMNS, history_plan, benchmark_days,
+                      load_panel, get_indicator_stacked, get_panel_stats, scan_table)
+from cache import BenchmarkCache
+
+'''
+Nightly precomputed screens. Each axis value only depends on its own (indicator, period,
+benchmark, delay), so the snapshot stores those per ticker, plus volume/skew/kurt per
+(period, delay), and any x/y combination is assembled by lookup instead of storing the
+cross-product. Build after the close from src/ with
+
+    python -m snapshot
+
+and Asset_Screener serves matching requests from it while it is fresh.
+'''
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots"))
+SNAPSHOT_PERIODS = (5, 10, 14, 20, 30, 60)
+SNAPSHOT_BENCHMARKS = ("SPY",)
+SNAPSHOT_DELAYS = range(HISTORY_DAYS)
+MAX_AGE_HOURS = float(os.getenv("SNAPSHOT_MAX_AGE_HOURS", 26))
+# Name of the current version directory, swapped atomically by save()
+MANIFEST = "CURRENT"
+KEEP_VERSIONS = 2
+
+
+class ScannerSnapshot:
+    """
+    values: long frame of indic, period, bench ("" if none), delay, ticker, value.
+    stats: long frame of period, delay, ticker, bars (history length), vol_z, skew, kurt.
+    Lookups go through dicts keyed by (indic, period, bench, delay) / (period, delay).
+    """
+
+    def __init__(self, values, stats, failures=None, created=None, as_of=None):
+        self.values = values
+        self.stats = stats
+        self.failures = failures or {}
+        self.created = pd.Timestamp(created or datetime.now())
+        self.as_of = as_of
+        self._values = {k: g.set_index("ticker")["value"] for k, g in values.groupby(["indic", "period", "bench", "delay"], observed=True)}
+        self._stats = {k: g.set_index("ticker")[["bars", "vol_z", "skew", "kurt"]] for k, g in stats.groupby(["period", "delay"], observed=True)}
+
+    def is_fresh(self, max_age_hours=MAX_AGE_HOURS):
+        return datetime.now() - self.created.to_pydatetime() < timedelta(hours=max_age_hours)
+
+    def _axis(self, indic, period, bench, delay):
+        if (indic in REQUIRES_BENCHMARK) != bool(bench):
+            return None
+        return self._values.get((indic, period, bench or "", delay))
+
+    def scan(self, tickers, indics, periods, day_delay=0, bench_x=None, bench_y=None, min_bars=None):
+        """ Same table as screener.screen() for these tickers, or None if the combination isn't in the snapshot. """
+        min_bars = min_bars or history_plan(indics, periods, day_delay + 1)[1]
+        x = self._axis(indics[0], periods[0], bench_x, day_delay)
+        y = self._axis(indics[1], periods[1], bench_y, day_delay)
+        stats = self._stats.get((periods[0], day_delay))
+        if x is None or y is None or stats is None:
+            return None
+
+        stats = stats[stats["bars"] >= min_bars]
+        tickers = [t for t in tickers if t in x.index and t in y.index and t in stats.index]
+        x = x.reindex(tickers).to_numpy()
+        y = y.reindex(tickers).to_numpy()
+        stats = stats.reindex(tickers)
+        return scan_table(tickers, x, y, stats["vol_z"].to_numpy(), stats["skew"].to_numpy(), stats["kurt"].to_numpy())
+
+    def scan_history(self, tickers, indics, periods, days=HISTORY_DAYS, bench_x=None, bench_y=None):
+        """ Same table as screener.screen_history(), or None if any of the days isn't in the snapshot. """
+        _, min_bars = history_plan(indics, periods, days)
+        tables = []
+        for d in range(days):
+            df = self.scan(tickers, indics, periods, d, bench_x, bench_y, min_bars)
+            if df is None:
+                return None
+            tables.append(df.assign(**{"Days Ago": d}))
+        return pd.concat(tables, ignore_index=True)[["Days Ago"] + SCAN_COLUMNS]
+
+    def failures_for(self, tickers, indics, periods, days=HISTORY_DAYS):
+        """ The build's load failures among these tickers, plus the ones too short for this screen. """
+        _, min_bars = history_plan(indics, periods, days)
+        tickers = set(tickers)
+        # Bar counts are the same under every (period, delay)
+        bars = next(iter(self._stats.values()))["bars"] if self._stats else pd.Series(dtype=int)
+        short = {t: f"Only {n} bars of history" for t, n in bars.items() if t in tickers and n < min_bars}
+        return {**{t: r for t, r in self.failures.items() if t in tickers}, **short}
+
+    def save(self, root=SNAPSHOT_DIR):
+        """
+        Writes values and stats into a new version directory, then points the CURRENT
+        manifest at it with one atomic rename, so readers always get a matching pair and
+        concurrent builds never write to the same files. Older versions are pruned.
+        """
+        os.makedirs(root, exist_ok=True)
+        values = self.values.copy()
+        values.attrs = {"created": self.created.isoformat(), "as_of": str(self.as_of), "failures": self.failures}
+
+        # 1. Build in a hidden directory, then give it a version name sorting by completion time
+        build = tempfile.mkdtemp(dir=root, prefix=".build-")
+        values.to_parquet(os.path.join(build, "values.parquet"), index=False)
+        self.stats.to_parquet(os.path.join(build, "stats.parquet"), index=False)
+        version = f"{time.time_ns():020d}-{os.path.basename(build).removeprefix('.build-')}"
+        os.rename(build, os.path.join(root, version))
+
+        # 2. Point the manifest at it
+        with tempfile.NamedTemporaryFile("w", dir=root, prefix=".CURRENT-", delete=False) as f:
+            f.write(version)
+        os.replace(f.name, os.path.join(root, MANIFEST))
+        _prune(root, version)
+
+
+def _prune(root, current, keep=KEEP_VERSIONS):
+    """
+    Deletes finished versions older than `current`, except the newest keep - 1 of them
+    (a reader may still be on the previous one). Builds in progress are hidden and left alone.
+    """
+    older = sorted(d for d in os.listdir(root) if not d.startswith(".") and d < current and os.path.isdir(os.path.join(root, d)))
+    for d in older[:max(len(older) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(root, d), ignore_errors=True)
+
+
+def load_snapshot(root=SNAPSHOT_DIR, max_age_hours=MAX_AGE_HOURS):
+    """ The stored snapshot, or None if there isn't one or it's older than max_age_hours. """
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            version = os.path.join(root, f.read().strip())
+        values = pd.read_parquet(os.path.join(version, "values.parquet"))
+        stats = pd.read_parquet(os.path.join(version, "stats.parquet"))
+    except (FileNotFoundError, OSError):
+        return None
+    meta = values.attrs
+    snap = ScannerSnapshot(values, stats, meta.get("failures"), meta.get("created"), meta.get("as_of"))
+    return snap if snap.is_fresh(max_age_hours) else None
+
+
+def build_snapshot(tickers=None, periods=SNAPSHOT_PERIODS, benchmarks=SNAPSHOT_BENCHMARKS,
+                   delays=SNAPSHOT_DELAYS, days_back=None, client=None):
+    """
+    Loads the universe once, with the history the slowest indicator at the longest period
+    needs, and evaluates every indicator x period (x benchmark) on the whole panel, keeping
+    the last len(delays) bars of each ticker. Returns a ScannerSnapshot.
+    """
+    tickers = tickers or sorted(UNIVERSE)
+    delays = list(delays)
+    planned, _ = history_plan(INDICATORS, [max(periods)] * len(INDICATORS), max(delays) + 1)
+    # Tickers too short for even the fastest combination are load failures
+    shortest = min(history_plan([indic], [min(periods)])[1] for indic in INDICATORS)
+    panel, failures = load_panel(tickers, days_back=days_back or planned, min_bars=shortest, client=client)
+    bench_cache = BenchmarkCache(days_back=benchmark_days(panel))
+    rows = [-1 * (d + 1) for d in delays]
+    names = np.array(panel.tickers)
+    # History requirements depend on the screen, scan() filters on this
+    n_bars = panel.mask.sum(axis=0)
+
+    def frame(stacked, **keys):
+        block = stacked[rows]
+        d, j = np.nonzero(~np.isnan(block))
+        return pd.DataFrame({**keys, "delay": np.array(delays)[d], "ticker": names[j], "value": block[d, j]})
+
+    values = []
+    for indic in INDICATORS:
+        for bench in (benchmarks if indic in REQUIRES_BENCHMARK else [""]):
+            bars = bench_cache.get(bench) if bench else None
+            if bench and bars.empty:
+                print(f"Skipping {indic} vs {bench}: no benchmark data", file=sys.stderr)
+                continue
+            for period in periods:
+                stacked = get_indicator_stacked(panel, indic, period, bars, bench or None)
+                values.append(frame(stacked, indic=indic, period=period, bench=bench))
+
+    stats = []
+    for period in periods:
+        vol_z, skew, kurt = get_panel_stats(panel, period, last=max(delays) + 1)
+        for d, row in zip(delays, rows):
+            stats.append(pd.DataFrame({
+                "period": period, "delay": d, "ticker": names, "bars": n_bars,
+                "vol_z": vol_z[row], "skew": skew[row], "kurt": kurt[row],
+            }))
+
+    values = pd.concat(values, ignore_index=True)
+    values = values.astype({"indic": "category", "bench": "category", "ticker": "category", "period": np.int16, "delay": np.int8})
+    stats = pd.concat(stats, ignore_index=True).astype({"ticker": "category", "period": np.int16, "delay": np.int8})
+    as_of = panel.dates[-1] if len(panel.dates) else None
+    return ScannerSnapshot(values, stats, failures, as_of=as_of)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m snapshot", description="Precompute the screener for the whole universe.")
+    parser.add_argument("--periods", nargs="+", type=int, default=list(SNAPSHOT_PERIODS))
+    parser.add_argument("--benchmarks", nargs="+", default=list(SNAPSHOT_BENCHMARKS))
+    parser.add_argument("--out", default=SNAPSHOT_DIR, help="Snapshot directory")
+    args = parser.parse_args(argv)
+
+    snap = build_snapshot(periods=args.periods, benchmarks=args.benchmarks)
+    snap.save(args.out)
+    print(f"Snapshot of {snap.values['ticker'].nunique()} tickers, {len(snap.values):,} values as of {snap.as_of} -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import threading
+import pandas as pd
+
+STORE_DIR = os.getenv("BAR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bars"))
+
+
+class BarStore:
+    """
+    On-disk daily bar store: one Parquet file per ticker holding the same
+    (Date index, Close, Volume) frame get_polygon_data returns.
+    The first date we have asked Polygon for is kept in df.attrs["covered_from"]
+    so tickers that simply have no older history aren't backfilled on every load,
+    and the day a whole-universe ingest (ingest.py) last brought it up to date in
+    df.attrs["refreshed"].
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.lock = threading.Lock()
+        self.ticker_locks = {}
+
+    def _ticker_lock(self, ticker):
+        with self.lock:
+            return self.ticker_locks.setdefault(ticker, threading.Lock())
+
+    def path(self, ticker):
+        # ":" is not allowed in Windows filenames (X:BTCUSD)
+        return os.path.join(self.root, ticker.replace(":", "_") + ".parquet")
+
+    def read(self, ticker):
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            # Corrupt/partial file -> treat as a cold start, it gets rewritten
+            print(f"Discarding unreadable bars for {ticker}: {e}", file=sys.stderr)
+            return pd.DataFrame()
+
+    def write(self, ticker, df):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(ticker)
+        # Unique temp name so concurrent writers don't swap each other's file away
+        with tempfile.NamedTemporaryFile(dir=self.root, suffix=".tmp", delete=False) as f:
+            tmp = f.name
+        try:
+            df.to_parquet(tmp)
+            # Atomic swap so a concurrent reader never sees half a file
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def append(self, ticker, new, covered_from=None, refreshed=None):
+        """
+        Merge new bars into the stored ones (new rows win on overlapping dates)
+        and write the result back. Returns the merged frame.
+        Appends to one ticker are serialised, so concurrent merges don't drop each other's rows.
+        """
+        with self._ticker_lock(ticker):
+            return self._append(ticker, new, covered_from, refreshed)
+
+    def _append(self, ticker, new, covered_from, refreshed):
+        old = self.read(ticker)
+        if new.empty and covered_from is None and refreshed is None:
+            return old
+
+        frames = [f for f in (old, new) if not f.empty]
+        if not frames:
+            return pd.DataFrame()
+
+        merged = pd.concat(frames)
+        merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        merged.index.name = "Date"
+
+        starts = [d for d in (old.attrs.get("covered_from"), covered_from) if d]
+        merged.attrs = {"covered_from": min(starts)} if starts else {}
+        refreshes = [d for d in (old.attrs.get("refreshed"), refreshed) if d]
+        if refreshes:
+            merged.attrs["refreshed"] = max(refreshes)
+
+        self.write(ticker, merged)
+        return merged
+
+    def covered_from(self, df):
+        """ First date already requested from Polygon for this frame. """
+        start = df.attrs.get("covered_from")
+        if start:
+            return pd.Timestamp(start).date()
+        return df.index[0].date()
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# src/ modules read these at import time: point them at throwaway dirs and a dummy key
+os.environ["BAR_STORE_DIR"] = tempfile.mkdtemp(prefix="bars-")
+os.environ["SNAPSHOT_DIR"] = tempfile.mkdtemp(prefix="snapshots-")
+os.environ.setdefault("POLYGON_API_KEY", "test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from polygon_stub import PolygonStub
+
+
+@pytest.fixture
+def polygon_stub():
+    """ Local Polygon replaying tests/fixtures, stopped after the test. """
+    stub = PolygonStub()
+    stub.start()
+    yield stub
+    stub.stop()
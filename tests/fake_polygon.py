@@ -0,0 +1,63 @@
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from polygon.rest.models import Agg
+
+
+class RateLimitError(Exception):
+    """ What a 429 looks like to load_universe. """
+    status = 429
+
+
+class FakeRESTClient:
+    """
+    Stand-in for polygon.RESTClient.get_aggs with deterministic per-ticker daily bars,
+    `latency` seconds per call, and scripted trouble:
+    rate_limited: ticker -> number of calls answered with a 429 before it succeeds,
+    errors: ticker -> exception raised on every call,
+    listed: ticker -> first date with bars (shorter history), unknown tickers in `empty` return [].
+    Records calls per ticker and the peak number of concurrent calls.
+    """
+
+    def __init__(self, latency=0.0, rate_limited=None, errors=None, listed=None, empty=()):
+        self.latency = latency
+        self.rate_limited = dict(rate_limited or {})
+        self.errors = errors or {}
+        self.listed = listed or {}
+        self.empty = set(empty)
+        self.calls = {}
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get_aggs(self, ticker, multiplier, timespan, from_, to, **kwargs):
+        with self.lock:
+            self.calls[ticker] = self.calls.get(ticker, 0) + 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            limited = self.rate_limited.get(ticker, 0)
+            if limited:
+                self.rate_limited[ticker] = limited - 1
+        try:
+            time.sleep(self.latency)
+            if limited:
+                raise RateLimitError("429 Too Many Requests")
+            if ticker in self.errors:
+                raise self.errors[ticker]
+            if ticker in self.empty:
+                return []
+            return self.bars(ticker, from_, to)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def bars(self, ticker, from_, to):
+        start = max(pd.Timestamp(from_), pd.Timestamp(self.listed.get(ticker, "2000-01-01")))
+        # Stamped like Polygon's stock bars: start of the window, midnight New York
+        days = pd.bdate_range(start, pd.Timestamp(to)) + pd.Timedelta(hours=5)
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+        volume = rng.uniform(1e6, 2e6, len(days))
+        return [Agg(close=c, volume=v, timestamp=int(d.value // 10**6)) for d, c, v in zip(days, close, volume)]
@@ -0,0 +1,64 @@
+import json
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GROUPED = re.compile(r"/v2/aggs/grouped/locale/us/market/(\w+)/([\d-]+)")
+
+
+class PolygonStub:
+    """
+    Local HTTP server replaying recorded grouped-daily responses from
+    fixtures/grouped/<market>/<date>.json. Dates without a recording get Polygon's
+    empty answer (weekends, holidays). (market, date) pairs in `fail` answer 404 until
+    removed. Every request is logged in `hits` as (market, date).
+    """
+
+    def __init__(self, root=FIXTURES):
+        self.root = root
+        self.fail = set()
+        self.hits = []
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                match = GROUPED.match(self.path)
+                if not match:
+                    return self.reply(404, {"status": "NOT_FOUND"})
+                market, day = match.groups()
+                stub.hits.append((market, day))
+                if (market, day) in stub.fail:
+                    return self.reply(404, {"status": "ERROR", "error": "recorded failure"})
+                path = os.path.join(stub.root, "grouped", market, f"{day}.json")
+                if not os.path.exists(path):
+                    return self.reply(200, {"status": "OK", "queryCount": 0, "resultsCount": 0, "adjusted": True})
+                with open(path) as f:
+                    self.reply(200, json.load(f))
+
+            def reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,157 @@
+"""
+Frozen copies of the original per-row indicator loops, kept as the reference the
+vectorised kernels in features.py are checked against. Do not optimise.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def kalman_loop(z):
+    """ The original 2-state filter loop (np.linalg.inv, 2x2 matmuls) -> (level, innovation, slope). """
+    q = 0.05
+    r = 1.0
+
+    x = np.array([[z[0]], [0.0]])
+    P = np.eye(2)
+    F = np.array([[1, 1.0],
+                  [0, 1]])
+    H = np.array([[1, 0]])
+    Q = np.eye(2) * q
+    R = np.array([[r]])
+
+    level, innovation, slope = [], [], []
+    for zt in z:
+        x = F @ x
+        P = F @ P @ F.T + Q
+
+        # Update
+        y = zt - (H @ x) # Innovation
+        S = H @ P @ H.T + R
+        K = P @ H.T @ np.linalg.inv(S)
+        x = x + K @ y
+        P = (np.eye(2) - K @ H) @ P
+
+        level.append(x[0][0])
+        innovation.append(y[0][0])
+        slope.append(x[1][0])
+    return np.array(level), np.array(innovation), np.array(slope)
+
+
+def kalman_indicator(data, period, output):
+    """ kalman_first (0) / get_smoothed (1) / kalman_second (2) as originally written. """
+    original_index = data.index
+    rets = data["Close"].pct_change().dropna()
+    if rets.empty:
+        return [0] * 10
+
+    innovations_series = pd.Series(kalman_loop(rets.to_numpy())[output], index=rets.index)
+    z_scores = (innovations_series - innovations_series.rolling(period).mean()) / innovations_series.rolling(period).std()
+    return z_scores.reindex(original_index).fillna(0)
+
+
+def get_lag_and_corr(data, benchmark, period=20, max_lag=5):
+    s_vals = data["Close"] if isinstance(data, pd.DataFrame) else data
+    b_vals = benchmark["Close"] if isinstance(benchmark, pd.DataFrame) else benchmark
+
+    df = pd.DataFrame({
+        "stock": s_vals.pct_change(),
+        "bench": b_vals.pct_change()
+    }).dropna()
+
+    list_lags = []
+    list_corrs = []
+    dates = []
+    lags = list(range(-max_lag, max_lag + 1))
+
+    # 2. Loop with Error Silencing
+    for t in range(period, len(df)):
+        window = df.iloc[t-period : t]
+
+        # Check if window is valid (has variance)
+        if window['stock'].std() == 0 or window['bench'].std() == 0:
+            # If flat line, correlation is 0 (or undefined)
+            list_lags.append(0)
+            list_corrs.append(0.0)
+            dates.append(df.index[t])
+            continue
+
+        window_corrs = []
+        for lag in lags:
+            series_stock = window['stock']
+            series_bench = window['bench'].shift(lag)
+
+            # SILENCE THE WARNINGS
+            with np.errstate(all='ignore'):
+                val = series_stock.corr(series_bench)
+
+            window_corrs.append(val if not np.isnan(val) else 0.0)
+
+        # 3. Extract Best
+        best_idx = np.argmax(window_corrs)
+
+        best_lag_day = lags[best_idx]          # Integer (e.g. -2)
+        best_corr_score = window_corrs[best_idx] # Float (e.g. 0.85)
+
+        list_lags.append(best_lag_day)
+        list_corrs.append(best_corr_score)
+        dates.append(df.index[t])
+
+    return pd.Series(list_lags, index=dates), pd.Series(list_corrs, index=dates)
+
+
+def get_rolling_retrac(data, period=14, raw=False):
+    # 1. Prepare Data
+    prices = data["Close"].to_numpy()
+
+    # 2. Create Rolling Windows
+    windows = sliding_window_view(prices, window_shape=period)
+
+    # 3. Find Indices of Max and Min
+    max_idx_rel = np.argmax(windows, axis=1)
+    min_idx_rel = np.argmin(windows, axis=1)
+
+    # 4. Get Values
+    row_indices = np.arange(windows.shape[0])
+    roll_max = windows[row_indices, max_idx_rel]
+    roll_min = windows[row_indices, min_idx_rel]
+    curr_price = windows[:, -1]
+
+
+    price_range = roll_max - roll_min
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw_retracement = (curr_price - roll_min) / price_range
+        raw_retracement = np.nan_to_num(raw_retracement, nan=0.0)
+
+    if raw:
+        pad = np.full(period - 1, np.nan)
+        full_result = np.concatenate([pad, raw_retracement])
+        return pd.Series(full_result, index=data.index)
+
+    final_values = np.where(
+        max_idx_rel < min_idx_rel,
+        raw_retracement,
+        -raw_retracement
+    )
+
+    pad = np.full(period - 1, np.nan)
+    full_result = np.concatenate([pad, final_values])
+
+    return pd.Series(full_result, index=data.index)
+
+
+def perc_retrac_second(data, period):
+    # 1. Get the RAW (Unsigned) Position (0.0 to 1.0)
+    # We do NOT want the trend logic interfering with the derivative
+    raw_position = get_rolling_retrac(data, period, raw=True)
+
+    # 2. Calculate "Velocity" (Change in Position)
+    velocity = raw_position.diff()
+
+    # 3. Calculate "Acceleration" (Change in Velocity)
+    acceleration = velocity.diff()
+
+    # 4. Smooth it (Sum/Mean) to create the "Net Force"
+    # This removes the day-to-day noise
+    return acceleration.rolling(window=5).mean()
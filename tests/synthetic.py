@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from panel import UniversePanel
+
+
+def random_bars(dates, seed):
+    """ Random-walk (Date index, Close, Volume) bars on the given dates, like get_polygon_data's. """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates)))),
+        "Volume": rng.uniform(1e6, 2e6, len(dates)),
+    }, index=pd.DatetimeIndex(dates, name="Date"))
+
+
+def drop_days(dates, seed, frac=0.05):
+    rng = np.random.default_rng(seed)
+    return dates.delete(rng.choice(len(dates), int(len(dates) * frac), replace=False))
+
+
+def gapped_universe(n=400):
+    """
+    (panel, bars, bench) with tickers and a benchmark on different calendars: weekday
+    equities with their own missing days, a late listing, 7-day crypto, and a benchmark
+    missing days the tickers traded.
+    """
+    weekdays = pd.bdate_range("2023-01-02", periods=n)
+    bars = {
+        "EQ": random_bars(drop_days(weekdays, 1), 1),
+        "LATE": random_bars(weekdays[n * 3 // 8:], 2),
+        "X:COIN": random_bars(pd.date_range("2023-01-02", weekdays[-1]), 3),
+        "FULL": random_bars(weekdays, 4),
+    }
+    bench = random_bars(drop_days(weekdays[10:], 5), 5)
+    return UniversePanel.from_bars(bars), bars, bench
+
+
+def per_ticker(panel, bars, compute):
+    """ Calendar (dates x tickers) array of a per-ticker Series reindexed to each ticker's own bars. """
+    out = np.full(panel.shape, np.nan)
+    for j, t in enumerate(panel.tickers):
+        data = bars[t]
+        out[panel.mask[:, j], j] = compute(data).reindex(data.index).to_numpy(dtype=float)
+    return out
+
+
+LEGS = {"buy": "Buy_Ind", "exit_buy": "Exit_Buy_Ind", "sell": "Sell_Ind", "exit_sell": "Exit_Sell_Ind"}
+
+
+def random_rules(seed, n=None):
+    """ Random prices, indicators (with NaN gaps) and rules, thresholds in the indicators' range so every leg fires. """
+    rng = np.random.default_rng(seed)
+    n = n or int(rng.integers(1, 300))
+    dates = pd.date_range("2022-01-03", periods=n, freq="B")
+    close = 50 * np.exp(np.cumsum(rng.normal(0, 0.03, n)))
+    if seed % 7 == 0:
+        close = np.round(close, 0)   # repeated prices
+    df = pd.DataFrame({"Close": close}, index=pd.Index(dates, name="Date"))
+    rules = {}
+    for leg, col in LEGS.items():
+        values = rng.normal(0, 1, n)
+        values[rng.random(n) < 0.1] = np.nan
+        df[col] = values
+        rules[leg] = (str(rng.choice([">", "<"])), float(rng.normal(0, 0.8)))
+    return df, rules
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import simulate, run_rules, check
+from reference_portfolio import run_reference
+from synthetic import random_rules
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_simulate_matches_signal_portfolio_loop(seed):
+    df, rules = random_rules(seed)
+    port = run_reference(df, rules)
+    want = pd.DataFrame(port.history).set_index("Date")
+    result = run_rules(df, rules)
+
+    got = result.to_frame()
+    pd.testing.assert_index_equal(got.index, want.index)
+    np.testing.assert_array_equal(got["Position"].to_numpy(), want["Position"].to_numpy())
+    np.testing.assert_allclose(got["Equity"].to_numpy(), want["Equity"].to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(got["Cash"].to_numpy(), want["Cash"].to_numpy(), rtol=1e-12)
+    np.testing.assert_array_equal(got["Price"].to_numpy(), want["Price"].to_numpy())
+
+    # Every closed trade shows up as a position change in the reference history
+    pos = want["Position"].to_numpy()
+    closes = np.flatnonzero((np.r_[0, pos[:-1]] != 0) & (np.r_[0, pos[:-1]] != pos))
+    np.testing.assert_array_equal(result.trades["exit_date"], want.index[closes].to_numpy())
+
+
+def test_nan_never_triggers():
+    assert not check([np.nan], ">", -np.inf).any()
+    assert not check([np.nan], "<", np.inf).any()
+
+
+def test_hold_closes_position():
+    """ A long held with no exit signal is still closed the next bar, as in SignalPortfolio.update(None). """
+    price = [10.0, 11.0, 12.0]
+    on = np.array([True, False, False])
+    off = np.zeros(3, dtype=bool)
+    result = simulate(price, on, off, off, off)
+    np.testing.assert_array_equal(result.position, [1000, 0, 0])
+    assert result.trades["pnl"].tolist() == [1000.0]
+
+
+def test_empty():
+    result = simulate([], [], [], [], [])
+    assert len(result.equity) == 0
+    assert result.metrics()["trades"] == 0
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import lag_and_corr_panel, rolling_ols_panel, get_lag_and_corr, get_rolling_alpha, get_rolling_regression
+from synthetic import gapped_universe, per_ticker
+
+PERIOD = 20
+
+
+@pytest.fixture(scope="module")
+def gapped():
+    return gapped_universe()
+
+
+def test_benchmark_misses_ticker_days(gapped):
+    panel, bars, bench = gapped
+    for t in panel.tickers:
+        assert not bars[t].index.difference(bench.index).empty
+
+
+def test_lag_and_corr_panel_on_ticker_dates(gapped):
+    panel, bars, bench = gapped
+    lags, corrs = lag_and_corr_panel(panel, bench, PERIOD)
+    expected_lags = per_ticker(panel, bars, lambda d: get_lag_and_corr(d, bench, PERIOD)[0])
+    expected_corrs = per_ticker(panel, bars, lambda d: get_lag_and_corr(d, bench, PERIOD)[1])
+    np.testing.assert_array_equal(panel.unstack(lags), expected_lags)
+    np.testing.assert_allclose(panel.unstack(corrs), expected_corrs, atol=1e-9, equal_nan=True)
+
+
+def test_rolling_ols_panel_on_ticker_dates(gapped):
+    panel, bars, bench = gapped
+    out = rolling_ols_panel(panel, bench, PERIOD)
+    expected = per_ticker(panel, bars, lambda d: get_rolling_alpha(d, bench, PERIOD))
+    np.testing.assert_allclose(panel.unstack(out["alpha"]), expected, rtol=1e-8, atol=1e-9, equal_nan=True)
+    beta = per_ticker(panel, bars, lambda d: get_rolling_regression(d, bench, PERIOD)["beta"])
+    np.testing.assert_allclose(panel.unstack(out["beta"]), beta, rtol=1e-8, atol=1e-9, equal_nan=True)
+
+
+def test_values_keep_their_dates(gapped):
+    """ The last value lands on the ticker's last date the benchmark also traded, not on its last bar. """
+    panel, bars, bench = gapped
+    alpha = panel.unstack(rolling_ols_panel(panel, bench, PERIOD)["alpha"])
+    for j, t in enumerate(panel.tickers):
+        series = get_rolling_alpha(bars[t], bench, PERIOD).dropna()
+        col = pd.Series(alpha[:, j], index=panel.dates).dropna()
+        assert col.index[-1] == series.index[-1]
+        assert col.index[0] == series.index[0]
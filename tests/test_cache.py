@@ -0,0 +1,189 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pytest
+import helper
+import cache
+from cache import SingleFlight, SharedBars, IndicatorCache, cached_indicator, _copy
+from features import get_indic
+from store import BarStore
+from fake_polygon import FakeRESTClient
+from synthetic import random_bars
+
+TICKERS = ["SPY", "QQQ", "GLD", "TLT", "IWM"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch, tmp_path):
+    """ load_bars reads and writes a throwaway bar store. """
+    monkeypatch.setattr(helper, "store", BarStore(str(tmp_path)))
+
+
+def run_together(n, fn):
+    """ fn(i) on n threads released at once. Returns the results in order. """
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        return fn(i)
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(call, range(n)))
+
+
+class RecordingFetch:
+    """ load_bars stand-in recording calls and the peak concurrency per ticker and overall. """
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = []
+        self.in_flight = {}
+        self.peak = {}
+        self.total = 0
+        self.peak_total = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, ticker, days_back, client=None):
+        with self.lock:
+            self.calls.append((ticker, days_back))
+            self.in_flight[ticker] = self.in_flight.get(ticker, 0) + 1
+            self.peak[ticker] = max(self.peak.get(ticker, 0), self.in_flight[ticker])
+            self.total += 1
+            self.peak_total = max(self.peak_total, self.total)
+        try:
+            time.sleep(self.latency)
+            index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days_back, freq="D", name="Date")
+            return random_bars(index, len(ticker))
+        finally:
+            with self.lock:
+                self.in_flight[ticker] -= 1
+                self.total -= 1
+
+
+# --- SingleFlight ---
+
+def test_single_flight_coalesces():
+    flight = SingleFlight()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.1)
+        return object()
+
+    results = run_together(8, lambda i: flight.do("k", fn))
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert flight.coalesced == 7
+    assert flight.calls == {}
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+
+    def fn():
+        time.sleep(0.1)
+        raise RuntimeError("boom")
+
+    def call(i):
+        try:
+            flight.do("k", fn)
+        except RuntimeError as e:
+            return str(e)
+
+    assert run_together(4, call) == ["boom"] * 4
+    # Nothing is remembered: the next call runs again
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_single_flight_keys_are_independent():
+    flight = SingleFlight()
+    start = time.perf_counter()
+    run_together(4, lambda i: flight.do(i, lambda: time.sleep(0.2)))
+    assert time.perf_counter() - start < 0.6
+    assert flight.coalesced == 0
+
+
+# --- SharedBars ---
+
+def test_concurrent_gets_fetch_each_ticker_once():
+    """ Sessions loading the same universe at once go to Polygon once per ticker. """
+    client = FakeRESTClient(latency=0.05)
+    shared = SharedBars()
+    results = run_together(20, lambda i: shared.get(TICKERS[i % len(TICKERS)], 200, client=client))
+
+    assert client.calls == {t: 1 for t in TICKERS}
+    for i, bars in enumerate(results):
+        pd.testing.assert_frame_equal(bars, results[i % len(TICKERS)])
+    stats = shared.stats()
+    assert stats["misses"] + stats["hits"] == 20
+    assert stats["tickers"] == len(TICKERS)
+
+
+def test_longer_load_serves_shorter():
+    fetch = RecordingFetch(latency=0)
+    shared = SharedBars(fetch)
+    long = shared.get("SPY", 300)
+    short = shared.get("SPY", 100)
+    assert fetch.calls == [("SPY", 300)]
+    assert short.index[0] >= pd.Timestamp.today().normalize() - pd.Timedelta(days=100)
+    pd.testing.assert_frame_equal(short, long.loc[short.index])
+
+
+def test_per_ticker_lock():
+    """ Loads of one ticker over different ranges take turns, other tickers aren't held up. """
+    fetch = RecordingFetch()
+    shared = SharedBars(fetch)
+    specs = [("SPY", 100), ("SPY", 200), ("SPY", 300), ("QQQ", 100), ("GLD", 100), ("TLT", 100)]
+    run_together(len(specs), lambda i: shared.get(*specs[i]))
+
+    assert fetch.peak["SPY"] == 1
+    assert fetch.peak_total > 1
+
+
+def test_get_returns_copies():
+    fetch = RecordingFetch(latency=0.05)
+    shared = SharedBars(fetch)
+    first, second = run_together(2, lambda i: shared.get("SPY", 100))
+    assert first is not second
+    assert len(fetch.calls) == 1
+
+    # Mutating what a session got never reaches the store or other sessions
+    original = second.copy()
+    first["vol_z"] = 1.0
+    first.iloc[:, 0] = -1.0
+    pd.testing.assert_frame_equal(second, original)
+    again = shared.get("SPY", 100)
+    pd.testing.assert_frame_equal(again, original)
+    again.iloc[0, 0] = np.nan
+    short = shared.get("SPY", 50)
+    pd.testing.assert_frame_equal(short, original.loc[short.index])
+
+
+# --- Indicator cache ---
+
+def test_cached_indicator_returns_copies(monkeypatch):
+    monkeypatch.setattr(cache, "indicator_cache", IndicatorCache())
+    data = random_bars(pd.bdate_range("2023-01-02", periods=200), 0)[["Close"]]
+    expected = get_indic("DMA")(data.copy(), 20)
+
+    first = cached_indicator("SPY", "DMA", data, 20)
+    first.iloc[:] = 0.0
+    second = cached_indicator("SPY", "DMA", data, 20)
+    pd.testing.assert_series_equal(second, expected)
+    assert cache.indicator_cache.stats()["hits"] == 1
+
+    second.iloc[:] = 1.0
+    pd.testing.assert_series_equal(cached_indicator("SPY", "DMA", data, 20), expected)
+
+
+def test_copy_nested():
+    """ Indicators returning several outputs (tuples/dicts of Series and arrays) are copied all the way down. """
+    series = pd.Series([1.0, 2.0])
+    value = (series, {"beta": np.zeros(3)}, [0] * 10)
+    copied = _copy(value)
+    assert isinstance(copied, tuple) and copied[2] == [0] * 10
+    copied[0].iloc[0] = 9.0
+    copied[1]["beta"][0] = 9.0
+    assert series.iloc[0] == 1.0 and value[1]["beta"][0] == 0.0
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import FEATURES, REQUIRES_BENCHMARK, feature_matrix, get_indic
+from screener import get_indicator_matrix, get_indicator_stacked, get_panel_indicator
+from synthetic import gapped_universe, per_ticker
+
+PERIOD = 10
+
+
+@pytest.fixture(scope="module")
+def gapped():
+    panel, bars, bench = gapped_universe()
+    return panel, bars, bench, feature_matrix(panel, PERIOD, bench, "BENCH")
+
+
+def expected(bars, bench, name, panel):
+    func = get_indic(name)
+
+    def compute(data):
+        res = func(data[["Close"]], bench, PERIOD) if name in REQUIRES_BENCHMARK else func(data[["Close"]], PERIOD)
+        return res.iloc[:, 0] if isinstance(res, pd.DataFrame) else res
+    return per_ticker(panel, bars, compute)
+
+
+@pytest.mark.parametrize("name", FEATURES)
+def test_matrix_matches_per_ticker(gapped, name):
+    """ Every feature, benchmark ones included, on the dates the per-ticker functions give them. """
+    panel, bars, bench, fm = gapped
+    np.testing.assert_allclose(fm.matrix(name), expected(bars, bench, name, panel), rtol=1e-7, atol=1e-8, equal_nan=True)
+
+
+@pytest.mark.parametrize("name", REQUIRES_BENCHMARK)
+def test_stacked_lines_up_with_panel_bars(gapped, name):
+    """ Row -1 is each ticker's own last bar for every feature, as for the non-benchmark ones. """
+    panel, bars, bench, fm = gapped
+    np.testing.assert_array_equal(fm.stacked(name), panel.stack(fm.matrix(name)))
+    np.testing.assert_allclose(fm.stacked(name), panel.stack(expected(bars, bench, name, panel)), rtol=1e-7, atol=1e-8, equal_nan=True)
+
+
+def test_tidy_dates(gapped):
+    panel, bars, bench, fm = gapped
+    tidy = fm.tidy()
+    for name in REQUIRES_BENCHMARK:
+        rows = tidy[tidy["feature"] == name]
+        for t in panel.tickers:
+            got = rows[rows["ticker"] == t].set_index("date")["value"]
+            want = pd.Series(expected(bars, bench, name, panel)[:, panel.loc(t)], index=panel.dates).dropna()
+            pd.testing.assert_index_equal(got.index, want.index, check_names=False)
+            np.testing.assert_allclose(got.to_numpy(), want.to_numpy(), rtol=1e-7, atol=1e-8)
+
+
+@pytest.mark.parametrize("name", REQUIRES_BENCHMARK)
+def test_screener_paths_agree(gapped, name, monkeypatch):
+    """ get_indicator_matrix/_stacked give the same values from the matrix and from the per-ticker fallback. """
+    panel, bars, bench, _ = gapped
+    matrix = get_indicator_matrix(panel, name, PERIOD, bench, "BENCH")
+    stacked = get_indicator_stacked(panel, name, PERIOD, bench, "BENCH")
+    np.testing.assert_allclose(matrix, expected(bars, bench, name, panel), rtol=1e-7, atol=1e-8, equal_nan=True)
+
+    import screener
+    monkeypatch.setattr(screener, "get_panel_indicator", lambda *args, **kwargs: None)
+    np.testing.assert_allclose(screener.get_indicator_matrix(panel, name, PERIOD, bench, "BENCH"), matrix, rtol=1e-7, atol=1e-8, equal_nan=True)
+    np.testing.assert_allclose(screener.get_indicator_stacked(panel, name, PERIOD, bench, "BENCH"), stacked, rtol=1e-7, atol=1e-8, equal_nan=True)
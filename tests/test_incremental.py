@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import get_indic
+from helper import get_volume
+from incremental import Indicator, INCREMENTAL, VolumeZ, make_incremental
+
+
+def make_bars(n=500, seed=0, gaps=False):
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range("2023-01-02", periods=n, name="Date")
+    if gaps:
+        # Holidays: the calendar windows (DMA) must skip missing days like pandas does
+        idx = idx.delete(rng.choice(n, n // 20, replace=False))
+    return pd.DataFrame({
+        "Close": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(idx)))),
+        "Volume": rng.uniform(1e6, 2e6, len(idx)),
+    }, index=idx)
+
+
+def assert_matches(expected, actual, tol=1e-8):
+    a = np.asarray(expected, dtype=float)
+    b = actual.to_numpy()
+    np.testing.assert_array_equal(np.isnan(a), np.isnan(b))
+    ok = ~np.isnan(a)
+    assert np.max(np.abs(a[ok] - b[ok]), initial=0.0) <= tol
+
+
+@pytest.mark.parametrize("name", sorted(INCREMENTAL))
+@pytest.mark.parametrize("period", [5, 20])
+@pytest.mark.parametrize("gaps", [False, True])
+def test_streaming_matches_batch(name, period, gaps):
+    """ Feeding bars one by one gives the batch functions' values at every bar. """
+    data = make_bars(gaps=gaps)
+    expected = get_indic(name)(data[["Close"]].copy(), period)
+    assert_matches(expected, make_incremental(name, period).run(data))
+
+
+def test_volume_z_matches_batch():
+    data = make_bars(seed=1)
+    assert_matches(get_volume(data.copy()), VolumeZ().run(data))
+
+
+def test_warm_up_then_update():
+    """ from_history on all but the last bar, then one update(), equals the full run. """
+    data = make_bars(300, seed=2)
+    for name in INCREMENTAL:
+        full = make_incremental(name, 14).run(data)
+        ind = make_incremental(name, 14, data.iloc[:-1])
+        last = ind.update({"Date": data.index[-1], **data.iloc[-1].to_dict()})
+        assert np.isclose(last, full.iloc[-1], equal_nan=True)
+
+
+def test_indicator_is_abstract():
+    with pytest.raises(TypeError):
+        Indicator()
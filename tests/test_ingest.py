@@ -0,0 +1,137 @@
+import json
+import os
+from datetime import date
+import pandas as pd
+import pytest
+from polygon import RESTClient
+from polygon.rest.models import Agg
+import helper
+from ingest import ingest, market_of, bar_date, trading_days, IngestState
+from store import BarStore
+from polygon_stub import FIXTURES
+
+TODAY = date(2024, 4, 2)
+DAYS_BACK = 8
+TICKERS = ["SPY", "QQQ", "GLD", "TLT", "X:BTCUSD", "X:ETHUSD", "GC=F"]
+
+
+def run(stub, store, tickers=TICKERS):
+    client = RESTClient("test", base=stub.url, retries=0)
+    return ingest(tickers, days_back=DAYS_BACK, client=client, store=store, today=TODAY,
+                  chunk=4, requests_per_minute=1e6, backoff=0)
+
+
+def recorded(market, day, ticker):
+    with open(os.path.join(FIXTURES, "grouped", market, f"{day}.json")) as f:
+        return next(r for r in json.load(f)["results"] if r["T"] == ticker)
+
+
+def test_market_of():
+    assert market_of("SPY") == "stocks"
+    assert market_of("X:BTCUSD") == "crypto"
+    assert market_of("GC=F") is None
+
+
+def test_trading_days():
+    stocks = trading_days(date(2024, 3, 28), date(2024, 4, 1), "stocks")
+    crypto = trading_days(date(2024, 3, 28), date(2024, 4, 1), "crypto")
+    # Weekends are never requested for stocks, holidays (Good Friday) are and come back empty
+    assert stocks == [date(2024, 3, 28), date(2024, 3, 29), date(2024, 4, 1)]
+    assert len(crypto) == 5
+
+
+def test_bar_date_matches_get_aggs():
+    # Midnight New York across the DST switch, midnight UTC for crypto
+    assert bar_date(date(2024, 3, 8), "stocks") == pd.Timestamp("2024-03-08 05:00")
+    assert bar_date(date(2024, 3, 11), "stocks") == pd.Timestamp("2024-03-11 04:00")
+    assert bar_date(date(2024, 3, 11), "crypto") == pd.Timestamp("2024-03-11")
+
+
+def test_ingest_end_to_end(polygon_stub, tmp_path):
+    store = BarStore(str(tmp_path))
+    summary = run(polygon_stub, store)
+
+    assert summary["errors"] == {}
+    assert summary["unsupported"] == ["GC=F"]
+    # One request per weekday for stocks, per day for crypto
+    assert summary["requests"] == len(polygon_stub.hits) == 7 + 9
+
+    spy = store.read("SPY")
+    assert len(spy) == 6
+    assert spy.index[0] == pd.Timestamp("2024-03-25 04:00")
+    assert spy.loc["2024-03-25 04:00", "Close"] == recorded("stocks", "2024-03-25", "SPY")["c"]
+    assert spy.attrs == {"covered_from": "2024-03-25", "refreshed": "2024-04-02"}
+
+    btc = store.read("X:BTCUSD")
+    assert len(btc) == 9
+    assert btc.index[-1] == pd.Timestamp("2024-04-02")
+
+    # Tickers outside the requested set are filtered out
+    assert not os.path.exists(store.path("ZZZT"))
+    assert not os.path.exists(store.path("X:FOOUSD"))
+
+
+def test_ingest_writes_get_polygon_data_format(polygon_stub, tmp_path):
+    store = BarStore(str(tmp_path))
+    run(polygon_stub, store, ["SPY"])
+    row = recorded("stocks", "2024-03-25", "SPY")
+
+    # What get_aggs returns for the same day: stamped at the start of the window
+    start = int(pd.Timestamp("2024-03-25").tz_localize("America/New_York").timestamp() * 1000)
+
+    class Client:
+        def get_aggs(self, **kwargs):
+            return [Agg(close=row["c"], volume=row["v"], timestamp=start)]
+
+    fetched = helper.fetch_aggs("SPY", "2024-03-25", "2024-03-25", Client())
+    stored = store.read("SPY")
+    assert stored.index.name == "Date"
+    assert stored.dtypes.to_dict() == fetched.dtypes.to_dict()
+    pd.testing.assert_frame_equal(stored.loc[fetched.index], fetched, check_freq=False)
+
+
+def test_ingest_resumes(polygon_stub, tmp_path):
+    store = BarStore(str(tmp_path / "resumed"))
+    polygon_stub.fail = {("stocks", "2024-03-27"), ("crypto", "2024-03-30")}
+    first = run(polygon_stub, store)
+    assert set(first["errors"]) == {"stocks 2024-03-27", "crypto 2024-03-30"}
+    # Both failures are in earlier batches than today's, which still refreshes the tickers
+    assert store.read("SPY").attrs["refreshed"] == "2024-04-02"
+
+    done = IngestState(store.root).done
+    assert "2024-03-27" not in done["stocks"] and "2024-03-30" not in done["crypto"]
+    # Today stays open so a partial session is picked up by the next run
+    assert "2024-04-02" not in done["stocks"]
+
+    polygon_stub.fail.clear()
+    polygon_stub.hits.clear()
+    second = run(polygon_stub, store)
+    assert second["errors"] == {}
+    assert sorted(polygon_stub.hits) == [("crypto", "2024-03-30"), ("crypto", "2024-04-02"),
+                                         ("stocks", "2024-03-27"), ("stocks", "2024-04-02")]
+
+    clean = BarStore(str(tmp_path / "clean"))
+    run(polygon_stub, clean)
+    for ticker in ("SPY", "X:BTCUSD"):
+        pd.testing.assert_frame_equal(store.read(ticker), clean.read(ticker))
+        assert store.read(ticker).attrs == clean.read(ticker).attrs
+
+
+def test_refreshed_per_batch(polygon_stub, tmp_path, capsys):
+    """ A failure in today's batch holds back the refresh for that market only, and is reported on stderr. """
+    store = BarStore(str(tmp_path))
+    polygon_stub.fail = {("stocks", "2024-04-01")}
+    summary = run(polygon_stub, store)
+    assert set(summary["errors"]) == {"stocks 2024-04-01"}
+    assert "refreshed" not in store.read("SPY").attrs
+    assert store.read("X:BTCUSD").attrs["refreshed"] == "2024-04-02"
+
+    out = capsys.readouterr()
+    assert "Error ingesting stocks 2024-04-01" in out.err
+    assert "Error ingesting" not in out.out
+
+
+def test_get_client_base_url(monkeypatch, polygon_stub):
+    monkeypatch.setattr(helper, "client", None)
+    monkeypatch.setenv("POLYGON_BASE_URL", polygon_stub.url)
+    assert helper.get_client().BASE == polygon_stub.url
@@ -0,0 +1,359 @@
+import numpy as np
+import pandas as pd
+import pytest
+from features import (kalman_gains, kalman_filter, kalman_panel, kalman_first, get_smoothed, kalman_second,
+                      rolling_lag_corr, get_lag_and_corr, rolling_ols, get_rolling_regression,
+                      rolling_extrema, rolling_retrac, get_rolling_retrac, perc_retrac_second, retrac_panel,
+                      rolling_moments)
+import reference_features as reference
+from reference_features import kalman_loop, kalman_indicator
+from synthetic import random_bars, drop_days
+
+DATES = pd.bdate_range("2023-01-02", periods=300)
+
+
+def random_returns(n, seed, k=None):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, 0.02, n if k is None else (n, k))
+
+
+# --- Kalman ---
+
+@pytest.mark.parametrize("seed", range(5))
+def test_kalman_filter_matches_loop(seed):
+    z = random_returns(500, seed)
+    for got, want in zip(kalman_filter(z), kalman_loop(z)):
+        np.testing.assert_allclose(got, want, rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize("func, output", [(kalman_first, 0), (get_smoothed, 1), (kalman_second, 2)])
+@pytest.mark.parametrize("period", [5, 10, 30])
+def test_kalman_indicators_match_loop(func, output, period):
+    data = random_bars(pd.bdate_range("2023-01-02", periods=300), period)
+    want = kalman_indicator(data[["Close"]], period, output)
+    got = func(data[["Close"]].copy(), period)
+    pd.testing.assert_index_equal(got.index, want.index)
+    np.testing.assert_allclose(got.to_numpy(), want.to_numpy(), rtol=1e-7, atol=1e-9)
+
+
+def test_kalman_short_inputs():
+    one = random_bars(pd.bdate_range("2023-01-02", periods=1), 0)
+    assert kalman_first(one[["Close"]], 10) == [0] * 10
+    two = random_bars(pd.bdate_range("2023-01-02", periods=2), 0)
+    assert kalman_first(two[["Close"]].copy(), 10).tolist() == [0.0, 0.0]
+    for out in kalman_filter(np.array([])):
+        assert out.shape == (0,)
+
+
+def test_kalman_batched_matches_columns():
+    """ Stacked panel columns with different leading NaN padding filter like separate series. """
+    z = random_returns(200, 7, k=4)
+    starts = [0, 1, 50, 199]
+    for j, s in enumerate(starts):
+        z[:s, j] = np.nan
+    z = np.hstack([z, np.full((200, 1), np.nan)])
+
+    batched = kalman_filter(z)
+    for j, s in enumerate(starts):
+        for got, want in zip(batched, kalman_loop(z[s:, j])):
+            assert np.isnan(got[:s, j]).all()
+            np.testing.assert_allclose(got[s:, j], want, rtol=1e-10, atol=1e-12)
+    for out in batched:
+        assert np.isnan(out[:, -1]).all()
+
+
+def test_kalman_panel_matches_per_ticker():
+    close = np.cumprod(1 + random_returns(150, 3, k=3), axis=0) * 100
+    close[:40, 1] = np.nan
+    out = kalman_panel(close, 10)
+    for j in range(3):
+        s = int(np.argmax(~np.isnan(close[:, j])))
+        frame = pd.DataFrame({"Close": close[s:, j]})
+        for name, output in (("First Order Kalman", 0), ("Kalman Innovation", 1), ("Second Order Kalman", 2)):
+            np.testing.assert_allclose(out[name][s:, j], kalman_indicator(frame, 10, output), rtol=1e-7, atol=1e-9)
+            assert np.isnan(out[name][:s, j]).all()
+
+
+def test_kalman_steady_state():
+    K = kalman_gains(500)
+    steady = kalman_gains(500, steady_state=True)
+    np.testing.assert_allclose(steady, K, atol=1e-10)
+    # The gain has converged well inside the history the screener loads
+    assert np.abs(K[100] - K[-1]).max() < 1e-12
+
+    z = random_returns(500, 11)
+    for got, want in zip(kalman_filter(z, steady_state=True), kalman_filter(z)):
+        np.testing.assert_allclose(got, want, rtol=1e-8, atol=1e-10)
+
+
+# --- Lead/lag correlation ---
+
+def lag_pair(seed):
+    """ A stock and a benchmark missing some of its days, so the pairing dropna matters. """
+    return random_bars(DATES, seed), random_bars(drop_days(DATES, seed + 10), seed + 10)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("period", [8, 12, 20, 40])
+@pytest.mark.parametrize("seed", range(3))
+def test_lag_corr_matches_loop(period, seed):
+    stock, bench = lag_pair(seed)
+    lags, corrs = get_lag_and_corr(stock, bench, period)
+    want_lags, want_corrs = reference.get_lag_and_corr(stock, bench, period)
+    pd.testing.assert_index_equal(lags.index, pd.Index(want_lags.index), check_names=False)
+    np.testing.assert_array_equal(lags.to_numpy(), want_lags.to_numpy())
+    np.testing.assert_allclose(corrs.to_numpy(), want_corrs.to_numpy(), atol=1e-9)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("period", [3, 5, 7])
+def test_lag_corr_short_period_ties(period):
+    """
+    With period <= 7 some lags have two-point windows, correlated exactly +/-1. The kernel
+    returns exact 1s so the first (most negative) of the tied lags wins, where the old loop
+    broke the tie on rounding noise. Correlations agree, lags only differ on such ties.
+    """
+    differ = 0
+    for seed in range(3):
+        stock, bench = lag_pair(seed)
+        lags, corrs = get_lag_and_corr(stock, bench, period)
+        want_lags, want_corrs = reference.get_lag_and_corr(stock, bench, period)
+        np.testing.assert_allclose(corrs.to_numpy(), want_corrs.to_numpy(), atol=1e-9)
+
+        tie = lags.to_numpy() != want_lags.to_numpy()
+        np.testing.assert_allclose(want_corrs.to_numpy()[tie], 1.0, atol=1e-9)
+        assert (lags.to_numpy()[tie] < want_lags.to_numpy()[tie]).all()
+        differ += tie.sum()
+    assert differ
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_lag_corr_flat_windows():
+    """ A flat stretch in either series gives lag 0 and correlation 0, like the loop's std() == 0 check. """
+    stock, bench = lag_pair(0)
+    stock.iloc[100:140, 0] = stock["Close"].iloc[100]
+    bench.iloc[200:230, 0] = bench["Close"].iloc[200]
+    lags, corrs = get_lag_and_corr(stock, bench, 20)
+    want_lags, want_corrs = reference.get_lag_and_corr(stock, bench, 20)
+    np.testing.assert_array_equal(lags.to_numpy(), want_lags.to_numpy())
+    np.testing.assert_allclose(corrs.to_numpy(), want_corrs.to_numpy(), atol=1e-9)
+    assert ((lags == 0) & (corrs == 0)).sum() >= 20
+
+
+def test_lag_corr_short_inputs():
+    stock, bench = lag_pair(0)
+    for n in (1, 15):
+        lags, corrs = get_lag_and_corr(stock.iloc[:n], bench, 20)
+        assert lags.empty and corrs.empty
+    for out in rolling_lag_corr(np.array([]), np.array([]), 20):
+        assert out.shape == (0,)
+    lags, corrs = rolling_lag_corr(np.full(30, np.nan), random_returns(30, 0), 5)
+    assert np.isnan(lags).all() and np.isnan(corrs).all()
+
+
+def test_lag_corr_batched_matches_columns():
+    stock = random_returns(200, 1, k=3)
+    stock[:60, 1] = np.nan
+    bench = random_returns(200, 2)
+    lags, corrs = rolling_lag_corr(stock, bench, 15)
+    for j in range(3):
+        s = int(np.argmax(~np.isnan(stock[:, j])))
+        want_lags, want_corrs = rolling_lag_corr(stock[s:, j], bench[s:], 15)
+        np.testing.assert_array_equal(lags[s:, j], want_lags)
+        np.testing.assert_allclose(corrs[s:, j], want_corrs, atol=1e-12)
+        assert np.isnan(lags[:s, j]).all()
+
+
+# --- Rolling OLS ---
+
+def ols_windows(y, x, period):
+    """ Refit per window with np.polyfit: (alpha, beta, r2, resid_vol), alpha and vol annualised. """
+    out = np.full((len(y), 4), np.nan)
+    for t in range(period - 1, len(y)):
+        wy, wx = y[t - period + 1:t + 1], x[t - period + 1:t + 1]
+        if np.isnan(wy).any() or np.isnan(wx).any() or np.ptp(wx) == 0:
+            continue
+        beta, alpha = np.polyfit(wx, wy, 1)
+        resid = wy - (alpha + beta * wx)
+        r2 = 1 - resid @ resid / ((wy - wy.mean()) @ (wy - wy.mean()))
+        vol = np.sqrt(resid @ resid / (period - 2)) if period > 2 else np.nan
+        out[t] = alpha * 252, beta, r2, vol * np.sqrt(252)
+    return out
+
+
+def regression_pair(n, seed):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(0, 0.01, n)
+    return 0.0004 + 1.3 * x + rng.normal(0, 0.005, n), x
+
+
+@pytest.mark.parametrize("period", [3, 5, 20, 60])
+def test_rolling_ols_matches_polyfit(period):
+    y, x = regression_pair(300, period)
+    out = rolling_ols(y, x, period)
+    want = ols_windows(y, x, period)
+    for i, name in enumerate(("alpha", "beta", "r2", "resid_vol")):
+        np.testing.assert_allclose(out[name], want[:, i], rtol=1e-7, atol=1e-10, equal_nan=True)
+
+
+def test_rolling_ols_flat_benchmark():
+    """ A window where the benchmark doesn't move has no regression: NaN, not inf. """
+    y, x = regression_pair(100, 0)
+    x[40:60] = 0.0
+    out = rolling_ols(y, x, 10)
+    want = ols_windows(y, x, 10)
+    assert np.isnan(out["beta"][49:60]).all()
+    for i, name in enumerate(("alpha", "beta", "r2", "resid_vol")):
+        np.testing.assert_allclose(out[name], want[:, i], rtol=1e-7, atol=1e-10, equal_nan=True)
+
+
+def test_rolling_ols_short_inputs():
+    y, x = regression_pair(10, 0)
+    assert all(np.isnan(v).all() and v.shape == (10,) for v in rolling_ols(y, x, 20).values())
+    assert all(v.shape == (0,) for v in rolling_ols(np.array([]), np.array([]), 20).values())
+    out = rolling_ols(np.full((30, 2), np.nan), x[:10].repeat(3), 5)
+    assert all(np.isnan(v).all() for v in out.values())
+
+
+def test_rolling_ols_batched_matches_columns():
+    y = np.column_stack([regression_pair(200, s)[0] for s in range(3)])
+    x = regression_pair(200, 9)[1]
+    y[:70, 2] = np.nan
+    out = rolling_ols(y, x, 20)
+    for j in range(3):
+        s = int(np.argmax(~np.isnan(y[:, j])))
+        want = rolling_ols(y[s:, j], x[s:], 20)
+        for name in out:
+            np.testing.assert_allclose(out[name][s:, j], want[name], rtol=1e-9, atol=1e-12, equal_nan=True)
+            assert np.isnan(out[name][:s, j]).all()
+
+
+def test_get_rolling_regression_pairs_dates():
+    stock, bench = lag_pair(3)
+    out = get_rolling_regression(stock, bench, 20)
+    rets = pd.DataFrame({"y": stock["Close"].pct_change(), "x": bench["Close"].pct_change()}).dropna()
+    pd.testing.assert_index_equal(out.index, rets.index)
+    want = ols_windows(rets["y"].to_numpy(), rets["x"].to_numpy(), 20)
+    np.testing.assert_allclose(out[["alpha", "beta", "r2", "resid_vol"]].to_numpy(), want, rtol=1e-7, atol=1e-10, equal_nan=True)
+
+
+# --- Rolling extrema / retracement ---
+
+def tied_prices(n, seed):
+    """ Prices on a coarse grid so windows often hold the same max/min more than once. """
+    rng = np.random.default_rng(seed)
+    return np.round(100 + np.cumsum(rng.normal(0, 1, n)))
+
+
+@pytest.mark.parametrize("period", [1, 2, 5, 14, 63, 252])
+@pytest.mark.parametrize("ties", [False, True])
+def test_rolling_extrema_matches_argmax(period, ties):
+    prices = tied_prices(600, period) if ties else random_bars(pd.bdate_range("2022-01-03", periods=600), period)["Close"].to_numpy()
+    roll_max, max_idx, roll_min, min_idx = rolling_extrema(prices, period)
+    windows = np.lib.stride_tricks.sliding_window_view(prices, period)
+    np.testing.assert_array_equal(max_idx, windows.argmax(axis=1))
+    np.testing.assert_array_equal(min_idx, windows.argmin(axis=1))
+    np.testing.assert_array_equal(roll_max, pd.Series(prices).rolling(period).max().to_numpy()[period - 1:])
+    np.testing.assert_array_equal(roll_min, pd.Series(prices).rolling(period).min().to_numpy()[period - 1:])
+
+
+@pytest.mark.parametrize("period", [2, 5, 14, 252])
+@pytest.mark.parametrize("ties", [False, True])
+def test_retrac_matches_sliding_window(period, ties):
+    close = tied_prices(600, period) if ties else random_bars(pd.bdate_range("2022-01-03", periods=600), period)["Close"].to_numpy()
+    data = pd.DataFrame({"Close": close}, index=pd.bdate_range("2022-01-03", periods=600))
+    for raw in (False, True):
+        pd.testing.assert_series_equal(get_rolling_retrac(data, period, raw), reference.get_rolling_retrac(data, period, raw))
+    pd.testing.assert_series_equal(perc_retrac_second(data, period), reference.perc_retrac_second(data, period))
+
+
+def test_retrac_flat_window():
+    """ A flat window has no range: position 0, like the old nan_to_num. """
+    close = np.r_[np.linspace(100, 110, 20), np.full(20, 110.0)]
+    data = pd.DataFrame({"Close": close})
+    pd.testing.assert_series_equal(get_rolling_retrac(data, 10), reference.get_rolling_retrac(data, 10))
+    assert (get_rolling_retrac(data, 10).iloc[30:] == 0).all()
+
+
+def test_rolling_extrema_short_and_nan():
+    prices = tied_prices(10, 0)
+    assert all(len(out) == 0 for out in rolling_extrema(prices, 20))
+    assert np.isnan(rolling_retrac(prices, 20)).all()
+
+    # Windows touching a NaN are NaN, the rest are unaffected
+    prices = tied_prices(50, 1)
+    prices[20] = np.nan
+    roll_max, _, roll_min, _ = rolling_extrema(prices, 5)
+    assert np.isnan(roll_max[16:21]).all() and np.isnan(roll_min[16:21]).all()
+    np.testing.assert_array_equal(roll_max[:16], pd.Series(prices[:20]).rolling(5).max().to_numpy()[4:])
+    np.testing.assert_array_equal(roll_max[21:], pd.Series(prices[21:]).rolling(5).max().to_numpy()[4:])
+
+
+def test_retrac_panel_matches_columns():
+    close = np.column_stack([tied_prices(300, s) for s in range(3)])
+    close[:100, 1] = np.nan
+    out = retrac_panel(close, 14)
+    for j in range(3):
+        s = int(np.argmax(~np.isnan(close[:, j])))
+        data = pd.DataFrame({"Close": close[s:, j]})
+        np.testing.assert_array_equal(out["Percentage Retracement"][s:, j], reference.get_rolling_retrac(data, 14).to_numpy())
+        np.testing.assert_allclose(out["Second Order Percentage Retracement"][s:, j],
+                                   reference.perc_retrac_second(data, 14).to_numpy(), atol=1e-15, equal_nan=True)
+        assert np.isnan(out["Percentage Retracement"][:s, j]).all()
+
+
+# --- Rolling moments ---
+
+def pandas_moments(values, period):
+    rolling = pd.DataFrame(values).rolling(period)
+    return {"mean": rolling.mean(), "std": rolling.std(), "skew": rolling.skew(), "kurt": rolling.kurt()}
+
+
+def assert_moments(got, values, period, rtol=1e-7, atol=1e-10):
+    want = pandas_moments(values, period)
+    for key in ("mean", "std", "skew", "kurt"):
+        expected = want[key].to_numpy()
+        np.testing.assert_allclose(got[key].reshape(expected.shape), expected, rtol=rtol, atol=atol, equal_nan=True, err_msg=key)
+
+
+@pytest.mark.parametrize("period", [2, 3, 4, 5, 20, 60])
+def test_rolling_moments_match_pandas(period):
+    values = random_returns(400, period, k=3)
+    # 5-bar kurtosis amplifies rounding more than the other moments
+    assert_moments(rolling_moments(values, period), values, period, rtol=1e-6 if period == 5 else 1e-7)
+
+
+def test_rolling_moments_flat_windows():
+    """ Flat windows: std 0, skew 0 and kurt -3, like pandas. """
+    values = random_returns(100, 0)
+    values[30:60] = 0.01
+    out = rolling_moments(values, 10)
+    assert (out["std"][39:60] == 0).all()
+    assert (out["skew"][39:60] == 0).all() and (out["kurt"][39:60] == -3).all()
+    assert_moments(out, values, 10)
+
+
+@pytest.mark.filterwarnings("ignore:All-NaN slice:RuntimeWarning")
+def test_rolling_moments_nan_and_short():
+    values = random_returns(120, 1, k=3)
+    values[:50, 1] = np.nan
+    values[70, 0] = np.nan
+    values[:, 2] = np.nan
+    out = rolling_moments(values, 20)
+    assert_moments(out, values, 20)
+    assert np.isnan(out["mean"][70:90, 0]).all() and not np.isnan(out["mean"][90, 0])
+
+    short = rolling_moments(values[:10, 0], 20)
+    assert all(v.shape == (10,) and np.isnan(v).all() for v in short.values())
+    assert all(v.shape == (0,) for v in rolling_moments(np.array([]), 20).values())
+
+
+@pytest.mark.parametrize("last", [1, 6, 50])
+def test_rolling_moments_last(last):
+    values = random_returns(300, 2, k=4)
+    values[:250, 3] = np.nan
+    full = rolling_moments(values, 20)
+    tail = rolling_moments(values, 20, last=last)
+    for key in full:
+        assert tail[key].shape == (last, 4)
+        np.testing.assert_allclose(tail[key], full[key][-last:], rtol=1e-8, atol=1e-10, equal_nan=True)
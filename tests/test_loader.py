@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import pandas as pd
+import pytest
+import helper
+from cache import shared_bars
+from loader import load_universe, rate_limited, TokenBucket
+from store import BarStore
+from fake_polygon import FakeRESTClient
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch, tmp_path):
+    """ Every test starts from an empty bar store and shared cache. """
+    monkeypatch.setattr(helper, "store", BarStore(str(tmp_path)))
+    shared_bars.clear()
+    yield
+    shared_bars.clear()
+
+
+def load(client, tickers, **kwargs):
+    return load_universe(tickers, days_back=200, client=client, backoff=0.01, **kwargs)
+
+
+def test_bars_and_failures_contract():
+    recent = (date.today() - timedelta(days=20)).isoformat()
+    client = FakeRESTClient(errors={"BAD": RuntimeError("boom")}, listed={"NEW": recent}, empty=["GONE"])
+    tickers = ["SPY", "QQQ", "BAD", "NEW", "GONE"]
+    bars, failures = load(client, tickers, min_bars=50)
+
+    assert sorted(bars) == ["QQQ", "SPY"]
+    assert set(bars) | set(failures) == set(tickers) and not set(bars) & set(failures)
+    assert failures["BAD"] == "RuntimeError: boom"
+    assert failures["GONE"] == "No data returned"
+    assert failures["NEW"].startswith("Only ") and failures["NEW"].endswith(" bars of history")
+
+    spy = bars["SPY"]
+    assert list(spy.columns) == ["Close", "Volume"] and spy.index.name == "Date"
+    assert spy.index[0] >= pd.Timestamp(date.today() - timedelta(days=200))
+
+
+def test_rate_limited_calls_are_retried():
+    client = FakeRESTClient(rate_limited={"SPY": 2})
+    bars, failures = load(client, ["SPY"])
+    assert "SPY" in bars and not failures
+    assert client.calls["SPY"] == 3
+
+
+def test_rate_limit_reported_after_retries():
+    client = FakeRESTClient(rate_limited={"SPY": 5})
+    bars, failures = load(client, ["SPY", "QQQ"], retries=2)
+    assert "QQQ" in bars
+    assert "429" in failures["SPY"]
+    assert client.calls["SPY"] == 3
+
+
+def test_concurrency_is_bounded():
+    tickers = [f"T{i}" for i in range(16)]
+    client = FakeRESTClient(latency=0.2)
+    started = time.monotonic()
+    bars, failures = load(client, tickers, max_in_flight=4)
+    elapsed = time.monotonic() - started
+
+    assert len(bars) == 16 and not failures
+    assert client.peak == 4
+    # 4 waves of 0.2s, not 16 sequential calls (latency well above the store writes' overhead)
+    assert elapsed < 16 * 0.2 * 0.75
+
+
+def test_unthrottled_by_default():
+    client = FakeRESTClient()
+    started = time.monotonic()
+    bars, _ = load(client, [f"T{i}" for i in range(30)])
+    assert len(bars) == 30
+    assert time.monotonic() - started < 5
+
+
+def test_throttle_when_configured():
+    client = FakeRESTClient()
+    started = time.monotonic()
+    load(client, ["A", "B", "C", "D"], requests_per_minute=600)
+    # One token up front, then one every 0.1s
+    assert time.monotonic() - started >= 0.3
+
+
+def test_throttle_is_shared():
+    """ Concurrent loads (e.g. two sessions) share one bucket per rate instead of each getting the full quota. """
+    assert rate_limited(FakeRESTClient(), 300).bucket is rate_limited(FakeRESTClient(), 300.0).bucket
+    assert rate_limited(FakeRESTClient(), 300).bucket is not rate_limited(FakeRESTClient(), 150).bucket
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        list(pool.map(lambda names: load(FakeRESTClient(), names, requests_per_minute=300), [["A", "B", "C"], ["D", "E", "F"]]))
+    # 6 calls at one every 0.2s, not 3 per session in parallel
+    assert time.monotonic() - started >= 0.9
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(1200)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert 0.15 <= time.monotonic() - started < 1
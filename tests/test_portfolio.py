@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from backtest import run_rules
+from portfolio import SignalPortfolio
+from reference_portfolio import SignalPortfolio as ReferencePortfolio, run_reference
+from synthetic import random_rules
+
+
+def feed(port, seed, n=500):
+    """ Random 1/-1/0/None signals over a random walk, including flips and holds. """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2023-01-02", periods=n, freq="D")
+    prices = 20 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    signals = rng.choice(np.array([1, -1, 0, None], dtype=object), n)
+    for date, price, sig in zip(dates, prices, signals):
+        port.update(sig, price, date)
+    return port
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_compact_matches_history(seed):
+    # capacity=8 forces the buffers and the ledger to grow several times
+    compact = feed(SignalPortfolio(compact=True, capacity=8), seed)
+    plain = feed(SignalPortfolio(), seed)
+    reference = feed(ReferencePortfolio(), seed)
+
+    want = pd.DataFrame(reference.history).set_index("Date")
+    pd.testing.assert_frame_equal(plain.to_frame(), want)
+    pd.testing.assert_frame_equal(compact.to_frame(), want, check_dtype=False)
+    for k, v in compact.to_numpy().items():
+        np.testing.assert_array_equal(v, plain.to_numpy()[k])
+    pd.testing.assert_frame_equal(compact.trades(), plain.trades())
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_ledger_matches_simulate(seed):
+    df, rules = random_rules(seed)
+    port = run_reference(df, rules, port=SignalPortfolio(compact=True))
+    trades = port.trades()
+    result = run_rules(df, rules)
+
+    assert len(trades) == len(result.trades["pnl"])
+    for k in ("side", "quantity", "entry_price", "exit_price", "pnl"):
+        np.testing.assert_allclose(trades[k].to_numpy(dtype=float), result.trades[k].astype(float), rtol=1e-12)
+    np.testing.assert_array_equal(trades["entry_date"].to_numpy(), result.trades["entry_date"].astype("datetime64[ns]"))
+    np.testing.assert_array_equal(trades["exit_date"].to_numpy(), result.trades["exit_date"].astype("datetime64[ns]"))
+    np.testing.assert_allclose(port.to_numpy()["Equity"], result.equity, rtol=1e-12)
+
+
+def test_open_trade_not_in_ledger():
+    port = SignalPortfolio(compact=True)
+    port.update(1, 10.0, pd.Timestamp("2024-01-01"))
+    port.update(1, 11.0, pd.Timestamp("2024-01-02"))
+    assert port.trades().empty
+    port.update(0, 12.0, pd.Timestamp("2024-01-03"))
+    trade = port.trades().iloc[0]
+    assert trade["side"] == 1 and trade["quantity"] == 1000 and trade["pnl"] == 2000.0
+    assert trade["entry_date"] == pd.Timestamp("2024-01-01")
+
+
+def test_export_is_zero_copy():
+    port = feed(SignalPortfolio(compact=True), 0, n=100)
+    cols = port.to_numpy()
+    for k, v in cols.items():
+        assert np.shares_memory(v, port.columns[k])
+        assert len(v) == 100
+
+    frame = port.to_frame()
+    assert np.shares_memory(frame["Equity"].to_numpy(), port.columns["Equity"])
+
+    table = port.to_arrow()
+    assert table.num_rows == 100
+    assert table.schema.field("Date").type == pa.timestamp("ns")
+    equity = table.column("Equity").chunk(0)
+    assert equity.buffers()[1].address == cols["Equity"].ctypes.data
+
+
+def test_slots():
+    port = SignalPortfolio(compact=True)
+    with pytest.raises(AttributeError):
+        port.extra = 1
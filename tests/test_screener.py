@@ -0,0 +1,15 @@
+import pytest
+from screener import main
+
+
+@pytest.mark.parametrize("argv, message", [
+    (["--x", "Nope"], "argument --x: invalid choice: 'Nope'"),
+    (["--y", "dma"], "argument --y: invalid choice: 'dma'"),
+    (["--x", "Rolling Alpha"], "Rolling Alpha needs a benchmark (--bench-x)"),
+])
+def test_cli_rejects_bad_indicators(argv, message, capsys):
+    """ Bad axes fail at argument parsing, before any data is loaded. """
+    with pytest.raises(SystemExit) as exit:
+        main(argv)
+    assert exit.value.code == 2
+    assert message in capsys.readouterr().err
@@ -0,0 +1,96 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import helper
+import snapshot
+from snapshot import ScannerSnapshot, load_snapshot, build_snapshot, MANIFEST
+from store import BarStore
+from fake_polygon import FakeRESTClient
+
+
+def make_snapshot(marker, tickers=("SPY", "QQQ")):
+    """ Tiny snapshot whose values and stats both carry `marker`, to tell builds apart. """
+    values = pd.DataFrame({"indic": "DMA", "period": 20, "bench": "", "delay": 0, "ticker": list(tickers), "value": float(marker)})
+    stats = pd.DataFrame({"period": 20, "delay": 0, "ticker": list(tickers), "bars": marker,
+                          "vol_z": 0.0, "skew": 0.0, "kurt": 0.0})
+    return ScannerSnapshot(values, stats, {"BAD": f"build {marker}"}, as_of=pd.Timestamp("2024-04-02"))
+
+
+def test_save_and_load(tmp_path):
+    make_snapshot(1).save(str(tmp_path))
+    snap = load_snapshot(str(tmp_path))
+    assert snap.failures == {"BAD": "build 1"}
+    assert snap.as_of == "2024-04-02 00:00:00"
+    table = snap.scan(["SPY", "QQQ"], ["DMA", "DMA"], [20, 20], min_bars=1)
+    assert table["Ticker"].tolist() == ["SPY", "QQQ"]
+
+
+def test_missing_or_stale(tmp_path):
+    assert load_snapshot(str(tmp_path)) is None
+    make_snapshot(1).save(str(tmp_path))
+    assert load_snapshot(str(tmp_path), max_age_hours=0) is None
+
+
+def test_old_versions_pruned(tmp_path):
+    for marker in range(5):
+        make_snapshot(marker).save(str(tmp_path))
+    versions = [d for d in os.listdir(tmp_path) if os.path.isdir(tmp_path / d)]
+    assert len(versions) == snapshot.KEEP_VERSIONS
+    assert (tmp_path / MANIFEST).read_text() in versions
+    # No temp files left behind
+    assert sorted(f for f in os.listdir(tmp_path) if not os.path.isdir(tmp_path / f)) == [MANIFEST]
+    assert load_snapshot(str(tmp_path)).stats["bars"].iloc[0] == 4
+
+
+def test_concurrent_saves_stay_consistent(tmp_path):
+    """ Readers racing two builds always get values and stats from the same build. """
+    root = str(tmp_path)
+    make_snapshot(0).save(root)
+    stop = threading.Event()
+    errors = []
+
+    def build(marker):
+        snap = make_snapshot(marker)
+        try:
+            while not stop.is_set():
+                snap.save(root)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        for _ in range(200):
+            snap = load_snapshot(root)
+            if snap is None:
+                continue
+            marker = snap.stats["bars"].iloc[0]
+            if not (snap.values["value"] == marker).all() or snap.failures != {"BAD": f"build {marker}"}:
+                errors.append(marker)
+
+    builders = [threading.Thread(target=build, args=(m,)) for m in (1, 2)]
+    for t in builders:
+        t.start()
+    try:
+        read()
+    finally:
+        stop.set()
+        for t in builders:
+            t.join()
+    assert not errors
+    assert load_snapshot(root).stats["bars"].iloc[0] in (1, 2)
+
+
+def test_missing_benchmark_goes_to_stderr(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(helper, "store", BarStore(str(tmp_path)))
+    monkeypatch.setattr(helper, "client", FakeRESTClient(empty=["SPY"]))
+    from cache import shared_bars
+    shared_bars.clear()
+    snap = build_snapshot(["QQQ", "GLD"], periods=(5,), delays=range(2), days_back=400)
+    shared_bars.clear()
+
+    out = capsys.readouterr()
+    assert "Skipping Lag/Lead Days vs SPY: no benchmark data" in out.err
+    assert "Skipping" not in out.out
+    assert set(snap.values["ticker"]) == {"QQQ", "GLD"}
+    assert not (snap.values["bench"] == "SPY").any()
+    assert np.isin(snap.values["delay"], [0, 1]).all()